@@ -1,33 +1,104 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify
-import os
-import glob
-from datetime import datetime
-import shutil
-from werkzeug.utils import secure_filename
-from PIL import Image
-import io
-import base64
-import threading
-import time
-import logging
-import random
-import string
-import subprocess
-import json
+# Medir el inicio desde la primera importación (reporte en el log, ver functions/startup.py)
+from functions import startup
+startup.track_imports()
+
+try:
+    from flask import Flask, Response, render_template, request, redirect, send_file, url_for, jsonify
+    from flask.helpers import get_debug_flag
+    import os
+    from datetime import datetime
+    import shutil
+    import tempfile
+    from werkzeug.utils import secure_filename
+    import threading
+    import time
+    import logging
+    import json
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+    from functions import metrics, ocr_cache
+    from functions.database import init_db
+    from functions.doc_ids import is_document_name, move_to_new_document
+    from functions.document_store import (find_documents, get_document, match_pending_documents, record_match,
+                                          search_text)
+    from functions.file_digests import forget_digests, index_digests
+    from functions.folder_watcher import (IN_CREATE, REMOVED_MASK, FolderGoneError, InotifyWatcher,
+                                          QueueOverflowError, inotify_available)
+    from functions.image_index import ImageIndex, is_input_file, is_pdf_file
+    from functions.jpeg_rotation import rotate_image_file
+    from functions.job_queue import (JOB_DONE, JOB_ERROR, JOB_QUEUED, JOB_RUNNING, count_jobs_by_status, find_jobs_by_image_key, get_job, list_jobs,
+                                     start_job_queue, submit_job)
+    from functions.ocr_pool import start_ocr_pool, stop_ocr_pool
+    from functions.perceptual_hash import HashIndex, page_features
+    from functions.previews import ensure_preview, preview_version, remove_previews
+    from functions.record_export import (EXPORT_FORMATS, csv_chunks, export_columns, export_rows, write_xlsx,
+                                         xlsx_available)
+    from functions.shared_state import LeaderLock, publish_change, publish_snapshot, read_changes
+    from functions.student_index import get_student_index
+    from functions.uploads import (UploadError, cancel_upload, create_upload, finish_upload, save_upload,
+                                   upload_status, write_chunk)
+finally:
+    # Solo se miden las importaciones de la aplicación: el buscador no queda instalado
+    # en el proceso (ni en los procesos del pool, que lo heredarían al crearse)
+    startup.stop_tracking_imports()
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'clave_secreta_para_la_aplicacion'
 app.config['UPLOAD_FOLDER'] = 'input'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max por petición (los archivos grandes se suben por fragmentos en /uploads)
+# Modo de rotación: 'exif' (solo metadatos), 'lossless' (jpegtran) o 'reencode'
+app.config['ROTATION_MODE'] = 'exif'
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger(__name__)
+startup.mark('imports')
 
 # Variable para almacenar la última modificación de la carpeta
 last_folder_modification = 0
 folder_monitor_active = True
 
+# Índice en memoria de la carpeta input ordenado por fecha de modificación
+image_index = ImageIndex()
+
+# Con inotify, cada cuántos segundos recorrer igualmente la carpeta completa
+FOLDER_RESYNC_INTERVAL = 300
+
+# Historial de cambios de la carpeta para los clientes de /events y /check_updates
+folder_version = 0
+folder_changes = deque(maxlen=100)
+folder_changes_cond = threading.Condition()
+
+# Hilos para generar vistas previas sin bloquear el monitoreo de la carpeta
+preview_executor = ThreadPoolExecutor(max_workers=2)
+
+# Hash perceptual y tipo de cada página de input, para marcar reescaneos del
+# mismo documento antes del OCR (ver functions/perceptual_hash.py)
+page_hashes = HashIndex()
+hash_executor = ThreadPoolExecutor(max_workers=1)
+
+# Duración en caché del navegador de una vista previa con versión (1 año)
+PREVIEW_MAX_AGE = 365 * 24 * 3600
+
+# Segundos entre mensajes de keep-alive en /events y espera máxima en /check_updates
+EVENTS_KEEPALIVE = 15
+LONG_POLL_MAX_WAIT = 30
+
+# Modo producción (serve.py): un solo proceso, elegido con un bloqueo de archivo,
+# monitorea la carpeta y publica cada cambio; los demás leen cada medio segundo
+# los cambios nuevos. Cada FOLDER_SNAPSHOT_INTERVAL cambios se publica además
+# una foto completa del índice, para los procesos que recién empiezan
+monitor_lock = LeaderLock()
+FOLLOWER_POLL_INTERVAL = 0.5
+LEADER_RETRY_INTERVAL = 5
+FOLDER_SNAPSHOT_INTERVAL = 1000
+snapshot_version = 0
+
+# Inicio del servidor de producción (lo fija serve.py para todos sus procesos);
+# los trabajos pendientes se vuelven a encolar una sola vez por inicio
+SERVE_STARTED_AT = os.environ.get('DIGITALIZA_STARTED_AT')
+jobs_recovered_for = None
+
 # Asegurar que la carpeta de entrada existe
 def ensure_input_folder():
     """Asegura que la carpeta input existe y es accesible."""
@@ -43,35 +114,46 @@ def ensure_input_folder():
 # Inicializar la carpeta de entrada
 ensure_input_folder()
 
+# Inicializar la base de datos local (cola de trabajos)
+init_db()
+startup.mark('app')
+
+@app.after_request
+def mark_first_request(response):
+    """Registra en el reporte de inicio cuándo se atendió la primera petición."""
+    startup.mark('first_request')
+    return response
+
 def get_latest_images(folder='input', count=2):
-    """Obtiene las rutas de las imágenes más recientes en la carpeta especificada."""
+    """
+    Obtiene las rutas de las imágenes más recientes en la carpeta especificada.
+    Para la carpeta input se usa el índice que mantiene el monitoreo; si aún no
+    está listo (o es otra carpeta), se recorre la carpeta una vez.
+    """
     try:
-        files = glob.glob(os.path.join(folder, '*.jpg')) + glob.glob(os.path.join(folder, '*.jpeg'))
-        # Ordenar archivos por fecha de modificación (más reciente primero)
-        files.sort(key=os.path.getmtime, reverse=True)
-        return files[:count]
+        if os.path.abspath(folder) == os.path.abspath(app.config['UPLOAD_FOLDER']) and image_index.ready:
+            index = image_index
+        else:
+            index = ImageIndex.from_folder(folder)
+        return [os.path.join(folder, name) for name in index.latest(count)]
     except Exception as e:
         logger.error(f"Error al obtener imágenes: {e}")
         return []
 
 def get_image_data(image_path):
-    """Convierte una imagen a base64 para mostrarla en HTML."""
+    """
+    Retorna los datos de una imagen para mostrarla en HTML.
+    La imagen se sirve desde /preview (vista previa en caché), no se incrusta en base64.
+    """
     try:
-        with Image.open(image_path) as img:
-            # Redimensionar si es necesario
-            max_size = (1200, 1200)
-            img.thumbnail(max_size, Image.LANCZOS)
-            
-            buffer = io.BytesIO()
-            img.save(buffer, format="JPEG")
-            img_str = base64.b64encode(buffer.getvalue()).decode('utf-8')
-            
-            return {
-                'name': os.path.basename(image_path),
-                'path': image_path,
-                'data': f'data:image/jpeg;base64,{img_str}',
-                'modified': datetime.fromtimestamp(os.path.getmtime(image_path)).strftime('%Y-%m-%d %H:%M:%S')
-            }
+        version = preview_version(image_path)
+        return {
+            'name': os.path.basename(image_path),
+            'path': image_path,
+            'data': url_for('preview_image', filename=os.path.basename(image_path), v=version),
+            'modified': datetime.fromtimestamp(version / 1e9).strftime('%Y-%m-%d %H:%M:%S'),
+            'similar': page_hashes.duplicates_of(os.path.basename(image_path))
+        }
     except Exception as e:
         logger.error(f"Error al procesar imagen {image_path}: {e}")
         return {
@@ -79,69 +161,335 @@ def get_image_data(image_path):
             'path': image_path,
             'data': None,
             'error': str(e),
-            'modified': datetime.fromtimestamp(os.path.getmtime(image_path)).strftime('%Y-%m-%d %H:%M:%S')
+            'modified': 'N/A'
         }
 
-# Función para generar un nombre de archivo único basado en timestamp y letras aleatorias
-def generate_unique_filename():
-    """Genera un nombre de archivo único con timestamp y 3 letras aleatorias."""
-    timestamp = int(datetime.now().timestamp())
-    # Generar 3 letras aleatorias
-    random_letters = ''.join(random.choices(string.ascii_lowercase, k=3))
-    return f"{timestamp}{random_letters}.jpg"
+def schedule_previews(filenames):
+    """Genera en segundo plano las vistas previas de las imágenes nuevas o modificadas."""
+    for filename in filenames:
+        preview_executor.submit(_generate_preview, os.path.join(app.config['UPLOAD_FOLDER'], filename))
+
+def _generate_preview(image_path):
+    try:
+        ensure_preview(image_path)
+    except FileNotFoundError:
+        pass  # El archivo se eliminó o renombró antes de generar su vista previa
+    except Exception as e:
+        logger.error(f"Error al generar la vista previa de {image_path}: {e}")
+
+def schedule_page_hashes(filenames):
+    """Calcula en segundo plano el hash perceptual de las páginas nuevas o modificadas."""
+    for filename in filenames:
+        hash_executor.submit(_hash_page, filename)
+
+def _hash_page(filename):
+    try:
+        index_page_hash(filename)
+    except FileNotFoundError:
+        page_hashes.remove(filename)  # El archivo se eliminó o renombró antes de procesarlo
+    except Exception as e:
+        logger.error(f"Error al calcular el hash de {filename}: {e}")
+
+def schedule_file_digests(filenames, removed=()):
+    """
+    Actualiza en segundo plano el SHA-256 guardado de los archivos de input,
+    con el que las subidas reconocen un duplicado sin releer la carpeta.
+    """
+    hash_executor.submit(_update_file_digests, list(filenames), list(removed))
+
+def _update_file_digests(filenames, removed):
+    try:
+        if removed:
+            forget_digests(removed)
+        if filenames:
+            index_digests(app.config['UPLOAD_FOLDER'], filenames)
+    except Exception as e:
+        logger.error(f"Error al actualizar los hashes de la carpeta input: {e}")
+
+def index_page_hash(filename):
+    """
+    Calcula el hash perceptual y el tipo de una página de input y lo agrega al
+    índice. Retorna los archivos que parecen un escaneo del mismo documento.
+    """
+    value, page_type = page_features(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+    page_hashes.add(filename, value, page_type)
+    similar = page_hashes.duplicates_of(filename)
+    if similar:
+        logger.warning(f"{filename} parece un reescaneo de: {', '.join(similar)}")
+    return similar
+
+def similar_pages(filename):
+    """
+    index_page_hash para las respuestas de subida: el archivo ya quedó guardado,
+    así que un error al calcular el hash (imagen dañada, PDF sin poppler) se
+    registra y la subida responde sin páginas similares.
+    """
+    try:
+        return index_page_hash(filename)
+    except Exception as e:
+        logger.error(f"Error al calcular el hash de {filename}: {e}")
+        return []
+
+def document_extension(filename):
+    """Extensión con la que se guarda un archivo en input (los PDF conservan la suya)."""
+    return '.pdf' if is_pdf_file(filename) else '.jpg'
+
+def needs_rename(filename):
+    """Indica si el nombre del archivo no tiene el formato de ID de documento."""
+    return not is_document_name(filename)
+
+def rename_input_file(filename):
+    """
+    Renombra un archivo de la carpeta input con un ID de documento nuevo, sin
+    sobrescribir nunca otro archivo. Retorna el nuevo nombre.
+    """
+    try:
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        with metrics.timed('rename'):
+            new_filename = move_to_new_document(file_path, app.config['UPLOAD_FOLDER'], document_extension(filename))
+        logger.info(f"Archivo renombrado automáticamente: {filename} -> {new_filename}")
+        return new_filename
+    except Exception as e:
+        logger.error(f"Error al renombrar archivo {filename}: {str(e)}")
+        return None
+
+def mark_folder_changed(reason, added=(), modified=(), removed=()):
+    """
+    Registra que el contenido de la carpeta cambió y avisa a los clientes
+    conectados a /events o esperando en /check_updates.
+    """
+    global last_folder_modification, folder_version
+    schedule_previews(list(added) + list(modified))
+    schedule_page_hashes(list(added) + list(modified))
+    schedule_file_digests(list(added) + list(modified), removed)
+    for filename in removed:
+        remove_previews(filename)
+        page_hashes.remove(filename)
+    
+    with folder_changes_cond:
+        last_folder_modification = time.time()
+        folder_version += 1
+        change = {
+            'version': folder_version,
+            'last_modified': last_folder_modification,
+            'added': sorted(added),
+            'modified': sorted(modified),
+            'removed': sorted(removed)
+        }
+        folder_changes.append(change)
+        folder_changes_cond.notify_all()
+    logger.info(f"Cambios detectados en la carpeta input ({reason}): {datetime.fromtimestamp(last_folder_modification)}")
+    
+    if monitor_lock.held:
+        publish_folder_change(change)
+
+def publish_folder_change(change):
+    """Publica un cambio de la carpeta para los demás procesos del servidor (y, cada tanto, una foto)."""
+    mtimes = {name: image_index.get(name) for name in change['added'] + change['modified']}
+    publish_change(change, {name: mtime for name, mtime in mtimes.items() if mtime is not None})
+    if change['version'] - snapshot_version >= FOLDER_SNAPSHOT_INTERVAL:
+        publish_folder_snapshot()
+
+def publish_folder_snapshot():
+    """Publica el índice completo para los procesos que no pueden continuar solo con los cambios."""
+    global snapshot_version
+    with folder_changes_cond:
+        state = {'version': folder_version, 'last_modified': last_folder_modification}
+    state['index'] = image_index.snapshot()
+    state['jobs_recovered_for'] = jobs_recovered_for
+    publish_snapshot(state)
+    snapshot_version = state['version']
+
+def apply_folder_snapshot(snapshot):
+    """Reemplaza el estado local de la carpeta por la foto publicada por el monitor."""
+    global last_folder_modification, folder_version
+    added, modified, removed = image_index.replace_all(snapshot['index'])
+    # Cada proceso mantiene su propio índice de hashes
+    schedule_page_hashes(list(added) + list(modified))
+    for filename in removed:
+        page_hashes.remove(filename)
+    with folder_changes_cond:
+        folder_version = snapshot['version']
+        last_folder_modification = snapshot['last_modified']
+        folder_changes.clear()
+        folder_changes_cond.notify_all()
+
+def apply_folder_change(change, mtimes):
+    """Aplica al estado local un cambio publicado por el monitor."""
+    global last_folder_modification, folder_version
+    for filename in change['removed']:
+        image_index.remove(filename)
+        page_hashes.remove(filename)
+    for filename, mtime in mtimes.items():
+        image_index.update(filename, mtime)
+    schedule_page_hashes(change['added'] + change['modified'])
+    with folder_changes_cond:
+        folder_version = change['version']
+        last_folder_modification = change['last_modified']
+        folder_changes.append(change)
+        folder_changes_cond.notify_all()
+
+def sync_folder_state(since):
+    """
+    Aplica lo que publicó el monitor después de la versión `since` (None: todo,
+    desde la última foto). Retorna (versión alcanzada, foto aplicada o None).
+    """
+    snapshot, changes = read_changes(since)
+    if snapshot is not None:
+        apply_folder_snapshot(snapshot)
+        since = snapshot['version']
+    for change, mtimes in changes:
+        apply_folder_change(change, mtimes)
+        since = change['version']
+    return since, snapshot
+
+def wait_for_folder_changes(since, timeout):
+    """
+    Espera hasta `timeout` segundos a que haya cambios posteriores a la versión `since`.
+    Retorna la lista de cambios (vacía si no hubo) o None si `since` es tan antigua
+    que ya no se conservan sus cambios y el cliente debe recargar todo.
+    """
+    with folder_changes_cond:
+        if since > folder_version:
+            # Versión de otra ejecución del servidor: el cliente debe recargar todo
+            return None
+        folder_changes_cond.wait_for(lambda: folder_version > since, timeout=timeout)
+        if folder_version <= since:
+            return []
+        if not folder_changes or folder_changes[0]['version'] > since + 1:
+            return None
+        return [change for change in folder_changes if change['version'] > since]
+
+def update_folder_entry(filename):
+    """
+    Actualiza el índice para un archivo agregado o modificado (renombrándolo si
+    hace falta). Retorna (nombre, 'added' o 'modified'), o None si no hubo cambios.
+    """
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if not is_input_file(filename) or not os.path.isfile(file_path):
+        return None
+    
+    if needs_rename(filename):
+        # El nombre nuevo se crea con un enlace duro, que no genera un evento de
+        # escritura ni de movimiento: se agrega al índice directamente
+        new_filename = rename_input_file(filename)
+        if not new_filename:
+            return None
+        filename = new_filename
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    
+    return filename, image_index.update(filename, os.path.getmtime(file_path))
+
+def arrived_complete(filename):
+    """
+    Indica si un archivo recién creado en input (IN_CREATE) ya tiene su contenido.
+    Los que la aplicación mueve a la carpeta (subidas, renombres) llegan completos
+    con un enlace duro y un nombre de ID de documento; los demás se procesan
+    cuando se terminan de escribir o se mueven a la carpeta.
+    """
+    if not is_document_name(filename):
+        return False
+    try:
+        return os.path.getsize(os.path.join(app.config['UPLOAD_FOLDER'], filename)) > 0
+    except OSError:
+        return False
+
+def remove_folder_entry(filename):
+    """Quita un archivo del índice. Retorna 'removed' si estaba indexado."""
+    return image_index.remove(filename)
+
+def rescan_folder():
+    """Recorre la carpeta completa, renombra archivos nuevos y reconstruye el índice."""
+    # Verificar si la carpeta existe
+    if not os.path.exists(app.config['UPLOAD_FOLDER']):
+        ensure_input_folder()
+    
+    new_index = {}
+    files_to_rename = []
+    with metrics.timed('folder_scan'), os.scandir(app.config['UPLOAD_FOLDER']) as entries:
+        for entry in entries:
+            # Solo procesar archivos JPG y PDF
+            if is_input_file(entry.name) and entry.is_file():
+                if needs_rename(entry.name):
+                    files_to_rename.append(entry.name)
+                else:
+                    new_index[entry.name] = entry.stat().st_mtime
+    
+    # Renombrar archivos que no tienen formato correcto
+    for filename in files_to_rename:
+        new_filename = rename_input_file(filename)
+        if new_filename:
+            new_index[new_filename] = os.path.getmtime(os.path.join(app.config['UPLOAD_FOLDER'], new_filename))
+    
+    added, modified, removed = image_index.replace_all(new_index)
+    changed = bool(added or removed or modified)
+    if changed:
+        mark_folder_changed('recorrido completo', added, modified, removed)
+    return changed
+
+def watch_folder_events():
+    """
+    Vigila la carpeta input con inotify. Solo procesa los archivos que cambian;
+    cada FOLDER_RESYNC_INTERVAL segundos se recorre la carpeta completa por si
+    algún cambio no generó eventos (por ejemplo, en carpetas de red).
+    """
+    with InotifyWatcher(app.config['UPLOAD_FOLDER']) as watcher:
+        rescan_folder()
+        last_resync = time.time()
+        logger.info("Monitoreo de la carpeta input con inotify")
+        
+        while folder_monitor_active:
+            try:
+                events = watcher.read_events(timeout=1.0)
+            except QueueOverflowError:
+                logger.warning("Se perdieron eventos de la carpeta, recorriéndola completa")
+                rescan_folder()
+                continue
+            
+            changes = {'added': set(), 'modified': set(), 'removed': set()}
+            for mask, filename in events:
+                if mask & REMOVED_MASK:
+                    change = remove_folder_entry(filename)
+                elif mask & IN_CREATE and not arrived_complete(filename):
+                    continue
+                else:
+                    updated = update_folder_entry(filename)
+                    filename, change = updated if updated else (filename, None)
+                if change:
+                    changes[change].add(filename)
+            
+            # Un archivo agregado y luego eliminado en el mismo lote no se informa
+            transient = changes['added'] & changes['removed']
+            changes = {kind: names - transient for kind, names in changes.items()}
+            if any(changes.values()):
+                mark_folder_changed(f"{len(events)} eventos", **changes)
+            
+            if time.time() - last_resync >= FOLDER_RESYNC_INTERVAL:
+                rescan_folder()
+                last_resync = time.time()
 
 def check_folder_changes():
     """Monitorea cambios en la carpeta input."""
-    global last_folder_modification, folder_monitor_active
-    
     logger.info("Iniciando monitoreo de la carpeta input...")
     
     while folder_monitor_active:
-        try:
-            # Verificar si la carpeta existe
-            if not os.path.exists(app.config['UPLOAD_FOLDER']):
+        if inotify_available():
+            try:
+                watch_folder_events()
+                return
+            except FolderGoneError:
+                logger.warning("La carpeta input desapareció, volviendo a crearla")
                 ensure_input_folder()
-                
-            # Obtener la última modificación de la carpeta y renombrar archivos nuevos
-            latest_mod_time = 0
-            files_to_rename = []
-            
-            for file in os.listdir(app.config['UPLOAD_FOLDER']):
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], file)
-                
-                # Solo procesar archivos JPG
-                if file.lower().endswith(('.jpg', '.jpeg')) and os.path.isfile(file_path):
-                    mod_time = os.path.getmtime(file_path)
-                    
-                    # Verificar si el nombre del archivo ya tiene formato de timestamp+letras
-                    filename_without_ext = os.path.splitext(file)[0]
-                    # Verificar si el nombre tiene al menos 13 caracteres (timestamp) y los primeros 10+ son dígitos
-                    if len(filename_without_ext) < 13 or not filename_without_ext[:-3].isdigit():
-                        files_to_rename.append(file_path)
-                    
-                    if mod_time > latest_mod_time:
-                        latest_mod_time = mod_time
-            
-            # Renombrar archivos que no tienen formato correcto
-            for file_path in files_to_rename:
-                try:
-                    old_filename = os.path.basename(file_path)
-                    new_filename = generate_unique_filename()
-                    new_path = os.path.join(app.config['UPLOAD_FOLDER'], new_filename)
-                    
-                    # Renombrar el archivo
-                    os.rename(file_path, new_path)
-                    logger.info(f"Archivo renombrado automáticamente: {old_filename} -> {new_filename}")
-                except Exception as e:
-                    logger.error(f"Error al renombrar archivo {file_path}: {str(e)}")
-            
-            # Si hay cambios, actualizar la variable global
-            if latest_mod_time > last_folder_modification or files_to_rename:
-                last_folder_modification = latest_mod_time
-                logger.info(f"Cambios detectados en la carpeta input: {datetime.fromtimestamp(latest_mod_time)}")
-            
-            # Esperar antes de la siguiente verificación
-            time.sleep(2)
+                continue
+            except Exception as e:
+                logger.error(f"No se pudo usar inotify, se usará el monitoreo periódico: {e}")
+        
+        # Alternativa: recorrer la carpeta cada 2 segundos
+        try:
+            while folder_monitor_active:
+                rescan_folder()
+                # Esperar antes de la siguiente verificación
+                time.sleep(2)
         except Exception as e:
             logger.error(f"Error al monitorear la carpeta: {e}")
             time.sleep(5)  # Esperar más tiempo en caso de error
@@ -176,25 +524,73 @@ def upload_file():
     files = request.files.getlist('file')
     
     uploaded_files = []
+    similar = {}
     for file in files:
         if file.filename == '':
             continue
         
-        if file and file.filename.lower().endswith(('.jpg', '.jpeg')):
-            # Generar un nombre de archivo único
-            new_filename = generate_unique_filename()
-            
-            # Guardar el archivo con el nuevo nombre
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], new_filename)
-            file.save(file_path)
+        if file and is_input_file(file.filename):
+            # Guardar el contenido y moverlo completo a input con un ID nuevo (nunca sobrescribe otro)
+            new_filename = save_upload(file, app.config['UPLOAD_FOLDER'], document_extension(file.filename))
             uploaded_files.append(new_filename)
             logger.info(f"Archivo subido y renombrado: {file.filename} -> {new_filename}")
+            similar[new_filename] = similar_pages(new_filename)
     
     if uploaded_files:
-        return jsonify({'success': True, 'files': uploaded_files}), 200
+        similar = {name: files for name, files in similar.items() if files}
+        return jsonify({'success': True, 'files': uploaded_files, 'similar': similar}), 200
     else:
         return jsonify({'error': 'No se subieron archivos válidos'}), 400
 
+@app.route('/uploads', methods=['POST'])
+def start_upload():
+    """
+    Inicia una subida por fragmentos. Cuerpo JSON: {"filename": "scan.pdf", "size": 123}.
+    Luego cada fragmento se envía con PUT /uploads/<id>?offset=<bytes ya enviados>.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        status = create_upload(data.get('filename'), data.get('size'))
+        return jsonify(dict(status, success=True)), 201
+    except UploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    except Exception as e:
+        logger.error(f"Error al iniciar la subida: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/uploads/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+def upload_chunk(upload_id):
+    """
+    GET: estado de la subida (offset recibido y progreso), para reanudarla.
+    PUT: agrega un fragmento (cuerpo binario) en ?offset=. Al recibir el último,
+    el archivo se mueve a la carpeta input con un nombre único.
+    DELETE: cancela la subida.
+    """
+    try:
+        if request.method == 'GET':
+            return jsonify(dict(upload_status(upload_id), success=True)), 200
+        if request.method == 'DELETE':
+            cancel_upload(upload_id)
+            return jsonify({'success': True}), 200
+        
+        offset = request.args.get('offset', type=int)
+        if offset is None:
+            return jsonify({'success': False, 'error': 'Falta el parámetro offset'}), 400
+        
+        status = write_chunk(upload_id, offset, request.stream)
+        if status['offset'] < status['size']:
+            return jsonify(dict(status, success=True, complete=False)), 200
+        
+        result = finish_upload(upload_id, app.config['UPLOAD_FOLDER'], document_extension)
+        if not result['duplicate']:
+            result['similar'] = similar_pages(result['filename'])
+        return jsonify(dict(status, **result, success=True, complete=True)), 200
+    except UploadError as e:
+        return jsonify({'success': False, 'error': str(e)}), e.status
+    except Exception as e:
+        logger.error(f"Error en la subida {upload_id}: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/refresh')
 def refresh_images():
     """Endpoint para actualizar las imágenes sin recargar la página completa."""
@@ -213,13 +609,76 @@ def refresh_images():
 
 @app.route('/check_updates')
 def check_updates():
-    """Endpoint para verificar si hay actualizaciones en la carpeta."""
-    global last_folder_modification
+    """
+    Endpoint para verificar si hay actualizaciones en la carpeta.
+    Con ?since=<versión>&wait=<segundos> funciona como long-poll: espera hasta
+    que haya cambios posteriores a esa versión y los retorna.
+    """
+    since = request.args.get('since', type=int)
+    wait = min(request.args.get('wait', 0, type=float), LONG_POLL_MAX_WAIT)
+    
+    changes = []
+    if since is not None:
+        changes = wait_for_folder_changes(since, wait)
+    
     return jsonify({
         'last_modified': last_folder_modification,
-        'timestamp': datetime.fromtimestamp(last_folder_modification).strftime('%Y-%m-%d %H:%M:%S') if last_folder_modification > 0 else 'N/A'
+        'timestamp': datetime.fromtimestamp(last_folder_modification).strftime('%Y-%m-%d %H:%M:%S') if last_folder_modification > 0 else 'N/A',
+        'version': folder_version,
+        'changes': changes,
+        'reset': changes is None
+    })
+
+@app.route('/events')
+def folder_events():
+    """
+    Server-Sent Events: envía los cambios de la carpeta input apenas ocurren.
+    Cada evento lleva los nombres agregados, modificados y eliminados, no las imágenes.
+    """
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+    since = last_event_id if last_event_id is not None else folder_version
+    
+    def stream(since):
+        # Indicar al navegador cuánto esperar antes de reconectarse
+        yield f"retry: 3000\nid: {since}\nevent: hello\ndata: {json.dumps({'version': since})}\n\n"
+        while True:
+            changes = wait_for_folder_changes(since, EVENTS_KEEPALIVE)
+            if changes is None:
+                # Se perdieron cambios intermedios: el cliente debe recargar todo
+                since = folder_version
+                yield f"id: {since}\nevent: reset\ndata: {json.dumps({'version': since})}\n\n"
+            elif not changes:
+                yield ": keep-alive\n\n"
+            else:
+                for change in changes:
+                    since = change['version']
+                    yield f"id: {since}\nevent: folder\ndata: {json.dumps(change)}\n\n"
+    
+    return Response(stream(since), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
 
+@app.route('/preview/<filename>')
+def preview_image(filename):
+    """
+    Sirve la vista previa de una imagen. Con ?v=<versión> vigente la respuesta se
+    puede guardar en caché indefinidamente; sin ella se revalida con ETag/Last-Modified.
+    """
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(filename))
+    if not os.path.isfile(file_path):
+        return jsonify({'error': 'Archivo no encontrado'}), 404
+    
+    try:
+        path = ensure_preview(file_path)
+    except Exception as e:
+        logger.error(f"Error al generar la vista previa de {filename}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    current_version = os.path.splitext(os.path.basename(path))[0]
+    max_age = PREVIEW_MAX_AGE if request.args.get('v') == current_version else 0
+    return send_file(path, mimetype='image/jpeg', conditional=True, etag=True, max_age=max_age)
+
 @app.route('/delete/<filename>')
 def delete_image(filename):
     """Elimina una imagen específica."""
@@ -246,18 +705,20 @@ def rotate_image(filename, direction):
         logger.info(f"Intentando rotar archivo: {file_path} en dirección: {direction}")
         
         if os.path.exists(file_path):
-            with Image.open(file_path) as img:
-                if direction == 'left':
-                    rotated = img.rotate(90, expand=True)
-                elif direction == 'right':
-                    rotated = img.rotate(-90, expand=True)
-                else:
-                    logger.warning(f"Dirección de rotación inválida: {direction}")
-                    return jsonify({'error': 'Dirección inválida'}), 400
-                
-                rotated.save(file_path)
-                logger.info(f"Archivo rotado exitosamente: {file_path}")
-                return jsonify({'success': True}), 200
+            if direction not in ('left', 'right'):
+                logger.warning(f"Dirección de rotación inválida: {direction}")
+                return jsonify({'error': 'Dirección inválida'}), 400
+            if is_pdf_file(file_path):
+                return jsonify({'error': 'Los PDF no se pueden rotar'}), 400
+            
+            # El contenido cambia: descartar los resultados de OCR guardados
+            ocr_cache.invalidate_file(file_path)
+            
+            start = time.perf_counter()
+            mode = rotate_image_file(file_path, direction, app.config['ROTATION_MODE'])
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            logger.info(f"Archivo rotado exitosamente ({mode}, {elapsed_ms:.1f} ms): {file_path}")
+            return jsonify({'success': True, 'mode': mode}), 200
         
         logger.warning(f"Archivo no encontrado para rotar: {file_path}")
         return jsonify({'error': 'Archivo no encontrado'}), 404
@@ -267,79 +728,206 @@ def rotate_image(filename, direction):
 
 @app.route('/scan')
 def scan_documents():
-    """Ejecuta el script de escaneo de prueba."""
+    """Encola el script de escaneo de prueba y retorna el ID del trabajo."""
     try:
-        # Ruta al script de escaneo
-        script_path = os.path.join('functions', 'gen_test_input.py')
-        
-        # Verificar si el script existe
-        if not os.path.exists(script_path):
-            logger.error(f"Script de escaneo no encontrado: {script_path}")
-            return jsonify({'success': False, 'error': 'Script de escaneo no encontrado'}), 404
-        
-        # Ejecutar el script
-        logger.info(f"Ejecutando script de escaneo: {script_path}")
-        result = subprocess.run(['python3', script_path], capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            logger.info("Escaneo completado con éxito")
-            return jsonify({'success': True, 'output': result.stdout}), 200
-        else:
-            logger.error(f"Error al ejecutar el script de escaneo: {result.stderr}")
-            return jsonify({'success': False, 'error': result.stderr}), 500
+        job_id = submit_job('scan')
+        logger.info(f"Escaneo encolado como trabajo {job_id}")
+        return jsonify({'success': True, 'job_id': job_id, 'status': JOB_QUEUED}), 202
     except Exception as e:
         logger.error(f"Error al escanear documentos: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/ocr')
 def run_ocr():
-    """Ejecuta el script de OCR."""
+    """
+    Encola el OCR de las dos imágenes más recientes (o del PDF más reciente)
+    y retorna el ID del trabajo. Con ?profile=1 se guarda el perfil (cProfile)
+    del trabajo en cache/profiles.
+    
+    Si el pagaré parece un reescaneo de otro archivo de la carpeta, la respuesta
+    incluye los archivos parecidos en 'similar' como aviso: el hash perceptual no
+    distingue bien los pagarés de alumnos distintos, así que no bloquea el OCR.
+    """
     try:
-        # Ruta al script de OCR
-        script_path = os.path.join('functions', 'test_ocr.py')
+        latest_images = get_latest_images(app.config['UPLOAD_FOLDER'])
+        if not latest_images:
+            return jsonify({'success': False, 'error': 'No hay imágenes para procesar'}), 400
+        if is_pdf_file(latest_images[0]):
+            # Un PDF ya trae todas las páginas del documento
+            latest_images = latest_images[:1]
         
-        # Verificar si el script existe
-        if not os.path.exists(script_path):
-            logger.error(f"Script de OCR no encontrado: {script_path}")
-            return jsonify({'success': False, 'error': 'Script de OCR no encontrado'}), 404
+        names = [os.path.basename(img) for img in latest_images]
+        similar = {name: [other for other in page_hashes.duplicates_of(name) if other not in names]
+                   for name in names}
+        similar = {name: others for name, others in similar.items() if others}
         
-        # Ejecutar el script
-        logger.info(f"Ejecutando script de OCR: {script_path}")
-        result = subprocess.run(['python3', script_path], capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            logger.info("OCR completado con éxito")
-            
-            # Verificar si se generó el archivo de salida
-            output_file = 'output.txt'
-            student_data_file = 'student_data.json'
-            
-            ocr_text = 'No se generó el archivo de salida'
-            student_data = {}
-            
-            if os.path.exists(output_file):
-                # Leer el contenido del archivo
-                with open(output_file, 'r', encoding='utf-8') as f:
-                    ocr_text = f.read()
-            
-            if os.path.exists(student_data_file):
-                # Leer los datos del estudiante
-                with open(student_data_file, 'r', encoding='utf-8') as f:
-                    student_data = json.load(f)
-            
-            return jsonify({
-                'success': True, 
-                'output': result.stdout,
-                'ocr_text': ocr_text,
-                'student_data': student_data
-            }), 200
-        else:
-            logger.error(f"Error al ejecutar el script de OCR: {result.stderr}")
-            return jsonify({'success': False, 'error': result.stderr}), 500
+        payload = {'images': [os.path.abspath(img) for img in latest_images]}
+        if request.args.get('profile') == '1':
+            payload['profile'] = True
+        job_id = submit_job('ocr', payload)
+        logger.info(f"OCR encolado como trabajo {job_id}")
+        return jsonify({'success': True, 'job_id': job_id, 'status': JOB_QUEUED, 'similar': similar}), 202
     except Exception as e:
         logger.error(f"Error al ejecutar OCR: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/jobs', methods=['GET', 'POST'])
+def jobs():
+    """
+    GET: lista los trabajos más recientes (filtros opcionales ?status= o ?image_key=).
+    POST: encola un lote de OCR. Cuerpo JSON: {"documents": [["pagare.jpg", "firma.jpg"], ...]}
+    """
+    try:
+        if request.method == 'GET':
+            if request.args.get('image_key'):
+                return jsonify(find_jobs_by_image_key(request.args['image_key'])), 200
+            return jsonify(list_jobs(status=request.args.get('status'))), 200
+        
+        data = request.get_json(silent=True) or {}
+        documents = data.get('documents')
+        if not documents or not isinstance(documents, list):
+            return jsonify({'success': False, 'error': 'Se requiere una lista de documentos'}), 400
+        
+        # Validar todos los documentos antes de encolar
+        batch = []
+        for filenames in documents:
+            if isinstance(filenames, str):
+                filenames = [filenames]
+            paths = [os.path.abspath(os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(name)))
+                     for name in filenames]
+            missing = [os.path.basename(path) for path in paths if not os.path.isfile(path)]
+            if missing:
+                return jsonify({'success': False, 'error': f"Archivos no encontrados: {', '.join(missing)}"}), 404
+            batch.append(paths)
+        
+        job_ids = [submit_job('ocr', {'images': paths}) for paths in batch]
+        logger.info(f"Lote de {len(job_ids)} trabajos de OCR encolado")
+        return jsonify({'success': True, 'job_ids': job_ids}), 202
+    except Exception as e:
+        logger.error(f"Error al encolar trabajos: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Retorna el estado y, si terminó, el resultado de un trabajo."""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Trabajo no encontrado'}), 404
+    return jsonify(job), 200
+
+@app.route('/documents')
+def documents():
+    """
+    Busca documentos procesados: por ?rut=, ?folio=, ?desde= / ?hasta= (aaaa-mm-dd)
+    y ?revision=1|0, o en el texto del OCR con ?q=. Opcional ?limit=.
+    """
+    try:
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        if request.args.get('q'):
+            return jsonify(search_text(request.args['q'], limit=limit)), 200
+        
+        needs_review = request.args.get('revision')
+        return jsonify(find_documents(rut=request.args.get('rut'), folio=request.args.get('folio'),
+                                      date_from=request.args.get('desde'), date_to=request.args.get('hasta'),
+                                      needs_review=None if needs_review is None else needs_review == '1',
+                                      limit=limit)), 200
+    except Exception as e:
+        logger.error(f"Error al buscar documentos: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/documents/<document_id>')
+def document_detail(document_id):
+    """Retorna un documento con sus páginas, campos y alumno asociado."""
+    document = get_document(document_id)
+    if document is None:
+        return jsonify({'success': False, 'error': 'Documento no encontrado'}), 404
+    return jsonify(document), 200
+
+@app.route('/export')
+def export_documents():
+    """
+    Exporta los documentos asociados a un alumno con las columnas de db_input.csv.
+    ?formato=csv (por defecto, se envía a medida que se genera) o xlsx (requiere
+    openpyxl); ?incremental=1 exporta solo lo nuevo desde la última exportación.
+    """
+    try:
+        export_format = request.args.get('formato', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'success': False, 'error': f'Formato no soportado: {export_format}'}), 400
+        if export_format == 'xlsx' and not xlsx_available():
+            return jsonify({'success': False, 'error': 'Para exportar a XLSX instala openpyxl'}), 501
+        
+        # Los documentos de batch_ocr.py que no requieren revisión se asocian aquí
+        match_pending_documents(get_student_index())
+        rows = export_rows(export_format, since_last=request.args.get('incremental') == '1')
+        filename = f"db_input_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+        
+        if export_format == 'xlsx':
+            fd, path = tempfile.mkstemp(suffix='.xlsx')
+            os.close(fd)
+            write_xlsx(rows, export_columns(), path)
+            response = send_file(path, as_attachment=True, download_name=filename)
+            response.call_on_close(lambda: os.remove(path))
+            return response
+        
+        return Response(csv_chunks(rows, export_columns()), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={filename}'})
+    except Exception as e:
+        logger.error(f"Error al exportar los documentos: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Métricas de latencia y contadores en el formato de texto de Prometheus."""
+    try:
+        jobs_by_status = count_jobs_by_status()
+        gauges = [('digitaliza_jobs', {'status': status}, jobs_by_status.get(status, 0))
+                  for status in (JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_ERROR)]
+        gauges.append(('digitaliza_input_files', {}, len(image_index)))
+        gauges.extend(('digitaliza_startup_seconds', {'phase': phase}, round(seconds, 3))
+                      for phase, seconds in startup.phases())
+        return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+    except Exception as e:
+        logger.error(f"Error al generar las métricas: {str(e)}")
+        return Response(f"# error: {str(e)}\n", status=500, mimetype='text/plain')
+
+@app.route('/students/lookup')
+def lookup_student():
+    """Busca alumnos en db_input.csv por ?rut=, ?folio= o ?nombre= (aproximado)."""
+    index = get_student_index()
+    if request.args.get('rut'):
+        return jsonify({'success': True, 'records': index.find_by_rut(request.args['rut'])}), 200
+    if request.args.get('folio'):
+        return jsonify({'success': True, 'records': index.find_by_folio(request.args['folio'])}), 200
+    if request.args.get('nombre'):
+        matches = index.find_by_name(request.args['nombre'])
+        return jsonify({
+            'success': True,
+            'records': [record for _, record in matches],
+            'scores': [score for score, _ in matches]
+        }), 200
+    return jsonify({'success': False, 'error': 'Indique rut, folio o nombre'}), 400
+
+@app.route('/process_document', methods=['POST'])
+def process_document():
+    """
+    Asocia los datos del documento (RUT, folio y/o nombre del OCR) con el
+    registro correspondiente de db_input.csv. Si se envía el image_key del OCR,
+    la asociación queda registrada en la base de documentos.
+    """
+    try:
+        student_data = request.get_json(silent=True) or {}
+        match = get_student_index().match(student_data)
+        if match is None:
+            return jsonify({'success': False, 'error': 'No se encontró el alumno en la base de datos'}), 404
+        
+        logger.info(f"Documento asociado por {match['matched_by']} al RUT {match['record'].get('rut')}")
+        document_id = record_match(student_data['image_key'], match) if student_data.get('image_key') else None
+        return jsonify({'success': True, 'document_id': document_id, **match}), 200
+    except Exception as e:
+        logger.error(f"Error al procesar el documento: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/clear_input')
 def clear_input():
     """Elimina todas las imágenes de la carpeta input."""
@@ -349,7 +937,7 @@ def clear_input():
         # Contar archivos antes de eliminar
         files_count = 0
         for file in os.listdir(input_folder):
-            if file.lower().endswith(('.jpg', '.jpeg')):
+            if is_input_file(file):
                 file_path = os.path.join(input_folder, file)
                 os.remove(file_path)
                 files_count += 1
@@ -361,6 +949,58 @@ def clear_input():
         logger.error(f"Error al limpiar la carpeta input: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def run_elected_monitor():
+    """
+    Modo producción: cada proceso compite por el bloqueo del monitor. El que lo
+    obtiene monitorea la carpeta y publica el estado; los demás aplican el estado
+    publicado y reintentan el bloqueo por si el líder termina.
+    """
+    global jobs_recovered_for
+    version = None
+    last_attempt = 0
+    while folder_monitor_active:
+        if time.monotonic() - last_attempt >= LEADER_RETRY_INTERVAL:
+            last_attempt = time.monotonic()
+            if monitor_lock.try_acquire():
+                break
+        try:
+            version, _ = sync_folder_state(version)
+        except Exception as e:
+            logger.error(f"Error al leer el estado de la carpeta: {e}")
+        time.sleep(FOLLOWER_POLL_INTERVAL)
+    else:
+        return
+    
+    # Continuar desde el último estado publicado (las versiones siguen creciendo)
+    _, snapshot = sync_folder_state(None)
+    
+    if SERVE_STARTED_AT and (snapshot or {}).get('jobs_recovered_for') != SERVE_STARTED_AT:
+        start_job_queue()
+    jobs_recovered_for = SERVE_STARTED_AT
+    publish_folder_snapshot()
+    check_folder_changes()
+
+def warm_up_services(port=None, host='', ocr_workers=None):
+    """
+    Con el servidor ya escuchando, precarga en segundo plano lo que la primera
+    página no necesita: los módulos de imágenes y OCR, el pool de OCR y el
+    índice de alumnos. Un OCR pedido antes inicia el pool por su cuenta.
+    """
+    return startup.start_warm_up(port, host, tasks=(('ocr_pool', lambda: start_ocr_pool(ocr_workers)),
+                                                   ('student_index', lambda: get_student_index().refresh())))
+
+def start_services(ocr_workers=None, port=None, host=''):
+    """
+    Inicia los servicios de fondo de un proceso del servidor de producción:
+    el monitoreo de la carpeta (elegido entre los procesos) y, cuando el
+    servidor ya escucha en el puerto, el precalentamiento con el pool de OCR.
+    """
+    monitor_thread = threading.Thread(target=run_elected_monitor, daemon=True)
+    monitor_thread.start()
+    warm_up_services(port, host, ocr_workers)
+    startup.mark('services')
+    return monitor_thread
+
 def start_folder_monitor():
     """Inicia el hilo de monitoreo de la carpeta."""
     monitor_thread = threading.Thread(target=check_folder_changes, daemon=True)
@@ -376,10 +1016,22 @@ if __name__ == '__main__':
     # Iniciar el monitoreo de la carpeta en un hilo separado
     monitor_thread = start_folder_monitor()
     
+    # Modo debug (recarga automática) solo con FLASK_DEBUG=1: el reloader vuelve
+    # a iniciar el intérprete e importa toda la aplicación dos veces
+    debug = get_debug_flag()
+    
+    # Iniciar el pool de OCR solo en el proceso que atiende peticiones
+    # (con debug, el proceso padre del reloader no atiende peticiones)
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_job_queue()
+        warm_up_services(port=5000)
+        startup.mark('services')
+    
     # Iniciar la aplicación Flask
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=debug, host='0.0.0.0', port=5000)
     
     # Cuando la aplicación se cierre, detener el monitoreo
     folder_monitor_active = False
     if monitor_thread.is_alive():
         monitor_thread.join(timeout=1)
+    stop_ocr_pool()
@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from functions.database import DB_PATH, connect, init_db
+from functions.document_store import save_ocr_results
+from functions.image_index import ImageIndex, is_pdf_file
+from functions.test_ocr import check_tesseract_installed, hash_image_files, perform_ocr, warm_up
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Archivo de salida por defecto (JSONL: un documento por línea)
+DEFAULT_OUTPUT = 'batch_results.jsonl'
+
+# Páginas por documento: pagaré + firma
+DEFAULT_PAGES_PER_DOCUMENT = 2
+
+# Cada cuántos documentos se informa el avance
+PROGRESS_EVERY = 10
+
+def pair_pages(folder, pages_per_document=DEFAULT_PAGES_PER_DOCUMENT, order='mtime'):
+    """
+    Agrupa las imágenes de la carpeta en documentos de `pages_per_document` páginas,
+    en el orden en que se escanearon ('mtime') o por nombre de archivo ('name').
+    Cada PDF se procesa como un documento aparte.
+    """
+    index = ImageIndex.from_folder(folder)
+    entries = index.snapshot()
+    if order == 'name':
+        names = sorted(entries)
+    else:
+        names = [name for _, name in sorted((mtime, name) for name, mtime in entries.items())]
+
+    # Cada PDF es un documento completo; las imágenes se agrupan de a varias
+    documents = [[os.path.join(folder, name)] for name in names if is_pdf_file(name)]
+    paths = [os.path.join(folder, name) for name in names if not is_pdf_file(name)]
+    images = [paths[i:i + pages_per_document] for i in range(0, len(paths), pages_per_document)]
+    if images and len(images[-1]) < pages_per_document:
+        logger.warning(f"El último documento tiene solo {len(images[-1])} página(s): "
+                       f"{', '.join(os.path.basename(p) for p in images[-1])}")
+    return documents + images
+
+def build_record(image_key, files, result):
+    """Resultado de un documento tal como se guarda en la salida."""
+    return {
+        'image_key': image_key,
+        'files': [os.path.basename(path) for path in files],
+        'success': result['success'],
+        'error': result.get('error'),
+        'student_data': result.get('student_data', {}),
+        'fields': result.get('fields', {}),
+        'needs_review': result.get('needs_review', True),
+        'documents': result.get('documents', []),
+        'finished_at': time.time()
+    }
+
+class JsonlOutput:
+    """Salida JSONL: se agrega una línea por documento terminado."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def done_keys(self):
+        """
+        Claves de los documentos ya procesados con éxito (una línea incompleta se
+        ignora). Los que fallaron se vuelven a procesar al reanudar.
+        """
+        keys = set()
+        if not os.path.exists(self.path):
+            return keys
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    if record.get('success'):
+                        keys.add(record['image_key'])
+                except (ValueError, KeyError):
+                    continue
+        return keys
+
+    def write(self, record):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        # Cada línea queda en disco antes de seguir: permite reanudar tras una caída
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class SqliteOutput:
+    """Salida SQLite: tabla batch_results (ver schema.sql)."""
+
+    def __init__(self, path):
+        self.path = path
+        init_db(path)
+        self._conn = connect(path)
+
+    def done_keys(self):
+        return {row['image_key'] for row in self._conn.execute(
+            "SELECT image_key FROM batch_results WHERE success = 1")}
+
+    def write(self, record):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO batch_results "
+                "(image_key, files, success, needs_review, result, error, finished_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (record['image_key'], json.dumps(record['files'], ensure_ascii=False),
+                 int(record['success']), int(record['needs_review']),
+                 json.dumps(record, ensure_ascii=False), record['error'], record['finished_at'])
+            )
+
+    def close(self):
+        self._conn.close()
+
+def open_output(path):
+    """Elige el formato de salida según la extensión del archivo."""
+    if path.lower().endswith(('.db', '.sqlite', '.sqlite3')):
+        return SqliteOutput(path)
+    return JsonlOutput(path)
+
+def run_batch(folder, output, pages_per_document=DEFAULT_PAGES_PER_DOCUMENT, order='mtime', workers=None,
+              store_path=DB_PATH):
+    """
+    Procesa todos los documentos de la carpeta con un pool de procesos y guarda
+    cada resultado apenas termina. Los documentos que ya están en la salida
+    (por contenido de sus imágenes) se omiten. Los exitosos se registran además
+    en la base de documentos (store_path; None para no registrarlos).
+    Retorna un resumen con la cantidad de documentos, páginas y páginas/segundo.
+    """
+    documents = pair_pages(folder, pages_per_document, order)
+    done = output.done_keys()
+    if store_path:
+        init_db(store_path)
+
+    pending = []
+    for files in documents:
+        image_key = hash_image_files(files)
+        if image_key not in done:
+            pending.append((image_key, files))
+    skipped = len(documents) - len(pending)
+    logger.info(f"{len(documents)} documentos encontrados, {skipped} ya procesados, {len(pending)} pendientes")
+
+    workers = workers or os.cpu_count() or 1
+    # Cantidad máxima de documentos enviados al pool a la vez (memoria acotada)
+    max_in_flight = workers * 2
+
+    summary = {'documents': 0, 'pages': 0, 'errors': 0, 'needs_review': 0, 'skipped': skipped}
+    start = time.perf_counter()
+    queue = iter(pending)
+    in_flight = {}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_up) as executor:
+        while True:
+            while len(in_flight) < max_in_flight:
+                item = next(queue, None)
+                if item is None:
+                    break
+                in_flight[executor.submit(perform_ocr, item[1])] = item
+            if not in_flight:
+                break
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            results = []
+            for future in finished:
+                image_key, files = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'success': False, 'error': str(e)}
+                results.append((image_key, files, result))
+
+            # Primero la base de documentos (una transacción para todos los terminados)
+            # y después la salida: al reanudar, un documento nunca queda sin registrar
+            if store_path:
+                save_ocr_results([(result, None) for _, _, result in results if result['success']], store_path)
+
+            for image_key, files, result in results:
+                output.write(build_record(image_key, files, result))
+
+                summary['documents'] += 1
+                summary['pages'] += len(result.get('documents') or files)
+                if not result['success']:
+                    summary['errors'] += 1
+                    logger.error(f"Error en {', '.join(os.path.basename(p) for p in files)}: {result.get('error')}")
+                elif result.get('needs_review'):
+                    summary['needs_review'] += 1
+
+                if summary['documents'] % PROGRESS_EVERY == 0:
+                    elapsed = time.perf_counter() - start
+                    logger.info(f"{summary['documents']}/{len(pending)} documentos "
+                                f"({summary['pages'] / elapsed:.2f} páginas/s)")
+
+    elapsed = time.perf_counter() - start
+    summary['seconds'] = round(elapsed, 2)
+    summary['pages_per_second'] = round(summary['pages'] / elapsed, 2) if elapsed > 0 else 0.0
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Digitalización masiva de una carpeta de pagarés escaneados.')
+    parser.add_argument('folder', help='Carpeta con las imágenes escaneadas')
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT,
+                        help='Archivo de salida: .jsonl o .db/.sqlite (por defecto batch_results.jsonl)')
+    parser.add_argument('-p', '--pages', type=int, default=DEFAULT_PAGES_PER_DOCUMENT,
+                        help='Páginas por documento (por defecto 2: pagaré + firma)')
+    parser.add_argument('--order', choices=('mtime', 'name'), default='mtime',
+                        help='Orden para agrupar las páginas: fecha de escaneo o nombre de archivo')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Procesos de OCR (por defecto uno por núcleo)')
+    parser.add_argument('--no-store', action='store_true',
+                        help='No registrar los documentos en la base de documentos (digitaliza.db)')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.folder):
+        logger.error(f"La carpeta {args.folder} no existe")
+        return 1
+    if not check_tesseract_installed():
+        logger.error("Tesseract OCR no está instalado en el sistema.")
+        return 1
+
+    output = open_output(args.output)
+    try:
+        summary = run_batch(args.folder, output, args.pages, args.order, args.workers,
+                            None if args.no_store else DB_PATH)
+    except KeyboardInterrupt:
+        logger.info("Interrumpido: los documentos terminados quedaron guardados, se puede reanudar")
+        return 130
+    finally:
+        output.close()
+
+    logger.info(f"Completado: {summary['documents']} documentos, {summary['pages']} páginas en "
+                f"{summary['seconds']} s ({summary['pages_per_second']} páginas/s), "
+                f"{summary['errors']} con error, {summary['needs_review']} para revisión, "
+                f"{summary['skipped']} omitidos")
+    return 1 if summary['errors'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,284 @@
+import os
+import sys
+import re
+import json
+import time
+import types
+import random
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Páginas de ejemplo y texto OCR de referencia
+SAMPLE_PAGES = [os.path.join(BASE_DIR, 'test', 'pagina_1.jpg'), os.path.join(BASE_DIR, 'test', 'pagina_2.jpg')]
+SAMPLE_TEXT_PATH = os.path.join(BASE_DIR, 'output.txt')
+
+DEFAULT_FOLDER_SIZES = (10, 1000, 100000)
+DEFAULT_TEXT_SCALES = (1, 100, 1000)
+
+# Confianza de las palabras que entrega el Tesseract simulado
+MOCK_CONFIDENCE = 90
+
+logger = logging.getLogger('benchmark')
+
+def install_mock_tesseract(sample_text):
+    """
+    Reemplaza pytesseract por una versión simulada que entrega el texto de
+    referencia al instante. Permite medir el resto de la cadena sin Tesseract.
+    """
+    words, blocks, pars, lines = [], [], [], []
+    for line_number, line in enumerate(sample_text.splitlines(), start=1):
+        for word in line.split():
+            words.append(word)
+            blocks.append(1)
+            pars.append(1)
+            lines.append(line_number)
+    data = {'text': words, 'block_num': blocks, 'par_num': pars, 'line_num': lines,
+            'conf': [MOCK_CONFIDENCE] * len(words)}
+
+    module = types.ModuleType('pytesseract')
+    module.Output = types.SimpleNamespace(DICT='dict')
+    module.image_to_data = lambda image, lang=None, config=None, output_type=None: data
+    module.image_to_string = lambda image, lang=None, config=None: sample_text
+    sys.modules['pytesseract'] = module
+
+def measure(function, repeat=5, setup=None):
+    """Ejecuta la función `repeat` veces y retorna estadísticas en milisegundos."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        'runs': repeat,
+        'min_ms': round(min(times), 3),
+        'median_ms': round(statistics.median(times), 3),
+        'mean_ms': round(statistics.mean(times), 3),
+        'max_ms': round(max(times), 3)
+    }
+
+def separate_field_patterns(definitions):
+    """
+    Referencia para la extracción de campos: cada definición de campo como una
+    expresión propia, que requiere una pasada completa sobre el texto por campo.
+    """
+    labels = [d['label'] for d in definitions if d['label']]
+    next_label = r"(?=[ \t]*[,;]?[ \t]+(?:" + '|'.join(labels) + r")|[ \t]*$)"
+    patterns = []
+    for definition in definitions:
+        value = definition.get('value') or (r"[^\n]*?" + next_label)
+        if definition['label']:
+            value = rf"{definition['label']}[ \t]*[:.\-]*[ \t]*({value})"
+        patterns.append(re.compile(value, re.MULTILINE))
+    return patterns
+
+def make_folder(folder, count, new_document_id):
+    """
+    Crea una carpeta con `count` archivos con nombres de ID de documento.
+    Son enlaces duros a las páginas de ejemplo (no ocupan espacio); si el
+    sistema de archivos no los permite, se copian.
+    """
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        target = os.path.join(folder, f"{new_document_id()}.jpg")
+        source = SAMPLE_PAGES[i % len(SAMPLE_PAGES)]
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
+    return folder
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_benchmarks(work_dir, folder_sizes, text_scales, repeat, mock):
+    # Importar después de preparar el entorno (Tesseract simulado, carpetas temporales)
+    import app
+    from functions import metrics, ocr_cache, previews
+    from functions import field_extractor, ocr_engine, test_ocr
+    from functions.doc_ids import new_document_id
+    from functions.image_index import ImageIndex
+    from functions.page_classifier import PAGE_PAGARE
+    from functions.perceptual_hash import HashIndex, page_features
+    from functions.jpeg_rotation import ROTATION_FALLBACKS, rotate_image_file
+
+    # Cachés en la carpeta temporal: el benchmark no toca los del proyecto
+    ocr_cache.CACHE_DIR = os.path.join(work_dir, 'cache', 'ocr')
+    previews.PREVIEW_DIR = os.path.join(work_dir, 'cache', 'previews')
+    metrics.METRICS_DIR = os.path.join(work_dir, 'cache', 'metrics')
+    if mock:
+        test_ocr.check_tesseract_installed = lambda: True
+        ocr_engine.use_engine('pytesseract')
+    # Medir el monitoreo sin generar las vistas previas ni los hashes de miles de archivos sintéticos
+    app.schedule_previews = lambda filenames: None
+    app.schedule_page_hashes = lambda filenames: None
+
+    results = {}
+
+    # Carpetas sintéticas de distintos tamaños
+    for size in folder_sizes:
+        folder = make_folder(os.path.join(work_dir, f"folder_{size}"), size, new_document_id)
+        index = ImageIndex.from_folder(folder)
+        results[f"get_latest_images_scan_{size}"] = measure(
+            lambda: app.get_latest_images(folder), repeat)
+        results[f"get_latest_images_indexed_{size}"] = measure(lambda: index.latest(2), repeat)
+
+        app.app.config['UPLOAD_FOLDER'] = folder
+        app.image_index.replace_all({})
+        results[f"monitor_rescan_cold_{size}"] = measure(app.rescan_folder, 1)
+        results[f"monitor_rescan_unchanged_{size}"] = measure(app.rescan_folder, repeat)
+
+    # Latencia del monitor: desde que aparece un archivo hasta que se publica el cambio
+    folder = make_folder(os.path.join(work_dir, 'monitor'), 10, new_document_id)
+    app.app.config['UPLOAD_FOLDER'] = folder
+    app.image_index.replace_all({})
+    app.folder_monitor_active = True
+    app.start_folder_monitor()
+    time.sleep(0.5)
+
+    def wait_for_new_file():
+        version = app.folder_version
+        shutil.copyfile(SAMPLE_PAGES[0], os.path.join(folder, f"{new_document_id()}.jpg"))
+        with app.folder_changes_cond:
+            app.folder_changes_cond.wait_for(lambda: app.folder_version > version, timeout=10)
+
+    results['monitor_event_latency'] = measure(wait_for_new_file, repeat)
+    app.folder_monitor_active = False
+
+    # Datos de imagen para la página y vista previa (en frío y desde el caché)
+    page_copy = os.path.join(work_dir, f"{new_document_id()}.jpg")
+    shutil.copyfile(SAMPLE_PAGES[0], page_copy)
+    with app.app.test_request_context():
+        results['get_image_data'] = measure(lambda: app.get_image_data(page_copy), repeat)
+    results['preview_cold'] = measure(lambda: previews.ensure_preview(page_copy), repeat,
+                                      setup=lambda: previews.remove_previews(page_copy))
+    results['preview_cached'] = measure(lambda: previews.ensure_preview(page_copy), repeat)
+
+    # Hash perceptual de una página y búsqueda de reescaneos en índices de cada tamaño
+    results['page_features'] = measure(lambda: page_features(page_copy), repeat)
+    value = page_features(page_copy)[0]
+    for size in folder_sizes:
+        hashes = HashIndex()
+        for i in range(size):
+            hashes.add(str(i), random.getrandbits(64), PAGE_PAGARE)
+        results[f"hash_index_near_{size}"] = measure(lambda: hashes.near(value), repeat)
+
+    # Rotación con cada modo
+    for mode in ROTATION_FALLBACKS:
+        used = []
+        results[f"rotate_{mode}"] = measure(
+            lambda: used.append(rotate_image_file(page_copy, 'left', mode)), repeat)
+        results[f"rotate_{mode}"]['mode_used'] = used[-1] if used else None
+
+    # OCR de una página con cada motor disponible (la misma región preprocesada),
+    # con el modelo ya cargado: lo que cuesta cada página además del reconocimiento
+    if not mock:
+        region = test_ocr.load_for_ocr(SAMPLE_PAGES[0], test_ocr.PREPROCESS_CONFIG)[0][1]
+        config = test_ocr.tesseract_config()
+        for name, engine_class in ocr_engine.ENGINE_CLASSES.items():
+            try:
+                engine = engine_class()
+            except ImportError as e:
+                results[f"ocr_engine_{name}"] = {'error': str(e)}
+                continue
+            try:
+                engine.warm_up(test_ocr.OCR_LANG, config)
+                results[f"ocr_engine_{name}"] = measure(
+                    lambda: engine.image_to_data(region, test_ocr.OCR_LANG, config), repeat)
+            except ocr_engine.OcrEngineError as e:
+                results[f"ocr_engine_{name}"] = {'error': str(e)}
+            finally:
+                engine.close()
+
+    # OCR completo (en frío y desde el caché)
+    def clear_ocr_cache():
+        shutil.rmtree(ocr_cache.CACHE_DIR, ignore_errors=True)
+        ocr_cache._memory_cache.clear()
+
+    results['perform_ocr_cold'] = measure(lambda: test_ocr.perform_ocr(SAMPLE_PAGES), repeat,
+                                          setup=clear_ocr_cache)
+    results['perform_ocr_cached'] = measure(lambda: test_ocr.perform_ocr(SAMPLE_PAGES), repeat)
+
+    # Extracción de campos sobre textos grandes
+    with open(SAMPLE_TEXT_PATH, 'r', encoding='utf-8') as f:
+        sample_text = f.read()
+    separate_patterns = separate_field_patterns(field_extractor.FIELD_DEFINITIONS)
+    for scale in text_scales:
+        text = sample_text * scale
+        results[f"extract_student_data_x{scale}"] = measure(lambda: test_ocr.extract_student_data(text), repeat)
+        results[f"extract_student_data_x{scale}"]['chars'] = len(text)
+
+        # La extracción en una pasada debe ser más rápida que una pasada por campo
+        single = measure(lambda: field_extractor.extract_fields(text), repeat)
+        separate = measure(lambda: [list(pattern.finditer(text)) for pattern in separate_patterns], repeat)
+        single['separate_passes_median_ms'] = separate['median_ms']
+        single['speedup'] = round(separate['median_ms'] / single['median_ms'], 2) if single['median_ms'] else None
+        results[f"extract_fields_x{scale}"] = single
+        if single['median_ms'] >= separate['median_ms']:
+            logger.warning(f"extract_fields (x{scale}) no es más rápido que una pasada por campo: "
+                           f"{single['median_ms']} ms contra {separate['median_ms']} ms")
+
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de la cadena de digitalización (resultado en JSON).')
+    parser.add_argument('-o', '--output', help='Archivo JSON de salida (por defecto, la salida estándar)')
+    parser.add_argument('--mock-tesseract', action='store_true',
+                        help='Simular Tesseract (para medir donde no está instalado)')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_FOLDER_SIZES)),
+                        help='Tamaños de las carpetas sintéticas, separados por coma')
+    parser.add_argument('--text-scales', default=','.join(map(str, DEFAULT_TEXT_SCALES)),
+                        help='Repeticiones del texto de referencia para la extracción')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='Repeticiones de cada medición')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(message)s')
+
+    with open(SAMPLE_TEXT_PATH, 'r', encoding='utf-8') as f:
+        sample_text = f.read()
+    if args.mock_tesseract:
+        install_mock_tesseract(sample_text)
+
+    work_dir = tempfile.mkdtemp(prefix='digitaliza_bench_')
+    try:
+        results = run_benchmarks(work_dir, [int(size) for size in args.sizes.split(',') if size],
+                                 [int(scale) for scale in args.text_scales.split(',') if scale],
+                                 args.repeat, args.mock_tesseract)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'mock_tesseract': args.mock_tesseract,
+            'repeat': args.repeat
+        },
+        'results': results
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
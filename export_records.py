@@ -0,0 +1,85 @@
+import os
+import sys
+import logging
+import argparse
+import tempfile
+from datetime import datetime
+
+from functions.database import DB_PATH, init_db
+from functions.document_store import match_pending_documents
+from functions.record_export import (EXPORT_FORMATS, csv_chunks, export_columns, export_rows, write_xlsx,
+                                     xlsx_available)
+from functions.student_index import StudentIndex
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def default_output(export_format):
+    """Nombre de archivo por defecto: db_input_<fecha y hora>.<formato>."""
+    return f"db_input_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+
+def write_export(rows, columns, output, export_format):
+    """
+    Escribe la exportación en output ('-' para la salida estándar, solo CSV).
+    Se escribe a un archivo temporal y se renombra al terminar: una exportación
+    interrumpida no deja un archivo a medias.
+    """
+    if output == '-':
+        for chunk in csv_chunks(rows, columns):
+            sys.stdout.write(chunk)
+        return
+
+    folder = os.path.dirname(os.path.abspath(output))
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        if export_format == 'xlsx':
+            os.close(fd)
+            write_xlsx(rows, columns, tmp_path)
+        else:
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+                for chunk in csv_chunks(rows, columns):
+                    f.write(chunk)
+        os.replace(tmp_path, output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Exporta los documentos digitalizados con las columnas de db_input.csv.')
+    parser.add_argument('-o', '--output', default=None,
+                        help="Archivo de salida (por defecto db_input_<fecha>.<formato>; '-' para la salida estándar)")
+    parser.add_argument('-f', '--format', choices=EXPORT_FORMATS, default='csv',
+                        help='Formato de salida (xlsx requiere openpyxl)')
+    parser.add_argument('--since-last', action='store_true',
+                        help='Exportar solo los documentos nuevos o modificados desde la última exportación')
+    parser.add_argument('--no-match', action='store_true',
+                        help='No asociar antes con db_input.csv los documentos que aún no tienen alumno')
+    parser.add_argument('--db', default=DB_PATH, help='Base de documentos (por defecto digitaliza.db)')
+    args = parser.parse_args(argv)
+
+    if args.format == 'xlsx' and not xlsx_available():
+        logger.error("Para exportar a XLSX instala openpyxl: pip install openpyxl")
+        return 1
+    if args.format == 'xlsx' and args.output == '-':
+        logger.error("El formato XLSX no se puede escribir en la salida estándar")
+        return 1
+
+    init_db(args.db)
+    if not args.no_match:
+        match_pending_documents(StudentIndex(), args.db)
+
+    output = args.output or default_output(args.format)
+    rows = export_rows(args.format, args.since_last, args.db)
+    try:
+        write_export(rows, export_columns(), output, args.format)
+    except KeyboardInterrupt:
+        logger.info("Interrumpido: la exportación no se registró")
+        return 130
+
+    if output != '-':
+        logger.info(f"Exportación guardada en {output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ruta base del proyecto (carpeta que contiene app.py)
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+DB_PATH = os.path.join(BASE_DIR, 'digitaliza.db')
+SCHEMA_PATH = os.path.join(BASE_DIR, 'schema.sql')
+
+# Búsqueda de texto completo (FTS5): opcional, no todas las compilaciones de SQLite la traen
+FTS_SCHEMA_PATH = os.path.join(BASE_DIR, 'schema_fts.sql')
+
+# Columnas agregadas después de crear una tabla: (tabla, columna, tipo)
+MIGRATIONS = [
+    ('jobs', 'image_key', 'TEXT'),
+    ('documents', 'change_seq', 'INTEGER NOT NULL DEFAULT 0'),
+    ('exports', 'since_seq', 'INTEGER'),
+    ('exports', 'until_seq', 'INTEGER'),
+]
+
+def connect(db_path=DB_PATH):
+    """Abre una conexión a la base de datos SQLite local."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    # Con WAL, NORMAL no sincroniza el disco en cada commit y sigue sin corromper
+    # la base; solo las últimas transacciones podrían perderse si se corta la luz
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA foreign_keys=ON')
+    return conn
+
+def has_fts(conn):
+    """Indica si la base tiene el índice de texto completo de las páginas."""
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pages_fts'"
+    ).fetchone() is not None
+
+def init_db(db_path=DB_PATH, schema_path=SCHEMA_PATH):
+    """Crea las tablas definidas en schema.sql si aún no existen."""
+    with open(schema_path, 'r', encoding='utf-8') as f:
+        schema = f.read()
+    
+    conn = connect(db_path)
+    try:
+        # WAL permite que la web lea mientras los procesos de OCR escriben
+        conn.execute('PRAGMA journal_mode=WAL')
+        _apply_migrations(conn)
+        conn.executescript(schema)
+        conn.commit()
+        _apply_fts_schema(conn)
+    finally:
+        conn.close()
+    
+    logger.info(f"Base de datos verificada: {db_path}")
+    return db_path
+
+def _apply_fts_schema(conn, path=FTS_SCHEMA_PATH):
+    """Crea el índice de texto completo; si es nuevo, lo llena con las páginas existentes."""
+    existed = has_fts(conn)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            conn.executescript(f.read())
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Búsqueda de texto completo no disponible (FTS5): {e}")
+        return
+    if not existed:
+        conn.execute("INSERT INTO pages_fts (pages_fts) VALUES ('rebuild')")
+    conn.commit()
+
+def _apply_migrations(conn):
+    """Agrega a las tablas existentes las columnas nuevas del esquema."""
+    for table, column, column_type in MIGRATIONS:
+        columns = [row['name'] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if columns and column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+            logger.info(f"Columna agregada: {table}.{column}")
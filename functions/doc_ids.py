@@ -0,0 +1,95 @@
+import os
+import re
+import time
+import errno
+import shutil
+import secrets
+import threading
+
+# Alfabeto Base32 de Crockford (sin I, L, O ni U): los IDs se ordenan como texto
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+# ID estilo ULID: 10 caracteres de tiempo (ms) + 16 de parte aleatoria = 26
+ID_LENGTH = 26
+ID_PATTERN = re.compile(rf"[{ALPHABET}]{{{ID_LENGTH}}}")
+
+# Nombres del formato anterior (timestamp en segundos + 3 letras): no se renombran
+LEGACY_PATTERN = re.compile(r"\d{10,}[a-z]{3}")
+
+RANDOM_BITS = 80
+
+_last_time = 0
+_last_random = 0
+_lock = threading.Lock()
+
+def _encode(value, length):
+    chars = []
+    for _ in range(length):
+        value, remainder = divmod(value, 32)
+        chars.append(ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
+def new_document_id():
+    """
+    Genera un ID único y ordenable por fecha de creación (estilo ULID).
+    Dentro de un mismo milisegundo la parte aleatoria se incrementa, así que
+    los IDs de un proceso son estrictamente crecientes.
+    """
+    global _last_time, _last_random
+    with _lock:
+        now = int(time.time() * 1000)
+        if now <= _last_time:
+            now = _last_time
+            _last_random += 1
+            if _last_random >> RANDOM_BITS:
+                # Se agotó la parte aleatoria de este milisegundo: pasar al siguiente
+                now += 1
+                _last_random = secrets.randbits(RANDOM_BITS - 1)
+        else:
+            # Bit alto en 0: deja margen para incrementar dentro del milisegundo
+            _last_random = secrets.randbits(RANDOM_BITS - 1)
+        _last_time = now
+        return _encode(now, 10) + _encode(_last_random, 16)
+
+def is_document_name(filename):
+    """Indica si el nombre ya tiene el formato de ID (o el formato anterior)."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return bool(ID_PATTERN.fullmatch(stem) or LEGACY_PATTERN.fullmatch(stem))
+
+def move_to_new_document(source, folder, extension='.jpg'):
+    """
+    Mueve un archivo a la carpeta con un nombre nuevo sin sobrescribir nunca otro.
+    Usa un enlace duro (que falla si el destino existe) y luego borra el origen;
+    si el sistema de archivos no lo permite, reserva el nombre y lo reemplaza.
+    Retorna el nombre nuevo.
+    """
+    while True:
+        filename = f"{new_document_id()}{extension}"
+        target = os.path.join(folder, filename)
+        try:
+            os.link(source, target)
+        except FileExistsError:
+            continue
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.ENOTSUP, errno.EMLINK):
+                raise
+            _move_reserved(source, target)
+            return filename
+        os.remove(source)
+        return filename
+
+def _move_reserved(source, target):
+    # Reservar el nombre con O_EXCL y luego reemplazar el archivo vacío
+    with open(target, 'xb'):
+        pass
+    try:
+        os.replace(source, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            os.remove(target)
+            raise
+        # Otro disco: copiar junto al destino y luego renombrar
+        tmp_target = f"{target}.tmp"
+        shutil.copyfile(source, tmp_target)
+        os.replace(tmp_target, target)
+        os.remove(source)
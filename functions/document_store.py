@@ -0,0 +1,228 @@
+import json
+import time
+import logging
+import sqlite3
+from datetime import datetime
+
+from functions.database import DB_PATH, connect, has_fts
+from functions.doc_ids import new_document_id
+from functions.field_extractor import split_rut
+from functions.student_index import normalize_folio, normalize_rut
+
+logger = logging.getLogger(__name__)
+
+# Columnas de documents que se listan en las búsquedas (sin el registro del alumno)
+SUMMARY_COLUMNS = ('id', 'image_key', 'job_id', 'rut', 'rut_dv', 'folio', 'fecha', 'nombre', 'needs_review',
+                   'matched_by', 'created_at')
+_SUMMARY = ', '.join(SUMMARY_COLUMNS)
+_SUMMARY_JOINED = ', '.join(f"d.{column}" for column in SUMMARY_COLUMNS)
+
+# Siguiente número de cambio de documents. Se calcula dentro de la sentencia que
+# escribe, con la base ya bloqueada para escritura: los números quedan en el orden
+# en que se confirman las transacciones, a diferencia de updated_at (la hora se
+# toma antes de escribir y una transacción lenta puede confirmarse después)
+NEXT_CHANGE_SEQ = "(SELECT coalesce(max(change_seq), 0) + 1 FROM documents)"
+
+def iso_date(value):
+    """Convierte una fecha del pagaré (dd/mm/aaaa) a aaaa-mm-dd, o None si no es válida."""
+    try:
+        return datetime.strptime((value or '').strip(), '%d/%m/%Y').strftime('%Y-%m-%d')
+    except ValueError:
+        return None
+
+def _field_value(fields, name):
+    field = fields.get(name)
+    return field['value'] if field else None
+
+def _write_document(conn, result, job_id, now):
+    """Inserta o reemplaza un documento con sus páginas y campos (dentro de una transacción)."""
+    fields = result.get('fields') or {}
+    rut = _field_value(fields, 'rut')
+    rut_dv = split_rut(rut)[1] if rut else None
+    values = (job_id, normalize_rut(rut), rut_dv, normalize_folio(_field_value(fields, 'folio')),
+              iso_date(_field_value(fields, 'fecha')), _field_value(fields, 'nombre'),
+              int(bool(result.get('needs_review', True))), now)
+
+    # Un nuevo OCR de las mismas imágenes actualiza el documento existente
+    row = conn.execute("SELECT id FROM documents WHERE image_key = ?", (result['image_key'],)).fetchone()
+    if row:
+        document_id = row['id']
+        conn.execute(
+            "UPDATE documents SET job_id = ?, rut = ?, rut_dv = ?, folio = ?, fecha = ?, nombre = ?, "
+            f"needs_review = ?, updated_at = ?, change_seq = {NEXT_CHANGE_SEQ} WHERE id = ?", (*values, document_id))
+        conn.execute("DELETE FROM pages WHERE document_id = ?", (document_id,))
+        conn.execute("DELETE FROM fields WHERE document_id = ?", (document_id,))
+    else:
+        document_id = new_document_id()
+        conn.execute(
+            "INSERT INTO documents (id, image_key, job_id, rut, rut_dv, folio, fecha, nombre, needs_review, "
+            f"updated_at, created_at, change_seq) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {NEXT_CHANGE_SEQ})",
+            (document_id, result['image_key'], *values, now))
+
+    conn.executemany(
+        "INSERT INTO pages (document_id, number, file, file_page, doc_type, ocr_mode, text) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(document_id, number, page.get('file'), page.get('page'), page.get('doc_type'),
+          page.get('ocr_mode'), page.get('text') or '')
+         for number, page in enumerate(result.get('documents') or [], start=1)])
+    conn.executemany(
+        "INSERT INTO fields (document_id, name, value, confidence, valid) VALUES (?, ?, ?, ?, ?)",
+        [(document_id, name, field['value'], field.get('confidence'),
+          None if field.get('valid') is None else int(field['valid']))
+         for name, field in fields.items()])
+    return document_id
+
+def save_ocr_results(results, db_path=DB_PATH):
+    """
+    Guarda varios resultados de perform_ocr en una sola transacción.
+    results es una lista de (resultado, id del trabajo o None). Retorna los IDs de documento.
+    """
+    now = time.time()
+    conn = connect(db_path)
+    try:
+        with conn:
+            return [_write_document(conn, result, job_id, now) for result, job_id in results]
+    finally:
+        conn.close()
+
+def save_ocr_result(result, job_id=None, db_path=DB_PATH):
+    """Guarda un resultado exitoso de perform_ocr. Retorna el ID del documento."""
+    document_id = save_ocr_results([(result, job_id)], db_path)[0]
+    logger.info(f"Documento {document_id} guardado ({result['image_key'][:12]})")
+    return document_id
+
+def record_match(image_key, match, db_path=DB_PATH):
+    """
+    Registra el alumno de db_input.csv asociado al documento (ver
+    StudentIndex.match). Retorna el ID del documento, o None si no existe.
+    """
+    conn = connect(db_path)
+    try:
+        with conn:
+            row = conn.execute("SELECT id FROM documents WHERE image_key = ?", (image_key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE documents SET matched_by = ?, student_record = ?, updated_at = ?, "
+                f"change_seq = {NEXT_CHANGE_SEQ} WHERE id = ?",
+                (match['matched_by'], json.dumps(match['record'], ensure_ascii=False), time.time(), row['id']))
+    finally:
+        conn.close()
+    return row['id']
+
+def match_pending_documents(index, db_path=DB_PATH):
+    """
+    Asocia con db_input.csv (index: StudentIndex) los documentos sin alumno que
+    no requieren revisión, por ejemplo los de batch_ocr.py, con los mismos
+    criterios que /process_document. Retorna la cantidad de documentos asociados.
+    """
+    conn = connect(db_path)
+    try:
+        pending = conn.execute(
+            "SELECT id, rut, folio, nombre FROM documents "
+            "WHERE student_record IS NULL AND needs_review = 0").fetchall()
+        now = time.time()
+        updates = []
+        for document in pending:
+            match = index.match({'rut': document['rut'], 'folio': document['folio'], 'nombre': document['nombre']})
+            if match is not None:
+                updates.append((match['matched_by'], json.dumps(match['record'], ensure_ascii=False), now,
+                                document['id']))
+        with conn:
+            conn.executemany(
+                "UPDATE documents SET matched_by = ?, student_record = ?, updated_at = ?, "
+                f"change_seq = {NEXT_CHANGE_SEQ} WHERE id = ?", updates)
+    finally:
+        conn.close()
+    if pending:
+        logger.info(f"Documentos asociados a un alumno: {len(updates)} de {len(pending)} pendientes")
+    return len(updates)
+
+def get_document(document_id, db_path=DB_PATH):
+    """Retorna el documento con sus páginas y campos, o None si no existe."""
+    conn = connect(db_path)
+    try:
+        row = conn.execute("SELECT * FROM documents WHERE id = ?", (document_id,)).fetchone()
+        if row is None:
+            return None
+        document = dict(row)
+        document['student_record'] = json.loads(row['student_record']) if row['student_record'] else None
+        document['pages'] = [dict(page) for page in conn.execute(
+            "SELECT number, file, file_page, doc_type, ocr_mode, text FROM pages "
+            "WHERE document_id = ? ORDER BY number", (document_id,))]
+        document['fields'] = {field['name']: {'value': field['value'], 'confidence': field['confidence'],
+                                              'valid': None if field['valid'] is None else bool(field['valid'])}
+                              for field in conn.execute(
+                                  "SELECT name, value, confidence, valid FROM fields WHERE document_id = ?",
+                                  (document_id,))}
+    finally:
+        conn.close()
+    return document
+
+def find_documents(rut=None, folio=None, date_from=None, date_to=None, needs_review=None, limit=50,
+                   db_path=DB_PATH):
+    """
+    Busca documentos por RUT, folio y/o rango de fechas del pagaré (aaaa-mm-dd),
+    cada filtro sobre su índice. Retorna los más recientes primero.
+    """
+    conditions, params = [], []
+    if rut:
+        conditions.append("rut = ?")
+        params.append(normalize_rut(rut))
+    if folio:
+        conditions.append("folio = ?")
+        params.append(normalize_folio(folio))
+    if date_from:
+        conditions.append("fecha >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("fecha <= ?")
+        params.append(date_to)
+    if needs_review is not None:
+        conditions.append("needs_review = ?")
+        params.append(int(bool(needs_review)))
+
+    query = f"SELECT {_SUMMARY} FROM documents"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY created_at DESC LIMIT ?"
+    params.append(limit)
+
+    conn = connect(db_path)
+    try:
+        return [dict(row) for row in conn.execute(query, params)]
+    finally:
+        conn.close()
+
+def _fts_query(text):
+    # Cada palabra entre comillas: los puntos y guiones de un RUT no son sintaxis de FTS5
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+def search_text(text, limit=20, db_path=DB_PATH):
+    """
+    Búsqueda de texto completo en el OCR de las páginas (FTS5, ordenada por
+    relevancia). Sin FTS5 se recurre a LIKE sobre la tabla de páginas.
+    Retorna una lista de documentos con la página y un fragmento del texto.
+    """
+    if not text or not text.strip():
+        return []
+    conn = connect(db_path)
+    try:
+        if has_fts(conn):
+            rows = conn.execute(
+                f"SELECT {_SUMMARY_JOINED}, "
+                "p.number AS page, snippet(pages_fts, 0, '[', ']', '…', 12) AS snippet "
+                "FROM pages_fts JOIN pages p ON p.id = pages_fts.rowid JOIN documents d ON d.id = p.document_id "
+                "WHERE pages_fts MATCH ? ORDER BY rank LIMIT ?", (_fts_query(text), limit))
+        else:
+            rows = conn.execute(
+                f"SELECT {_SUMMARY_JOINED}, "
+                "p.number AS page, substr(p.text, 1, 200) AS snippet "
+                "FROM pages p JOIN documents d ON d.id = p.document_id "
+                "WHERE p.text LIKE ? ORDER BY d.created_at DESC LIMIT ?", (f"%{text.strip()}%", limit))
+        return [dict(row) for row in rows]
+    except sqlite3.OperationalError as e:
+        logger.error(f"Error en la búsqueda de texto: {e}")
+        return []
+    finally:
+        conn.close()
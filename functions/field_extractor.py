@@ -0,0 +1,237 @@
+import re
+from bisect import bisect_right
+
+# Confianza mínima (0-1) para aceptar un campo sin revisión manual
+REVIEW_CONFIDENCE = 0.80
+
+# Campos que deben encontrarse y ser confiables para omitir la revisión manual
+REQUIRED_FIELDS = ('rut', 'folio')
+
+RUT_VALUE = r"\d{1,2}\.?\d{3}\.?\d{3}\s*-\s*[\dkK]"
+
+# Definición declarativa de los campos del pagaré.
+#   name:     nombre del campo extraído
+#   label:    expresión de la etiqueta que precede al valor (None si el valor se reconoce solo)
+#   value:    expresión del valor (por defecto, hasta la siguiente etiqueta o el fin de línea)
+#   priority: si hay varias coincidencias, gana la de mayor prioridad y luego la primera
+#   section:  True si el campo se repite en la sección del codeudor (se agrega '_aval')
+#   starts:   nombre de la sección que comienza con esta etiqueta
+FIELD_DEFINITIONS = [
+    {'name': 'nombre', 'label': r"NOMBRE DEUDOR\(A\)"},
+    {'name': 'nombre_aval', 'label': r"CODEUDOR\(A\) SOLIDARIO\(A\) SR\(A\)\.?", 'starts': 'aval'},
+    {'name': 'rut', 'label': r"CEDULA NACIONAL DE IDENTIDAD", 'value': RUT_VALUE, 'priority': 2, 'section': True},
+    {'name': 'rut', 'label': r"\bRut\s*:?\s*-?", 'value': RUT_VALUE, 'priority': 1},
+    {'name': 'carrera', 'label': r"CARRERA"},
+    {'name': 'domicilio', 'label': r"DOMICILIO", 'section': True},
+    {'name': 'poblacion', 'label': r"POBLACI[OÓ]N\s*/\s*VILLA", 'section': True},
+    {'name': 'comuna', 'label': r"COMUNA", 'section': True},
+    {'name': 'ciudad', 'label': r"CIUDAD", 'section': True},
+    {'name': 'telefono', 'label': r"TEL[EÉ]FONO", 'section': True},
+    {'name': 'correo', 'label': r"CORREO ELECTR[OÓ]NICO", 'section': True},
+    {'name': 'fecha', 'label': r"\bFecha\s*-?", 'value': r"\d{1,2}/\d{1,2}/\d{4}"},
+    {'name': 'monto_utm', 'label': r"equivalentes a", 'value': r"\d[\d.]*,?\d*"},
+    # Folio: 10 dígitos después de punto y coma o, si no, cualquier secuencia de 10 dígitos
+    {'name': 'folio', 'label': None, 'value': r";\s*(?P<digits>\d{10})", 'priority': 2},
+    {'name': 'folio', 'label': None, 'value': r"\d{10}", 'priority': 1},
+]
+
+# Columnas de db_input.csv que se obtienen de cada campo extraído
+FIELD_COLUMNS = {
+    'rut': ('rut', 'dig_ver'),
+    'nombre': ('apellido_pat_alumno', 'apellido_mat_alumno', 'nombres_alumno'),
+    'domicilio': ('direccion_padres',),
+    'telefono': ('tel_1',),
+    'correo': ('correo_alumno',),
+    'folio': ('folio',),
+    'fecha': ('fecha',),
+    'rut_aval': ('rut_aval',),
+    'nombre_aval': ('nombres_aval', 'ape_pat_aval', 'ap_mat_aval'),
+    'domicilio_aval': ('dir_aval',),
+    'ciudad_aval': ('ciudad_aval',),
+    'telefono_aval': ('tel_aval',),
+    'correo_aval': ('mail_aval',),
+}
+
+def _first_chars(labels):
+    """
+    Clase de caracteres con la primera letra de cada etiqueta, o '' si alguna no
+    empieza con una letra fija. Adelante de la alternativa permite descartar
+    rápido las posiciones donde no empieza ninguna etiqueta.
+    """
+    chars = set()
+    for label in labels:
+        first = label[2:3] if label.startswith(r"\b") else label[:1]
+        if not first.isalnum():
+            return ''
+        chars.add(first)
+    return '(?=[' + ''.join(sorted(chars)) + '])'
+
+def _compile(definitions):
+    """
+    Compila las definiciones: una sola expresión con todas las etiquetas (una
+    pasada sobre el texto), la expresión del valor de cada campo con etiqueta,
+    que se aplica justo después de ella, y las de los campos sin etiqueta, que
+    se buscan por separado.
+    """
+    labels = [d['label'] for d in definitions if d['label']]
+    # Un valor sin patrón propio termina antes de la siguiente etiqueta o al fin de línea
+    next_label = r"(?=[ \t]*[,;]?[ \t]+(?:" + '|'.join(labels) + r")|[ \t]*$)"
+
+    label_branches, values, searches = [], {}, []
+    for i, definition in enumerate(definitions):
+        value = definition.get('value') or (r"[^\n]*?" + next_label)
+        if definition['label']:
+            # El grupo vacío al final identifica la etiqueta (lastgroup) sin ocultar su
+            # primera letra: el motor descarta cada alternativa con solo mirarla
+            label_branches.append(rf"{definition['label']}(?P<l{i}>)[ \t]*[:.\-]*[ \t]*")
+            values[f"l{i}"] = (definition, re.compile(value, re.MULTILINE))
+        else:
+            searches.append((definition, re.compile(value)))
+    label_pattern = _first_chars(labels) + '(?:' + '|'.join(label_branches) + ')'
+    return re.compile(label_pattern), values, searches
+
+_LABEL_PATTERN, _VALUE_PATTERNS, _SEARCH_PATTERNS = _compile(FIELD_DEFINITIONS)
+
+def rut_check_digit(number):
+    """Calcula el dígito verificador (módulo 11) de un RUT."""
+    total, factor = 0, 2
+    for digit in reversed(str(number)):
+        total += int(digit) * factor
+        factor = 2 if factor == 7 else factor + 1
+    remainder = 11 - total % 11
+    return {11: '0', 10: 'K'}.get(remainder, str(remainder))
+
+def split_rut(rut):
+    """Separa un RUT '20.500.542-0' en número y dígito verificador: ('20500542', '0')."""
+    clean = re.sub(r"[^\dkK]", '', rut or '').upper()
+    return clean[:-1], clean[-1:]
+
+def is_valid_rut(rut):
+    """Valida el dígito verificador de un RUT con el algoritmo módulo 11."""
+    number, check_digit = split_rut(rut)
+    return bool(number) and number.isdigit() and rut_check_digit(number) == check_digit
+
+def span_confidence(start, end, word_spans):
+    """
+    Confianza promedio (0-1) de las palabras del OCR que cubren el tramo [start, end).
+    word_spans es una lista de (inicio, fin, confianza 0-100). Retorna None sin datos.
+    """
+    if not word_spans:
+        return None
+    confidences = [conf for word_start, word_end, conf in word_spans
+                   if word_start < end and word_end > start and conf >= 0]
+    if not confidences:
+        return None
+    return round(sum(confidences) / len(confidences) / 100, 3)
+
+def _clean_value(name, value):
+    value = value.strip(' \t,;')
+    if name == 'carrera' and " pa" in value:
+        # Si hay "pa" u otros textos extraños al final, eliminarlos
+        value = value.split(" pa")[0].strip()
+    if name.startswith('rut'):
+        value = re.sub(r"\s+", '', value)
+    return value
+
+def _add_field(found, name, value, span, priority, word_spans):
+    """Agrega el campo si no hay otro con igual o mayor prioridad. Retorna True si se agregó."""
+    if name in found and found[name]['priority'] >= priority:
+        return False
+    value = _clean_value(name, value)
+    if not value:
+        return False
+    found[name] = {
+        'value': value,
+        'confidence': span_confidence(span[0], span[1], word_spans),
+        'valid': is_valid_rut(value) if name.startswith('rut') else True,
+        'priority': priority
+    }
+    return True
+
+def extract_fields(text, word_spans=None):
+    """
+    Extrae todos los campos definidos en FIELD_DEFINITIONS: una pasada sobre el
+    texto encuentra todas las etiquetas y el valor de cada una se lee justo
+    después; los campos sin etiqueta (folio) se buscan aparte, fuera de los
+    valores ya leídos. Retorna {campo: {'value', 'confidence', 'valid'}}; la
+    confianza se calcula con los datos por palabra de Tesseract (word_spans).
+    """
+    found = {}
+    section = None
+    consumed = []
+    position = 0
+    for label in _LABEL_PATTERN.finditer(text):
+        # Una etiqueta dentro del valor de la anterior es parte de ese valor
+        if label.start() < position:
+            continue
+        definition, value_pattern = _VALUE_PATTERNS[label.lastgroup]
+        match = value_pattern.match(text, label.end())
+        if match is None:
+            continue
+        if definition.get('starts'):
+            section = definition['starts']
+
+        name = definition['name']
+        if section and definition.get('section'):
+            name = f"{name}_{section}"
+
+        position = match.end()
+        consumed.append((label.start(), position))
+        _add_field(found, name, match.group(), match.span(), definition.get('priority', 1), word_spans)
+
+    for definition, pattern in _SEARCH_PATTERNS:
+        for match in pattern.finditer(text):
+            inside = bisect_right(consumed, (match.start(), len(text))) - 1
+            if inside >= 0 and match.start() < consumed[inside][1]:
+                continue
+            group = 'digits' if 'digits' in pattern.groupindex else 0
+            if _add_field(found, definition['name'], match.group(group), match.span(group),
+                          definition.get('priority', 1), word_spans):
+                break
+
+    for field in found.values():
+        del field['priority']
+    return found
+
+def needs_review(fields, min_confidence=REVIEW_CONFIDENCE):
+    """Indica si algún campo obligatorio falta, es inválido o tiene baja confianza."""
+    for name in REQUIRED_FIELDS:
+        field = fields.get(name)
+        if not field or not field['valid']:
+            return True
+        if field['confidence'] is None or field['confidence'] < min_confidence:
+            return True
+    return False
+
+def _split_name(name, surnames_first):
+    """Separa un nombre completo en (apellido paterno, apellido materno, nombres)."""
+    if surnames_first and ',' in name:
+        surnames, first_names = [part.strip() for part in name.split(',', 1)]
+        parts = surnames.split()
+        return (parts[0] if parts else '', ' '.join(parts[1:]), first_names)
+    parts = name.split()
+    if len(parts) < 3:
+        return (parts[-1] if len(parts) > 1 else '', '', parts[0] if parts else '')
+    return (parts[-2], parts[-1], ' '.join(parts[:-2]))
+
+def fields_to_columns(fields):
+    """Convierte los campos extraídos a las columnas de db_input.csv."""
+    columns = {}
+    for name, field in fields.items():
+        targets = FIELD_COLUMNS.get(name)
+        if not targets:
+            continue
+        value = field['value']
+        if name in ('rut', 'rut_aval'):
+            number, check_digit = split_rut(value)
+            values = (number, check_digit) if name == 'rut' else (number,)
+        elif name == 'nombre':
+            # El pagaré trae "APELLIDOS, NOMBRES"
+            values = _split_name(value, surnames_first=True)
+        elif name == 'nombre_aval':
+            paternal, maternal, first_names = _split_name(value, surnames_first=False)
+            values = (first_names, paternal, maternal)
+        else:
+            values = (value,)
+        columns.update(zip(targets, values))
+    return columns
@@ -0,0 +1,94 @@
+import os
+import logging
+
+from functions import ocr_cache
+from functions.database import DB_PATH, connect
+
+logger = logging.getLogger(__name__)
+
+# Nombres por consulta al buscar los hashes ya guardados de muchos archivos
+LOOKUP_BATCH = 500
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+def record_digest(folder, filename, digest, db_path=DB_PATH):
+    """Guarda el SHA-256 ya calculado de un archivo de la carpeta (por ejemplo, al terminar su subida)."""
+    mtime_ns, size = _signature(os.path.join(folder, filename))
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO file_digests (filename, sha256, mtime_ns, size) VALUES (?, ?, ?, ?)",
+                (filename, digest, mtime_ns, size))
+    finally:
+        conn.close()
+
+def index_digests(folder, filenames, db_path=DB_PATH):
+    """
+    Calcula y guarda el SHA-256 de los archivos nuevos o modificados de la
+    carpeta. Los que no cambiaron de fecha ni de tamaño desde que se guardó su
+    hash no se vuelven a leer (por ejemplo, al reiniciar el servidor).
+    Retorna la cantidad de archivos leídos.
+    """
+    filenames = list(filenames)
+    conn = connect(db_path)
+    try:
+        stored = {}
+        for start in range(0, len(filenames), LOOKUP_BATCH):
+            batch = filenames[start:start + LOOKUP_BATCH]
+            stored.update((row['filename'], (row['mtime_ns'], row['size'])) for row in conn.execute(
+                f"SELECT filename, mtime_ns, size FROM file_digests WHERE filename IN ({','.join('?' * len(batch))})",
+                batch))
+
+        rows = []
+        for filename in filenames:
+            path = os.path.join(folder, filename)
+            try:
+                signature = _signature(path)
+                if stored.get(filename) == signature:
+                    continue
+                rows.append((filename, ocr_cache.file_hash(path), *signature))
+            except OSError:
+                continue  # El archivo se eliminó o renombró antes de leerlo
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO file_digests (filename, sha256, mtime_ns, size) VALUES (?, ?, ?, ?)", rows)
+    finally:
+        conn.close()
+    return len(rows)
+
+def forget_digests(filenames, db_path=DB_PATH):
+    """Quita los archivos eliminados o renombrados."""
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.executemany("DELETE FROM file_digests WHERE filename = ?", [(name,) for name in filenames])
+    finally:
+        conn.close()
+
+def find_by_digest(folder, digest, db_path=DB_PATH):
+    """
+    Nombre de un archivo de la carpeta con ese SHA-256, o None. Se confirma que
+    el archivo siga igual (fecha y tamaño); las entradas que ya no corresponden
+    se eliminan.
+    """
+    stale = []
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT filename, mtime_ns, size FROM file_digests WHERE sha256 = ?", (digest,)).fetchall()
+        for row in rows:
+            try:
+                if _signature(os.path.join(folder, row['filename'])) == (row['mtime_ns'], row['size']):
+                    return row['filename']
+            except OSError:
+                pass
+            stale.append((row['filename'],))
+        return None
+    finally:
+        if stale:
+            with conn:
+                conn.executemany("DELETE FROM file_digests WHERE filename = ?", stale)
+        conn.close()
@@ -0,0 +1,117 @@
+import os
+import sys
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Constantes de inotify (ver <sys/inotify.h>)
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+
+# Eventos que interesan para la carpeta de entrada. IN_CREATE es el único evento
+# de un enlace duro, con el que la aplicación mueve archivos completos a la carpeta
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+              IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+# Eventos que indican que el archivo ya no está en la carpeta
+REMOVED_MASK = IN_DELETE | IN_MOVED_FROM
+
+# Eventos que indican que la propia carpeta desapareció o el watch se perdió
+FOLDER_GONE_MASK = IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+_EVENT_HEADER = struct.Struct('iIII')
+
+_libc = None
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    return _libc
+
+def inotify_available():
+    """Indica si el sistema soporta inotify (solo Linux)."""
+    if not sys.platform.startswith('linux'):
+        return False
+    try:
+        return hasattr(_load_libc(), 'inotify_init1')
+    except OSError:
+        return False
+
+class FolderGoneError(Exception):
+    """La carpeta vigilada fue eliminada o movida."""
+
+class QueueOverflowError(Exception):
+    """El kernel descartó eventos: hay que volver a recorrer la carpeta."""
+
+class InotifyWatcher:
+    """
+    Vigila una carpeta con inotify y entrega los eventos de sus archivos.
+    Solo informa los archivos que cambiaron, sin recorrer la carpeta.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        libc = _load_libc()
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, os.strerror(errno), folder)
+
+    def read_events(self, timeout=1.0):
+        """
+        Espera hasta `timeout` segundos y retorna una lista de (mask, nombre).
+        Lanza FolderGoneError o QueueOverflowError cuando corresponde.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+
+        data = os.read(self.fd, 64 * 1024)
+        events = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                raise QueueOverflowError()
+            if mask & FOLDER_GONE_MASK:
+                raise FolderGoneError(self.folder)
+            if name and not mask & IN_ISDIR:
+                events.append((mask, name))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,108 @@
+import os
+import threading
+from bisect import bisect_left, insort
+
+# Extensiones aceptadas en la carpeta input: imágenes JPG y PDF de varias páginas
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg')
+PDF_EXTENSIONS = ('.pdf',)
+INPUT_EXTENSIONS = IMAGE_EXTENSIONS + PDF_EXTENSIONS
+
+def is_image_file(filename):
+    """Indica si el archivo es una imagen JPG."""
+    return filename.lower().endswith(IMAGE_EXTENSIONS)
+
+def is_pdf_file(filename):
+    """Indica si el archivo es un PDF."""
+    return filename.lower().endswith(PDF_EXTENSIONS)
+
+def is_input_file(filename):
+    """Indica si el archivo es un documento aceptado en la carpeta input (JPG o PDF)."""
+    return filename.lower().endswith(INPUT_EXTENSIONS)
+
+class ImageIndex:
+    """
+    Índice de los documentos (imágenes y PDF) de una carpeta ordenado por fecha de modificación.
+    Se mantiene de forma incremental (agregar, modificar, eliminar) y obtener
+    las k imágenes más recientes cuesta O(k), sin recorrer ni ordenar la carpeta.
+    """
+
+    def __init__(self, entries=None):
+        self._lock = threading.Lock()
+        self._mtimes = {}
+        self._order = []  # Lista ordenada de (mtime, nombre)
+        self.ready = False
+        if entries is not None:
+            self.replace_all(entries)
+
+    @classmethod
+    def from_folder(cls, folder):
+        """Construye el índice recorriendo la carpeta una sola vez."""
+        entries = {}
+        with os.scandir(folder) as it:
+            for entry in it:
+                if is_input_file(entry.name) and entry.is_file():
+                    entries[entry.name] = entry.stat().st_mtime
+        return cls(entries)
+
+    def __len__(self):
+        return len(self._mtimes)
+
+    def __contains__(self, name):
+        return name in self._mtimes
+
+    def get(self, name):
+        """Retorna la fecha de modificación indexada de un archivo, o None."""
+        return self._mtimes.get(name)
+
+    def update(self, name, mtime):
+        """Agrega o actualiza un archivo. Retorna 'added', 'modified' o None."""
+        with self._lock:
+            previous = self._mtimes.get(name)
+            if previous == mtime:
+                return None
+            if previous is not None:
+                self._discard(previous, name)
+            self._mtimes[name] = mtime
+            insort(self._order, (mtime, name))
+        return 'added' if previous is None else 'modified'
+
+    def remove(self, name):
+        """Quita un archivo del índice. Retorna 'removed' si estaba indexado."""
+        with self._lock:
+            previous = self._mtimes.pop(name, None)
+            if previous is None:
+                return None
+            self._discard(previous, name)
+        return 'removed'
+
+    def _discard(self, mtime, name):
+        position = bisect_left(self._order, (mtime, name))
+        if position < len(self._order) and self._order[position] == (mtime, name):
+            del self._order[position]
+
+    def replace_all(self, entries):
+        """
+        Reemplaza el contenido completo del índice (nombre -> mtime).
+        Retorna los conjuntos (agregados, modificados, eliminados).
+        """
+        entries = dict(entries)
+        with self._lock:
+            old = self._mtimes
+            self._mtimes = entries
+            self._order = sorted((mtime, name) for name, mtime in entries.items())
+            self.ready = True
+
+        added = entries.keys() - old.keys()
+        removed = old.keys() - entries.keys()
+        modified = {name for name in entries.keys() & old.keys() if entries[name] != old[name]}
+        return added, modified, removed
+
+    def latest(self, count=2):
+        """Retorna los nombres de las `count` imágenes más recientes (la más reciente primero)."""
+        with self._lock:
+            return [name for _, name in self._order[:-count - 1:-1]] if count > 0 else []
+
+    def snapshot(self):
+        """Copia del índice como diccionario nombre -> mtime."""
+        with self._lock:
+            return dict(self._mtimes)
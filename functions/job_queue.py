@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import time
+import logging
+import subprocess
+
+from functions import metrics
+from functions.database import BASE_DIR, DB_PATH, connect, init_db
+from functions.doc_ids import new_document_id
+from functions.document_store import save_ocr_result
+from functions.ocr_pool import get_ocr_pool
+
+logger = logging.getLogger(__name__)
+
+# Estados posibles de un trabajo
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_ERROR = 'error'
+
+# Perfilado de los trabajos (cProfile): DIGITALIZA_PROFILE_SLOW_SECONDS=<segundos>
+# guarda el perfil de cada trabajo que tarde al menos eso (ver metrics.PROFILE_DIR).
+# Los procesos del pool heredan la variable de entorno.
+PROFILE_SLOW_SECONDS = os.environ.get('DIGITALIZA_PROFILE_SLOW_SECONDS')
+
+def _now():
+    return time.time()
+
+def _update_job(job_id, db_path=DB_PATH, **fields):
+    """Actualiza las columnas indicadas de un trabajo."""
+    columns = ', '.join(f"{name} = ?" for name in fields)
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+    finally:
+        conn.close()
+
+def run_ocr_job(job_id, payload, db_path=DB_PATH):
+    """
+    Ejecuta un OCR sobre las imágenes del trabajo, registra el documento en la
+    base de documentos y retorna el resultado (con su document_id).
+    """
+    # El módulo de OCR (PIL, pdf2image, pytesseract) solo se carga al ejecutar un OCR
+    from functions.test_ocr import perform_ocr
+    result = perform_ocr(payload.get('images'))
+    if result.get('image_key'):
+        _update_job(job_id, db_path, image_key=result['image_key'])
+
+    if not result['success']:
+        raise RuntimeError(result['ocr_text'] or result['error'])
+
+    result['document_id'] = save_ocr_result(result, job_id, db_path)
+    return result
+
+def run_scan_job(job_id, payload, db_path=DB_PATH):
+    """Ejecuta el script de escaneo de prueba y retorna su salida."""
+    script_path = os.path.join(BASE_DIR, 'functions', 'gen_test_input.py')
+    if not os.path.exists(script_path):
+        raise RuntimeError('Script de escaneo no encontrado')
+
+    result = subprocess.run([sys.executable, script_path], capture_output=True, text=True, cwd=BASE_DIR)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+
+    return {'success': True, 'output': result.stdout}
+
+# Funciones que ejecutan cada tipo de trabajo
+JOB_RUNNERS = {
+    'ocr': run_ocr_job,
+    'scan': run_scan_job,
+}
+
+def execute_job(job_id, kind, payload, db_path=DB_PATH):
+    """
+    Ejecuta un trabajo dentro de un proceso del pool.
+    Registra el estado, el resultado o el error en la base de datos.
+    Con payload['profile'] (o DIGITALIZA_PROFILE_SLOW_SECONDS) se guarda su perfil.
+    """
+    _update_job(job_id, db_path, status=JOB_RUNNING, started_at=_now())
+    profile = bool(payload.get('profile')) or PROFILE_SLOW_SECONDS is not None
+    slow_seconds = 0.0 if payload.get('profile') else float(PROFILE_SLOW_SECONDS or 0)
+    try:
+        with metrics.timed('job', kind=kind), metrics.profiled(f"{kind}_{job_id}", profile, slow_seconds):
+            result = JOB_RUNNERS[kind](job_id, payload, db_path)
+    except Exception as e:
+        logger.error(f"Error en el trabajo {job_id} ({kind}): {str(e)}")
+        _update_job(job_id, db_path, status=JOB_ERROR, error=str(e), finished_at=_now())
+        _job_finished(kind, JOB_ERROR)
+        return False
+
+    _update_job(job_id, db_path, status=JOB_DONE, result=json.dumps(result, ensure_ascii=False), finished_at=_now())
+    logger.info(f"Trabajo {job_id} ({kind}) completado")
+    _job_finished(kind, JOB_DONE)
+    return True
+
+def _job_finished(kind, status):
+    metrics.inc('digitaliza_jobs_finished_total', kind=kind, status=status)
+    # Publicar de inmediato las métricas del proceso del pool para /metrics
+    metrics.dump()
+
+def _on_job_finished(job_id, db_path):
+    """Crea el callback que registra fallos del propio pool (proceso caído, etc.)."""
+    def callback(future):
+        error = future.exception()
+        if error is not None:
+            logger.error(f"El pool no pudo ejecutar el trabajo {job_id}: {error}")
+            _update_job(job_id, db_path, status=JOB_ERROR, error=str(error), finished_at=_now())
+    return callback
+
+def _dispatch(job_id, kind, payload, db_path=DB_PATH):
+    future = get_ocr_pool().submit(execute_job, job_id, kind, payload, db_path)
+    future.add_done_callback(_on_job_finished(job_id, db_path))
+    return future
+
+def submit_job(kind, payload=None, db_path=DB_PATH):
+    """Registra un trabajo nuevo, lo envía al pool y retorna su ID de inmediato."""
+    if kind not in JOB_RUNNERS:
+        raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+
+    payload = payload or {}
+    # IDs ordenables por fecha de creación
+    job_id = new_document_id()
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, JOB_QUEUED, json.dumps(payload, ensure_ascii=False), _now())
+            )
+    finally:
+        conn.close()
+
+    _dispatch(job_id, kind, payload, db_path)
+    logger.info(f"Trabajo {job_id} ({kind}) en cola")
+    return job_id
+
+def _row_to_job(row):
+    job = dict(row)
+    job['payload'] = json.loads(job['payload']) if job['payload'] else {}
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+def get_job(job_id, db_path=DB_PATH):
+    """Retorna el trabajo como diccionario, o None si no existe."""
+    conn = connect(db_path)
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    finally:
+        conn.close()
+    return _row_to_job(row) if row else None
+
+def find_jobs_by_image_key(image_key, db_path=DB_PATH):
+    """Retorna los trabajos que procesaron exactamente las mismas imágenes."""
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT * FROM jobs WHERE image_key = ? ORDER BY created_at DESC", (image_key,)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [_row_to_job(row) for row in rows]
+
+def list_jobs(status=None, limit=50, db_path=DB_PATH):
+    """Lista los trabajos más recientes, opcionalmente filtrados por estado."""
+    query = "SELECT * FROM jobs"
+    params = []
+    if status:
+        query += " WHERE status = ?"
+        params.append(status)
+    query += " ORDER BY created_at DESC LIMIT ?"
+    params.append(limit)
+
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+    return [_row_to_job(row) for row in rows]
+
+def count_jobs_by_status(db_path=DB_PATH):
+    """Cantidad de trabajos por estado (usa el índice de status)."""
+    conn = connect(db_path)
+    try:
+        rows = conn.execute("SELECT status, COUNT(*) AS total FROM jobs GROUP BY status").fetchall()
+    finally:
+        conn.close()
+    return {row['status']: row['total'] for row in rows}
+
+def start_job_queue(db_path=DB_PATH):
+    """
+    Prepara la base de datos y vuelve a encolar los trabajos que quedaron
+    pendientes o a medias cuando la aplicación se detuvo.
+    """
+    init_db(db_path)
+    conn = connect(db_path)
+    try:
+        rows = conn.execute(
+            "SELECT id, kind, payload FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+            (JOB_QUEUED, JOB_RUNNING)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    for row in rows:
+        _update_job(row['id'], db_path, status=JOB_QUEUED, started_at=None)
+        _dispatch(row['id'], row['kind'], json.loads(row['payload'] or '{}'), db_path)
+
+    if rows:
+        logger.info(f"Se volvieron a encolar {len(rows)} trabajos pendientes")
@@ -0,0 +1,172 @@
+import os
+import shutil
+import struct
+import logging
+import tempfile
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# Etiqueta EXIF de orientación
+ORIENTATION_TAG = 0x0112
+
+# Orientación EXIF -> (espejo horizontal, grados de rotación antihoraria a aplicar después)
+ORIENTATION_TRANSFORMS = {
+    1: (False, 0), 8: (False, 90), 3: (False, 180), 6: (False, 270),
+    2: (True, 0), 5: (True, 90), 4: (True, 180), 7: (True, 270),
+}
+TRANSFORM_ORIENTATIONS = {transform: orientation for orientation, transform in ORIENTATION_TRANSFORMS.items()}
+
+# Grados antihorarios de cada dirección de rotación
+DIRECTION_DEGREES = {'left': 90, 'right': 270}
+
+# Modos de rotación disponibles y, para cada uno, los modos a probar en orden.
+# Si jpegtran no sirve, la rotación EXIF sigue siendo sin pérdida.
+ROTATION_FALLBACKS = {
+    'exif': ('exif', 'reencode'),
+    'lossless': ('lossless', 'exif', 'reencode'),
+    'reencode': ('reencode',),
+}
+
+def rotated_orientation(orientation, direction):
+    """Retorna la orientación EXIF resultante de rotar la imagen en la dirección dada."""
+    mirror, degrees = ORIENTATION_TRANSFORMS.get(orientation, (False, 0))
+    return TRANSFORM_ORIENTATIONS[(mirror, (degrees + DIRECTION_DEGREES[direction]) % 360)]
+
+def apply_orientation(img, orientation):
+    """Aplica a los píxeles la transformación indicada por la orientación EXIF."""
+    from PIL import Image
+    mirror, degrees = ORIENTATION_TRANSFORMS.get(orientation, (False, 0))
+    if mirror:
+        img = img.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    if degrees:
+        img = img.rotate(degrees, expand=True)
+    return img
+
+def read_orientation(img):
+    """Orientación EXIF de una imagen abierta (1 si no tiene)."""
+    return img.getexif().get(ORIENTATION_TAG, 1)
+
+def _jpeg_segments(data):
+    """
+    Recorre los segmentos de cabecera de un JPEG hasta el inicio de los datos (SOS).
+    Retorna una lista de (marcador, inicio, fin) de cada segmento.
+    """
+    if data[:2] != b'\xff\xd8':
+        raise ValueError('El archivo no es un JPEG')
+
+    segments = []
+    offset = 2
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            raise ValueError('Cabecera JPEG inválida')
+        marker = data[offset + 1]
+        if marker == 0xDA:  # SOS: empiezan los datos comprimidos
+            break
+        length = struct.unpack('>H', data[offset + 2:offset + 4])[0]
+        segments.append((marker, offset, offset + 2 + length))
+        offset += 2 + length
+    return segments
+
+def _write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def rotate_exif(path, direction):
+    """
+    Rota la imagen cambiando solo la etiqueta EXIF de orientación.
+    No decodifica los píxeles: los datos comprimidos se copian tal cual.
+    """
+    from PIL import Image
+    with Image.open(path) as img:
+        if img.format != 'JPEG':
+            raise ValueError('La rotación EXIF solo aplica a JPEG')
+        exif = img.getexif()
+    exif[ORIENTATION_TAG] = rotated_orientation(exif.get(ORIENTATION_TAG, 1), direction)
+    exif_bytes = exif.tobytes()
+    if not exif_bytes.startswith(b'Exif\x00\x00'):
+        exif_bytes = b'Exif\x00\x00' + exif_bytes
+    if len(exif_bytes) + 2 > 0xFFFF:
+        raise ValueError('El bloque EXIF es demasiado grande')
+    app1 = b'\xff\xe1' + struct.pack('>H', len(exif_bytes) + 2) + exif_bytes
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    segments = _jpeg_segments(data)
+
+    existing = [(start, end) for marker, start, end in segments
+                if marker == 0xE1 and data[start + 4:start + 10] == b'Exif\x00\x00']
+    if existing:
+        start, end = existing[0]
+    else:
+        # Insertar después de APP0 (JFIF) si existe, si no justo después de SOI
+        start = end = segments[0][2] if segments and segments[0][0] == 0xE0 else 2
+
+    _write_atomic(path, data[:start] + app1 + data[end:])
+    return exif[ORIENTATION_TAG]
+
+def rotate_lossless(path, direction):
+    """
+    Rota la imagen sin pérdida en el dominio DCT con jpegtran.
+    Requiere que jpegtran esté instalado y que la imagen no tenga orientación EXIF.
+    """
+    jpegtran = shutil.which('jpegtran')
+    if not jpegtran:
+        raise RuntimeError('jpegtran no está instalado')
+    from PIL import Image
+    with Image.open(path) as img:
+        if read_orientation(img) != 1:
+            raise ValueError('La imagen tiene orientación EXIF')
+
+    degrees = '270' if direction == 'left' else '90'  # jpegtran rota en sentido horario
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    os.close(fd)
+    try:
+        # -perfect falla si las dimensiones no son múltiplo del bloque, en vez de recortar
+        subprocess.run([jpegtran, '-copy', 'all', '-perfect', '-rotate', degrees, '-outfile', tmp_path, path],
+                       check=True, capture_output=True)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def rotate_reencode(path, direction, quality=95):
+    """Rota decodificando y volviendo a codificar la imagen (alternativa con pérdida)."""
+    from PIL import Image, ImageOps
+    with Image.open(path) as img:
+        icc_profile = img.info.get('icc_profile')
+        rotated = ImageOps.exif_transpose(img).rotate(DIRECTION_DEGREES[direction], expand=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            rotated.save(f, format='JPEG', quality=quality, icc_profile=icc_profile)
+    os.replace(tmp_path, path)
+
+ROTATORS = {
+    'exif': rotate_exif,
+    'lossless': rotate_lossless,
+    'reencode': rotate_reencode,
+}
+
+def rotate_image_file(path, direction, mode='exif'):
+    """
+    Rota una imagen en la dirección indicada ('left' o 'right').
+    Intenta el modo pedido y, si no es posible, los siguientes más lentos.
+    Retorna el modo que se usó finalmente.
+    """
+    if direction not in DIRECTION_DEGREES:
+        raise ValueError(f"Dirección inválida: {direction}")
+
+    if mode not in ROTATION_FALLBACKS:
+        raise ValueError(f"Modo de rotación desconocido: {mode}")
+    modes = ROTATION_FALLBACKS[mode]
+
+    for current_mode in modes:
+        try:
+            ROTATORS[current_mode](path, direction)
+            return current_mode
+        except Exception as e:
+            if current_mode == modes[-1]:
+                raise
+            logger.warning(f"Rotación '{current_mode}' no disponible para {os.path.basename(path)}: {e}")
@@ -0,0 +1,275 @@
+import os
+import io
+import sys
+import json
+import time
+import logging
+import tempfile
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from functions.database import BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Cada proceso (servidor y pool de OCR) guarda aquí sus métricas: <pid>.json.
+# /metrics suma las de todos los procesos.
+METRICS_DIR = os.path.join(BASE_DIR, 'cache', 'metrics')
+
+# Cada cuántos segundos, como máximo, un proceso vuelve a guardar sus métricas
+DUMP_INTERVAL = 5
+
+# Perfiles (cProfile) de las llamadas lentas: cache/profiles/<nombre>.prof y .txt
+PROFILE_DIR = os.path.join(BASE_DIR, 'cache', 'profiles')
+PROFILE_TOP_FUNCTIONS = 40
+
+# Desde Python 3.12 cProfile registra las llamadas de todos los hilos; antes solo
+# las del hilo que lo activa, y cada hilo de trabajo necesita su propio perfil
+PROFILE_ALL_THREADS = sys.version_info >= (3, 12)
+
+# Límites (segundos) de los buckets de los histogramas de latencia
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Descripción de cada métrica (líneas HELP del formato de Prometheus)
+METRIC_HELP = {
+    'digitaliza_stage_seconds': 'Duración de cada etapa de la digitalización',
+    'digitaliza_pages_ocr_total': 'Páginas procesadas por Tesseract',
+    'digitaliza_pages_classified_total': 'Páginas clasificadas por tipo (pagaré o firma)',
+    'digitaliza_ocr_cache_hits_total': 'Resultados de OCR obtenidos del caché',
+    'digitaliza_ocr_cache_misses_total': 'Resultados de OCR que no estaban en el caché',
+    'digitaliza_jobs_finished_total': 'Trabajos terminados por tipo y estado',
+    'digitaliza_jobs': 'Trabajos en la cola por estado',
+    'digitaliza_input_files': 'Archivos en la carpeta input',
+    'digitaliza_startup_seconds': 'Segundos desde el inicio del proceso hasta cada fase del arranque',
+}
+
+_lock = threading.Lock()
+# (nombre, etiquetas) -> [conteo por bucket..., +Inf, suma]
+_histograms = {}
+# (nombre, etiquetas) -> valor
+_counters = {}
+_last_dump = 0.0
+_dump_lock = threading.Lock()
+
+# Perfiles de los hilos de trabajo del bloque profiled() activo en cada hilo
+_profile_state = threading.local()
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def observe(name, seconds, **labels):
+    """Registra una duración en el histograma `name`."""
+    key = _key(name, labels)
+    with _lock:
+        values = _histograms.get(key)
+        if values is None:
+            values = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+        values[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        values[-1] += seconds
+    _maybe_dump()
+
+def inc(name, value=1, **labels):
+    """Incrementa el contador `name`."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _maybe_dump()
+
+@contextmanager
+def timed(stage, **labels):
+    """Mide la duración del bloque como una etapa de digitaliza_stage_seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('digitaliza_stage_seconds', time.perf_counter() - start, stage=stage, **labels)
+
+def _snapshot():
+    with _lock:
+        return {
+            'histograms': [[name, list(labels), list(values)] for (name, labels), values in _histograms.items()],
+            'counters': [[name, list(labels), value] for (name, labels), value in _counters.items()]
+        }
+
+def dump():
+    """Guarda las métricas de este proceso para que /metrics las incluya."""
+    with _dump_lock:
+        _write_snapshot()
+
+def _write_snapshot():
+    global _last_dump
+    _last_dump = time.monotonic()
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=METRICS_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(_snapshot(), f)
+        os.replace(tmp_path, os.path.join(METRICS_DIR, f"{os.getpid()}.json"))
+    except OSError as e:
+        logger.warning(f"No se pudieron guardar las métricas: {e}")
+
+def _maybe_dump():
+    # Los demás procesos ven las métricas con a lo sumo DUMP_INTERVAL segundos de
+    # retraso; si otro hilo ya las está guardando, no se espera
+    if time.monotonic() - _last_dump >= DUMP_INTERVAL and _dump_lock.acquire(blocking=False):
+        try:
+            _write_snapshot()
+        finally:
+            _dump_lock.release()
+
+def _process_alive(pid):
+    if os.name != 'posix':
+        # En Windows os.kill(pid, 0) terminaría el proceso: se conservan todos
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def collect():
+    """Suma las métricas de este proceso y las guardadas por los demás."""
+    snapshots = [_snapshot()]
+    own_file = f"{os.getpid()}.json"
+    if os.path.isdir(METRICS_DIR):
+        for name in os.listdir(METRICS_DIR):
+            if not name.endswith('.json') or name == own_file:
+                continue
+            path = os.path.join(METRICS_DIR, name)
+            # Los procesos que ya terminaron dejan de contar (como un reinicio en Prometheus)
+            pid = name[:-len('.json')]
+            if pid.isdigit() and not _process_alive(int(pid)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+    histograms, counters = {}, {}
+    for snapshot in snapshots:
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(tuple(label) for label in labels))
+            total = histograms.setdefault(key, [0] * len(values))
+            histograms[key] = [a + b for a, b in zip(total, values)]
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+def _header(lines, name, kind, written):
+    if name not in written:
+        written.add(name)
+        if name in METRIC_HELP:
+            lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+def render(gauges=()):
+    """
+    Métricas en el formato de texto de Prometheus.
+    gauges es una lista de (nombre, etiquetas, valor) calculados al momento.
+    """
+    histograms, counters = collect()
+    lines = []
+    written = set()
+
+    for (name, labels), values in sorted(histograms.items()):
+        _header(lines, name, 'histogram', written)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), values[:-1]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', bound),))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {values[-1]}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+
+    for (name, labels), value in sorted(counters.items()):
+        _header(lines, name, 'counter', written)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for name, labels, value in gauges:
+        _header(lines, name, 'gauge', written)
+        lines.append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {value}")
+
+    return '\n'.join(lines) + '\n'
+
+@contextmanager
+def profiled(name, enabled=True, slow_seconds=0.0):
+    """
+    Ejecuta el bloque con cProfile. Si tarda slow_seconds o más, guarda el perfil
+    en PROFILE_DIR: <name>.prof (para pstats/snakeviz) y <name>.txt con las
+    funciones de mayor tiempo acumulado.
+    """
+    if not enabled:
+        yield
+        return
+
+    import cProfile
+    profiler = cProfile.Profile()
+    thread_profilers = []
+    _profile_state.thread_profilers = thread_profilers
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _profile_state.thread_profilers = None
+        elapsed = time.perf_counter() - start
+        if elapsed >= slow_seconds:
+            _save_profile([profiler] + thread_profilers, name, elapsed)
+
+def profile_thread(function):
+    """
+    Prepara una función para ejecutarla en otro hilo (ThreadPoolExecutor.submit)
+    de modo que, si este hilo está dentro de profiled(), su trabajo quede en el
+    mismo perfil: el hilo de trabajo usa su propio cProfile, que se suma al guardar.
+    """
+    thread_profilers = getattr(_profile_state, 'thread_profilers', None)
+    if thread_profilers is None or PROFILE_ALL_THREADS:
+        return function
+
+    def run(*args, **kwargs):
+        import cProfile
+        profiler = cProfile.Profile()
+        # Los hilos que lance esta función también se suman al perfil
+        _profile_state.thread_profilers = thread_profilers
+        profiler.enable()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler.disable()
+            _profile_state.thread_profilers = None
+            thread_profilers.append(profiler)
+    return run
+
+def _save_profile(profilers, name, elapsed):
+    import pstats
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, name)
+        summary = io.StringIO()
+        stats = pstats.Stats(*profilers, stream=summary)
+        stats.dump_stats(f"{base}.prof")
+        stats.sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+        with open(f"{base}.txt", 'w', encoding='utf-8') as f:
+            f.write(f"{name}: {elapsed:.3f} s\n\n")
+            f.write(summary.getvalue())
+        logger.info(f"Perfil guardado para {name} ({elapsed:.2f} s): {base}.prof")
+    except OSError as e:
+        logger.warning(f"No se pudo guardar el perfil de {name}: {e}")
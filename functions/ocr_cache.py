@@ -0,0 +1,127 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+from functions.database import BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Carpeta del caché persistente: cache/ocr/<hash_imagen>/<hash_config>.json
+CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'ocr')
+
+# Cantidad máxima de resultados en el caché en memoria (LRU)
+MEMORY_CACHE_SIZE = 256
+
+# Cambiar este valor invalida todo el caché (p. ej. si cambia el formato guardado)
+CACHE_VERSION = 2
+
+_memory_cache = OrderedDict()
+_memory_lock = threading.Lock()
+
+# Hash de cada archivo según su (mtime, tamaño), para no releer imágenes sin cambios
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """
+    Calcula el hash SHA-256 del contenido de un archivo.
+    El resultado se recuerda mientras el archivo no cambie de fecha ni de tamaño.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    with _file_hashes_lock:
+        cached = _file_hashes.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    image_hash = digest.hexdigest()
+
+    with _file_hashes_lock:
+        _file_hashes[path] = (signature, image_hash)
+    return image_hash
+
+def remember_hash(path, image_hash):
+    """Registra el hash ya calculado de un archivo (por ejemplo, durante su subida)."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    with _file_hashes_lock:
+        _file_hashes[path] = ((stat.st_mtime_ns, stat.st_size), image_hash)
+
+def _config_key(lang, config):
+    """Clave de los parámetros de Tesseract usados para el OCR."""
+    raw = json.dumps([CACHE_VERSION, lang, config], sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+def _entry_path(image_hash, config_key):
+    return os.path.join(CACHE_DIR, image_hash, f"{config_key}.json")
+
+def get(image_hash, lang, config=''):
+    """Retorna el resultado guardado para la imagen y parámetros dados, o None."""
+    config_key = _config_key(lang, config)
+    key = (image_hash, config_key)
+
+    with _memory_lock:
+        if key in _memory_cache:
+            _memory_cache.move_to_end(key)
+            return _memory_cache[key]
+
+    try:
+        with open(_entry_path(image_hash, config_key), 'r', encoding='utf-8') as f:
+            value = json.load(f)['value']
+    except (OSError, ValueError, KeyError):
+        return None
+
+    _remember(key, value)
+    return value
+
+def put(image_hash, lang, config, value):
+    """Guarda un resultado en memoria y en disco (escritura atómica)."""
+    config_key = _config_key(lang, config)
+    _remember((image_hash, config_key), value)
+
+    entry_path = _entry_path(image_hash, config_key)
+    try:
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry_path), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'lang': lang, 'config': config, 'value': value}, f, ensure_ascii=False)
+        os.replace(tmp_path, entry_path)
+    except OSError as e:
+        logger.warning(f"No se pudo guardar el resultado en el caché de OCR: {e}")
+
+def _remember(key, value):
+    with _memory_lock:
+        _memory_cache[key] = value
+        _memory_cache.move_to_end(key)
+        while len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+def invalidate_file(path):
+    """
+    Elimina los resultados guardados para el contenido actual de un archivo.
+    Se llama antes de reescribirlo (por ejemplo, al rotar la imagen).
+    """
+    try:
+        image_hash = file_hash(path)
+    except OSError:
+        return
+
+    with _memory_lock:
+        for key in [key for key in _memory_cache if key[0] == image_hash]:
+            del _memory_cache[key]
+    with _file_hashes_lock:
+        _file_hashes.pop(os.path.abspath(path), None)
+
+    shutil.rmtree(os.path.join(CACHE_DIR, image_hash), ignore_errors=True)
+    logger.info(f"Caché de OCR invalidado para {os.path.basename(path)}")
@@ -0,0 +1,294 @@
+import io
+import os
+import shlex
+import shutil
+import logging
+import threading
+import subprocess
+import importlib.util
+
+logger = logging.getLogger(__name__)
+
+# Motor de OCR: DIGITALIZA_OCR_ENGINE=auto|tesserocr|stdin|pytesseract (los
+# procesos del pool heredan la variable). 'auto' usa el primero disponible en
+# ese orden; pytesseract queda siempre como alternativa si el elegido falla.
+ENGINE_ENV = 'DIGITALIZA_OCR_ENGINE'
+
+# Programa de Tesseract (el mismo que usa pytesseract por defecto)
+TESSERACT_CMD = 'tesseract'
+
+# Columnas del TSV de Tesseract: el mismo formato que pytesseract.image_to_data
+TSV_COLUMNS = ('level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+               'left', 'top', 'width', 'height', 'conf', 'text')
+
+# Fallas seguidas del motor principal tras las que se usa solo la alternativa
+MAX_ENGINE_FAILURES = 3
+
+class OcrEngineError(RuntimeError):
+    """El motor de OCR no pudo procesar la imagen."""
+
+def tesseract_available():
+    """Indica si hay algún Tesseract utilizable: la biblioteca (tesserocr) o el programa."""
+    return importlib.util.find_spec('tesserocr') is not None or shutil.which(TESSERACT_CMD) is not None
+
+def parse_tsv(tsv):
+    """Convierte el TSV de Tesseract en el diccionario por columnas de pytesseract (Output.DICT)."""
+    data = {column: [] for column in TSV_COLUMNS}
+    for line in tsv.splitlines():
+        values = line.split('\t')
+        if len(values) < len(TSV_COLUMNS) - 1 or values[0] == 'level':
+            continue
+        values += [''] * (len(TSV_COLUMNS) - len(values))
+        for column, value in zip(TSV_COLUMNS[:-2], values):
+            data[column].append(int(value))
+        data['conf'].append(float(values[10]))
+        data['text'].append(values[11])
+    return data
+
+def parse_config(config):
+    """
+    Separa los parámetros de Tesseract en formato de línea de comandos (los de
+    pytesseract) en (oem, psm, variables) para usarlos con la API.
+    """
+    oem, psm, variables = None, None, {}
+    tokens = iter(shlex.split(config or ''))
+    for token in tokens:
+        if token == '--dpi':
+            variables['user_defined_dpi'] = next(tokens, '0')
+        elif token == '--psm':
+            psm = int(next(tokens, '3'))
+        elif token == '--oem':
+            oem = int(next(tokens, '3'))
+        elif token == '-c':
+            name, _, value = next(tokens, '').partition('=')
+            variables[name] = value
+        else:
+            logger.warning(f"Parámetro de Tesseract no soportado por la API: {token}")
+    return oem, psm, variables
+
+class PytesseractEngine:
+    """pytesseract: guarda cada imagen en un archivo temporal y ejecuta un proceso de Tesseract por página."""
+
+    name = 'pytesseract'
+
+    def warm_up(self, lang, config):
+        import pytesseract  # noqa: F401
+
+    def image_to_data(self, image, lang, config):
+        import pytesseract
+        return pytesseract.image_to_data(image, lang=lang, config=config, output_type=pytesseract.Output.DICT)
+
+    def close(self):
+        pass
+
+class StdinEngine:
+    """
+    Un proceso de Tesseract por página, pero sin archivos temporales: la imagen
+    se codifica en memoria (PNM, sin compresión) y se le entrega por la entrada
+    estándar; el TSV se lee de la salida estándar.
+    """
+
+    name = 'stdin'
+
+    def __init__(self, cmd=TESSERACT_CMD):
+        self.cmd = cmd
+
+    def warm_up(self, lang, config):
+        pass
+
+    def image_to_data(self, image, lang, config):
+        if image.mode not in ('1', 'L', 'RGB'):
+            image = image.convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, format='PPM')
+        command = [self.cmd, 'stdin', 'stdout', '-l', lang, *shlex.split(config or ''), 'tsv']
+        try:
+            result = subprocess.run(command, input=buffer.getvalue(), capture_output=True)
+        except OSError as e:
+            raise OcrEngineError(str(e))
+        if result.returncode != 0:
+            error = result.stderr.decode('utf-8', 'replace').strip()
+            raise OcrEngineError(error or f"tesseract terminó con código {result.returncode}")
+        return parse_tsv(result.stdout.decode('utf-8', 'replace'))
+
+    def close(self):
+        pass
+
+class TesserocrEngine:
+    """
+    API de Tesseract (tesserocr) con el modelo del idioma cargado una sola vez:
+    cada instancia de la API se reutiliza página tras página, sin procesos ni
+    archivos. Una instancia procesa una página a la vez, así que las libres se
+    guardan por configuración y se crean más solo si hay páginas en paralelo.
+    """
+
+    name = 'tesserocr'
+
+    def __init__(self):
+        import tesserocr
+        self._tesserocr = tesserocr
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+
+        lang, oem, psm, variables = key
+        kwargs = {'lang': lang}
+        logger.info(f"Cargando el modelo de Tesseract ({lang}) (pid {os.getpid()})")
+        api = None
+        try:
+            if oem is not None:
+                kwargs['oem'] = self._tesserocr.OEM(oem)
+            api = self._tesserocr.PyTessBaseAPI(**kwargs)
+            if psm is not None:
+                api.SetPageSegMode(psm)
+            for name, value in variables:
+                if not api.SetVariable(name, value):
+                    logger.warning(f"Variable de Tesseract desconocida: {name}")
+        except Exception as e:
+            # Por ejemplo, falta el traineddata del idioma
+            if api is not None:
+                api.End()
+            raise OcrEngineError(f"No se pudo iniciar Tesseract ({lang}): {e}")
+        return api
+
+    def _release(self, key, api):
+        with self._lock:
+            self._idle.setdefault(key, []).append(api)
+
+    def _key(self, lang, config):
+        oem, psm, variables = parse_config(config)
+        return lang, oem, psm, tuple(sorted(variables.items()))
+
+    def warm_up(self, lang, config):
+        key = self._key(lang, config)
+        self._release(key, self._acquire(key))
+
+    def image_to_data(self, image, lang, config):
+        key = self._key(lang, config)
+        api = self._acquire(key)
+        try:
+            api.SetImage(image)
+            tsv = api.GetTSVText(0)
+        except Exception as e:
+            api.End()
+            raise OcrEngineError(str(e))
+        self._release(key, api)
+        return parse_tsv(tsv)
+
+    def close(self):
+        with self._lock:
+            apis = [api for idle in self._idle.values() for api in idle]
+            self._idle.clear()
+        for api in apis:
+            api.End()
+
+class FallbackEngine:
+    """
+    Usa el motor principal y, si falla con una página, la alternativa para esa
+    página. Tras MAX_ENGINE_FAILURES fallas seguidas se usa solo la alternativa.
+    """
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = primary.name
+        self._failures = 0
+        # Las páginas de un documento se procesan en varios hilos
+        self._lock = threading.Lock()
+
+    def _use_primary(self):
+        with self._lock:
+            return self._failures < MAX_ENGINE_FAILURES
+
+    def _succeeded(self):
+        with self._lock:
+            if self._failures < MAX_ENGINE_FAILURES:
+                self._failures = 0
+
+    def _failed(self, error):
+        with self._lock:
+            self._failures += 1
+            switched = self._failures == MAX_ENGINE_FAILURES
+            if switched:
+                self.name = self.fallback.name
+        logger.warning(f"Falló el motor de OCR {self.primary.name} ({error}); se usa {self.fallback.name}")
+        if switched:
+            logger.warning(f"El motor {self.primary.name} falló {MAX_ENGINE_FAILURES} veces seguidas; "
+                           f"se usará solo {self.fallback.name}")
+
+    def warm_up(self, lang, config):
+        if self._use_primary():
+            try:
+                self.primary.warm_up(lang, config)
+                return
+            except OcrEngineError as e:
+                self._failed(e)
+        self.fallback.warm_up(lang, config)
+
+    def image_to_data(self, image, lang, config):
+        if self._use_primary():
+            try:
+                data = self.primary.image_to_data(image, lang, config)
+                self._succeeded()
+                return data
+            except OcrEngineError as e:
+                self._failed(e)
+        return self.fallback.image_to_data(image, lang, config)
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
+
+# Motores por nombre, en el orden de preferencia de 'auto'
+ENGINE_CLASSES = {
+    'tesserocr': TesserocrEngine,
+    'stdin': StdinEngine,
+    'pytesseract': PytesseractEngine,
+}
+
+def create_engine(name):
+    """Crea un motor de OCR por su nombre (ver ENGINE_CLASSES), con pytesseract como alternativa."""
+    engine_class = ENGINE_CLASSES.get(name)
+    if engine_class is None:
+        raise ValueError(f"Motor de OCR desconocido: {name}")
+    if engine_class is PytesseractEngine:
+        return PytesseractEngine()
+    return FallbackEngine(engine_class(), PytesseractEngine())
+
+def _auto_engine():
+    if importlib.util.find_spec('tesserocr') is not None:
+        try:
+            return create_engine('tesserocr')
+        except (ImportError, OSError, RuntimeError) as e:
+            logger.warning(f"No se pudo iniciar tesserocr: {e}")
+    if shutil.which(TESSERACT_CMD) is not None:
+        return create_engine('stdin')
+    return create_engine('pytesseract')
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    """Retorna el motor de OCR del proceso, creándolo la primera vez."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                name = os.environ.get(ENGINE_ENV, 'auto')
+                _engine = _auto_engine() if name == 'auto' else create_engine(name)
+                logger.info(f"Motor de OCR: {_engine.name} (pid {os.getpid()})")
+    return _engine
+
+def use_engine(name):
+    """Fija el motor de OCR del proceso (por ejemplo, para comparar motores en el benchmark)."""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+        _engine = create_engine(name)
+    return _engine
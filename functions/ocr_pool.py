@@ -0,0 +1,48 @@
+import os
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Pool de procesos compartido por toda la aplicación
+_executor = None
+_executor_lock = threading.Lock()
+
+def _init_worker():
+    """Inicializa un proceso del pool: importa los módulos pesados una sola vez."""
+    from functions.test_ocr import warm_up
+    warm_up()
+
+def _ping():
+    """Tarea vacía usada para forzar el arranque de los procesos del pool."""
+    return os.getpid()
+
+def start_ocr_pool(max_workers=None):
+    """
+    Inicia el pool de procesos de OCR (uno por núcleo por defecto).
+    Si el pool ya existe, lo retorna sin crear uno nuevo.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            max_workers = max_workers or os.cpu_count() or 1
+            _executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker)
+            # Lanzar los procesos ahora para no pagar el arranque en el primer clic
+            for _ in range(max_workers):
+                _executor.submit(_ping)
+            logger.info(f"Pool de OCR iniciado con {max_workers} procesos")
+        return _executor
+
+def get_ocr_pool():
+    """Retorna el pool de OCR, iniciándolo si aún no existe."""
+    return _executor or start_ocr_pool()
+
+def stop_ocr_pool():
+    """Detiene el pool de OCR esperando las tareas en curso."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+            logger.info("Pool de OCR detenido")
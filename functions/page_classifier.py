@@ -0,0 +1,73 @@
+import logging
+
+from functions.jpeg_rotation import apply_orientation, read_orientation
+
+logger = logging.getLogger(__name__)
+
+# Tipos de página de un documento
+PAGE_PAGARE = 'PAGARÉ'
+PAGE_FIRMA = 'FIRMA'
+
+# Tamaño de trabajo: basta una miniatura para contar las líneas de texto
+CLASSIFY_SIZE = (300, 425)
+
+# Una fila es de texto si es al menos así de más oscura que el papel (0-255)
+INK_DELTA = 10
+
+# El pagaré es una página llena de texto; la de firmas tiene unas pocas líneas
+MIN_TEXT_LINES = 20
+
+# Parámetros del clasificador (forman parte de la clave del caché de OCR)
+CLASSIFIER_CONFIG = {'size': CLASSIFY_SIZE, 'ink_delta': INK_DELTA, 'min_text_lines': MIN_TEXT_LINES}
+
+def text_line_count(img):
+    """
+    Cuenta las líneas de texto de una página con su perfil de proyección
+    horizontal: cada tramo de filas más oscuras que el papel es una línea.
+    """
+    from PIL import Image
+    if img.mode != 'L':
+        img = img.convert('L')
+    img = img.copy()
+    img.thumbnail(CLASSIFY_SIZE, Image.BILINEAR)
+    # Promedio de cada fila calculado por PIL (reducción a 1 píxel de ancho)
+    profile = list(img.resize((1, img.height), Image.BOX).getdata())
+    # El papel es el tono de las filas más claras (ignora bordes oscuros del escaneo)
+    paper = sorted(profile)[int(len(profile) * 0.9)]
+
+    lines = 0
+    in_line = False
+    for value in profile:
+        inked = value < paper - INK_DELTA
+        if inked and not in_line:
+            lines += 1
+        in_line = inked
+    return lines
+
+def classify_image(img):
+    """Clasifica una página ya abierta. Retorna (tipo, líneas de texto)."""
+    lines = text_line_count(img)
+    return (PAGE_PAGARE if lines >= MIN_TEXT_LINES else PAGE_FIRMA), lines
+
+def open_small(image_path):
+    """
+    Abre una imagen reducida en escala de grises sin decodificarla completa: el
+    decodificador JPEG entrega directamente una versión a 1/2, 1/4 o 1/8.
+    Se aplica la orientación EXIF (la rotación puede ser solo de metadatos).
+    """
+    from PIL import Image
+    with Image.open(image_path) as img:
+        orientation = read_orientation(img)
+        img.draft('L', CLASSIFY_SIZE)
+        img.load()
+        img = img.convert('L') if img.mode != 'L' else img.copy()
+    return apply_orientation(img, orientation)
+
+def classify_file(image_path):
+    """Clasifica una imagen a partir de su versión reducida."""
+    return classify_image(open_small(image_path))
+
+def classify_text(text):
+    """Clasifica una página a partir de su texto (por ejemplo, la capa de texto de un PDF)."""
+    lines = sum(1 for line in text.splitlines() if line.strip())
+    return (PAGE_PAGARE if lines >= MIN_TEXT_LINES else PAGE_FIRMA), lines
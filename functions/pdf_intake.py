@@ -0,0 +1,77 @@
+import re
+import logging
+from functools import lru_cache
+
+from functions import metrics
+
+# pdf2image y PyPDF2 se importan al primer uso: el servidor web importa este
+# módulo (vistas previas de PDF) y no los necesita para arrancar
+
+logger = logging.getLogger(__name__)
+
+# Caracteres visibles mínimos para considerar que una página trae texto útil
+# (los PDF escaneados suelen no traer nada o solo unos pocos caracteres sueltos)
+MIN_TEXT_LAYER_CHARS = 200
+
+# Confianza asignada a las palabras de la capa de texto (no pasan por OCR)
+TEXT_LAYER_CONFIDENCE = 100.0
+
+@lru_cache(maxsize=None)
+def pdf_reader_class():
+    """
+    Clase PdfReader de PyPDF2, o None si no está instalado. PyPDF2 es opcional:
+    sin él no se aprovecha la capa de texto y todo pasa por Tesseract.
+    """
+    try:
+        from PyPDF2 import PdfReader
+    except ImportError:
+        return None
+    return PdfReader
+
+def page_count(pdf_path):
+    """Cantidad de páginas del PDF (sin rasterizar)."""
+    from pdf2image import pdfinfo_from_path
+    return int(pdfinfo_from_path(pdf_path)['Pages'])
+
+def iter_pdf_pages(pdf_path, dpi, grayscale=True, pages=None):
+    """
+    Rasteriza el PDF página por página a la resolución indicada.
+    Es un generador: solo hay una página en memoria a la vez.
+    Entrega (número de página, imagen) para las páginas pedidas (todas por defecto).
+    """
+    from pdf2image import convert_from_path
+    if pages is None:
+        pages = range(1, page_count(pdf_path) + 1)
+    for number in pages:
+        with metrics.timed('pdf_render'):
+            images = convert_from_path(pdf_path, dpi=dpi, first_page=number, last_page=number,
+                                       grayscale=grayscale)
+        if images:
+            yield number, images[0]
+
+def render_page(pdf_path, number=1, dpi=100):
+    """Rasteriza una sola página del PDF (por ejemplo, para la vista previa)."""
+    for _, image in iter_pdf_pages(pdf_path, dpi, grayscale=False, pages=(number,)):
+        return image
+    raise ValueError(f"El PDF no tiene la página {number}")
+
+def text_layer(pdf_path):
+    """
+    Texto embebido de cada página del PDF. La lista tiene None en las páginas sin
+    texto útil (escaneadas); si PyPDF2 no está instalado o el PDF no se puede
+    leer, retorna una lista vacía.
+    """
+    PdfReader = pdf_reader_class()
+    if PdfReader is None:
+        return []
+    try:
+        reader = PdfReader(pdf_path)
+        texts = [page.extract_text() or '' for page in reader.pages]
+    except Exception as e:
+        logger.warning(f"No se pudo leer la capa de texto de {pdf_path}: {e}")
+        return []
+    return [text if len(re.sub(r"\s", '', text)) >= MIN_TEXT_LAYER_CHARS else None for text in texts]
+
+def text_layer_words(text):
+    """Posición de cada palabra de la capa de texto, con confianza máxima."""
+    return [(match.start(), match.end(), TEXT_LAYER_CONFIDENCE) for match in re.finditer(r"\S+", text)]
@@ -0,0 +1,154 @@
+import logging
+import threading
+from array import array
+
+from functions.image_index import is_pdf_file
+from functions.page_classifier import PAGE_FIRMA, PAGE_PAGARE, classify_image, open_small
+from functions.pdf_intake import render_page
+
+logger = logging.getLogger(__name__)
+
+# dHash de HASH_SIZE x HASH_SIZE bits (64): compara cada píxel con su vecino derecho
+HASH_SIZE = 8
+
+# Bits distintos hasta los que dos páginas se consideran el mismo escaneo.
+# Un reescaneo (desplazado, con otro brillo o recomprimido) queda en 0-3 bits;
+# un pagaré y una página de firmas, en 20 o más. Los pagarés de alumnos
+# distintos (el mismo formulario) también quedan cerca: por eso se marcan como
+# posibles duplicados para que el operador decida, nunca se descartan solos.
+NEAR_DUPLICATE_DISTANCE = 4
+
+# Resolución a la que se rasteriza la primera página de un PDF para su hash
+PDF_HASH_DPI = 30
+
+# Tipos de página guardados en el índice (un byte por entrada: su posición aquí)
+PAGE_TYPES = (PAGE_PAGARE, PAGE_FIRMA)
+
+def _popcount(value):
+    return bin(value).count('1')
+
+# int.bit_count existe desde Python 3.10
+hamming_weight = getattr(int, 'bit_count', _popcount)
+
+def hamming(a, b):
+    """Cantidad de bits distintos entre dos hashes."""
+    return hamming_weight(a ^ b)
+
+def dhash(img, size=HASH_SIZE):
+    """
+    Hash perceptual por diferencias (dHash) de una imagen en escala de grises:
+    se reduce a (size + 1) x size y cada bit indica si un píxel es más claro
+    que su vecino derecho. Resiste cambios de brillo, escala y compresión.
+    """
+    from PIL import Image
+    if img.mode != 'L':
+        img = img.convert('L')
+    pixels = list(img.resize((size + 1, size), Image.BOX).getdata())
+    value = 0
+    for row in range(size):
+        start = row * (size + 1)
+        for col in range(size):
+            value = (value << 1) | (pixels[start + col] > pixels[start + col + 1])
+    return value
+
+def page_features(image_path):
+    """
+    Rasgos baratos de una página a partir de una sola lectura reducida:
+    (dHash, tipo de página). De un PDF se usa la primera página.
+    """
+    if is_pdf_file(image_path):
+        img = render_page(image_path, 1, PDF_HASH_DPI).convert('L')
+    else:
+        img = open_small(image_path)
+    return dhash(img), classify_image(img)[0]
+
+class HashIndex:
+    """
+    Índice compacto de hashes perceptuales: los hashes van en un array de
+    enteros de 64 bits sin signo (8 bytes por página) y la búsqueda por
+    distancia de Hamming recorre el array. Seguro para usar desde varios hilos.
+    """
+
+    def __init__(self):
+        self._hashes = array('Q')
+        self._types = bytearray()
+        self._names = []
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._positions
+
+    def add(self, name, value, page_type):
+        """Agrega (o reemplaza) el hash de una página."""
+        type_code = _type_code(page_type)
+        with self._lock:
+            position = self._positions.get(name)
+            if position is None:
+                self._positions[name] = len(self._names)
+                self._names.append(name)
+                self._hashes.append(value)
+                self._types.append(type_code)
+            else:
+                self._hashes[position] = value
+                self._types[position] = type_code
+
+    def remove(self, name):
+        """Quita una página. La última entrada ocupa su lugar (sin desplazar el array)."""
+        with self._lock:
+            position = self._positions.pop(name, None)
+            if position is None:
+                return False
+            last = len(self._names) - 1
+            if position != last:
+                moved = self._names[last]
+                self._names[position] = moved
+                self._hashes[position] = self._hashes[last]
+                self._types[position] = self._types[last]
+                self._positions[moved] = position
+            self._names.pop()
+            self._hashes.pop()
+            del self._types[last]
+            return True
+
+    def get(self, name):
+        """Retorna (hash, tipo de página) de una página, o None si no está."""
+        with self._lock:
+            position = self._positions.get(name)
+            if position is None:
+                return None
+            return self._hashes[position], PAGE_TYPES[self._types[position]]
+
+    def near(self, value, max_distance=NEAR_DUPLICATE_DISTANCE, page_type=None, exclude=None):
+        """
+        Páginas a max_distance bits o menos del hash, de las más parecidas a las
+        menos: lista de (nombre, distancia). Opcionalmente solo de un tipo.
+        """
+        type_code = _type_code(page_type) if page_type is not None else None
+        matches = []
+        with self._lock:
+            for position, other in enumerate(self._hashes):
+                distance = hamming_weight(value ^ other)
+                if distance <= max_distance and (type_code is None or self._types[position] == type_code):
+                    name = self._names[position]
+                    if name != exclude:
+                        matches.append((name, distance))
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+    def duplicates_of(self, name, max_distance=NEAR_DUPLICATE_DISTANCE):
+        """
+        Posibles reescaneos de una página ya indexada. Solo se buscan para el
+        pagaré: las páginas de firmas son casi blancas y se parecen todas entre sí.
+        """
+        entry = self.get(name)
+        if entry is None or entry[1] != PAGE_PAGARE:
+            return []
+        value, page_type = entry
+        return [other for other, _ in self.near(value, max_distance, page_type, exclude=name)]
+
+def _type_code(page_type):
+    return PAGE_TYPES.index(page_type)
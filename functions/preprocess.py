@@ -0,0 +1,197 @@
+import os
+import json
+import logging
+
+from PIL import Image
+
+from functions import metrics
+from functions.database import BASE_DIR
+from functions.jpeg_rotation import apply_orientation, read_orientation
+
+logger = logging.getLogger(__name__)
+
+# Archivo opcional para ajustar la configuración (mismas claves que DEFAULT_CONFIG)
+CONFIG_PATH = os.path.join(BASE_DIR, 'preprocess.json')
+
+DEFAULT_CONFIG = {
+    # Desactivar para pasar la imagen original a Tesseract
+    'enabled': True,
+    # Resolución a la que se lleva la imagen antes del OCR (solo se reduce, nunca se amplía)
+    'target_dpi': 300,
+    # Ancho de página en pulgadas para estimar la resolución si la imagen no la trae
+    'page_width_inches': 8.27,
+    'grayscale': True,
+    # Umbral de Otsu: blanco y negro puro
+    'binarize': True,
+    # Corrección de inclinación: ángulo máximo y paso de búsqueda (grados)
+    'deskew': True,
+    'max_skew': 5.0,
+    'skew_step': 0.5,
+    # Página de firmas (ver functions/page_classifier.py): 'full' (igual que el
+    # pagaré), 'fast' (pasada rápida a baja resolución) o 'skip' (sin OCR)
+    'signature_page': 'fast',
+    'signature_dpi': 150,
+    # Nombre de la plantilla de recorte a usar (ver 'crop_templates'), o None
+    'crop_template': None,
+    # Plantillas de recorte: región -> [izquierda, arriba, derecha, abajo] como
+    # fracción de la página. Solo se hace OCR de esas regiones.
+    'crop_templates': {
+        'pagare': {
+            'nombre': [0.05, 0.10, 0.95, 0.22],
+            'rut': [0.05, 0.18, 0.95, 0.30],
+            'folio': [0.50, 0.02, 0.98, 0.12]
+        }
+    }
+}
+
+# Ancho de trabajo para estimar la inclinación
+DESKEW_WIDTH = 800
+
+def load_config(path=CONFIG_PATH):
+    """Retorna la configuración por defecto combinada con preprocess.json, si existe."""
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                config.update(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.error(f"No se pudo leer {path}, se usará la configuración por defecto: {e}")
+    return config
+
+def signature_config(config):
+    """
+    Configuración para la pasada rápida de una página de firmas: menor
+    resolución, sin corrección de inclinación y sin plantilla de recorte.
+    """
+    config = dict(config)
+    config.update(target_dpi=config['signature_dpi'], deskew=False, crop_template=None)
+    return config
+
+def source_dpi(img, config):
+    """Resolución de la imagen: la de sus metadatos o una estimación según el ancho de página."""
+    dpi = img.info.get('dpi')
+    if dpi and dpi[0] > 1:
+        return float(dpi[0])
+    return min(img.size) / config['page_width_inches']
+
+def otsu_threshold(img):
+    """Calcula el umbral de Otsu a partir del histograma de una imagen en escala de grises."""
+    histogram = img.histogram()[:256]
+    total = sum(histogram)
+    sum_total = sum(i * count for i, count in enumerate(histogram))
+
+    best_threshold, best_variance = 127, 0.0
+    weight_bg = sum_bg = 0
+    for threshold, count in enumerate(histogram):
+        weight_bg += count
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += threshold * count
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_total - sum_bg) / weight_fg
+        variance = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = threshold, variance
+    return best_threshold
+
+def binarize(img):
+    """Convierte una imagen en escala de grises a blanco y negro con el umbral de Otsu."""
+    threshold = otsu_threshold(img)
+    return img.point(lambda value: 255 if value > threshold else 0)
+
+def estimate_skew(img, max_skew, step):
+    """
+    Estima la inclinación del texto (en grados) con perfiles de proyección:
+    el ángulo correcto es el que deja las filas de texto más marcadas.
+    """
+    scale = DESKEW_WIDTH / img.width
+    small = img.resize((DESKEW_WIDTH, max(1, int(img.height * scale))), Image.BILINEAR)
+    # Texto en blanco sobre negro, para que el relleno de la rotación no cuente
+    inverted = small.point(lambda value: 255 - value)
+
+    best_angle, best_score = 0.0, -1.0
+    steps = int(max_skew / step)
+    for i in range(-steps, steps + 1):
+        angle = i * step
+        rotated = inverted.rotate(angle, resample=Image.NEAREST, fillcolor=0)
+        # Promedio de cada fila calculado por PIL (reducción a 1 píxel de ancho)
+        profile = list(rotated.resize((1, rotated.height), Image.BOX).getdata())
+        mean = sum(profile) / len(profile)
+        score = sum((value - mean) ** 2 for value in profile)
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+def crop_regions(img, template):
+    """Recorta las regiones de la plantilla. Retorna una lista de (nombre, imagen)."""
+    width, height = img.size
+    regions = []
+    for name, (left, top, right, bottom) in template.items():
+        box = (int(left * width), int(top * height), int(right * width), int(bottom * height))
+        regions.append((name, img.crop(box)))
+    return regions
+
+def load_for_ocr(image_path, config):
+    """
+    Abre una imagen y la prepara para Tesseract según la configuración.
+    Retorna una lista de (región, imagen); sin plantilla de recorte hay una sola
+    región llamada 'pagina'.
+    """
+    with metrics.timed('image_decode'), Image.open(image_path) as img:
+        orientation = read_orientation(img)
+        if not config.get('enabled', True):
+            img.load()
+            return [('pagina', apply_orientation(img, orientation))]
+
+        dpi = source_dpi(img, config)
+        scale = min(1.0, config['target_dpi'] / dpi)
+        target_size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+
+        # El decodificador JPEG puede entregar directamente gris y a menor escala
+        img.draft('L' if config['grayscale'] else 'RGB', target_size)
+        img.load()
+        if config['grayscale'] and img.mode != 'L':
+            img = img.convert('L')
+        if img.size != target_size:
+            img = img.resize(target_size, Image.LANCZOS, reducing_gap=2.0)
+        img = apply_orientation(img, orientation)
+
+    return _prepare(img, config, os.path.basename(image_path))
+
+def prepare_page(img, config, name=''):
+    """
+    Prepara para Tesseract una página ya rasterizada a la resolución final
+    (por ejemplo, una página de un PDF). Retorna una lista de (región, imagen).
+    """
+    if not config.get('enabled', True):
+        return [('pagina', img)]
+    if config['grayscale'] and img.mode != 'L':
+        img = img.convert('L')
+    return _prepare(img, config, name)
+
+def _prepare(img, config, name):
+    """Binarización, corrección de inclinación y recorte de regiones."""
+    with metrics.timed('preprocess'):
+        return _prepare_regions(img, config, name)
+
+def _prepare_regions(img, config, name):
+    if config['binarize'] and img.mode == 'L':
+        img = binarize(img)
+
+    if config['deskew'] and img.mode == 'L':
+        angle = estimate_skew(img, config['max_skew'], config['skew_step'])
+        if angle:
+            img = img.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+            logger.info(f"Inclinación corregida en {angle:.1f}° para {name}")
+
+    template_name = config.get('crop_template')
+    if template_name:
+        template = config['crop_templates'].get(template_name)
+        if template:
+            return crop_regions(img, template)
+        logger.warning(f"Plantilla de recorte desconocida: {template_name}")
+
+    return [('pagina', img)]
@@ -0,0 +1,93 @@
+import os
+import shutil
+import logging
+import tempfile
+
+from functions import metrics
+from functions.database import BASE_DIR
+from functions.image_index import is_pdf_file
+from functions.jpeg_rotation import apply_orientation, read_orientation
+from functions.pdf_intake import render_page
+
+logger = logging.getLogger(__name__)
+
+# Carpeta del caché de vistas previas: cache/previews/<archivo>/<mtime_ns>.jpg
+PREVIEW_DIR = os.path.join(BASE_DIR, 'cache', 'previews')
+
+# Tamaño máximo y calidad de las vistas previas
+PREVIEW_SIZE = (1200, 1200)
+PREVIEW_QUALITY = 85
+
+# Resolución a la que se rasteriza la primera página de un PDF para su vista previa
+PDF_PREVIEW_DPI = 100
+
+def preview_version(image_path):
+    """Versión de la vista previa: cambia cada vez que se modifica la imagen."""
+    return os.stat(image_path).st_mtime_ns
+
+def preview_path(image_path, version=None):
+    """Ruta de la vista previa de una imagen para su versión actual."""
+    if version is None:
+        version = preview_version(image_path)
+    return os.path.join(PREVIEW_DIR, os.path.basename(image_path), f"{version}.jpg")
+
+def ensure_preview(image_path):
+    """
+    Retorna la ruta de la vista previa de la imagen, generándola si no existe.
+    Las versiones anteriores de la misma imagen se eliminan.
+    """
+    version = preview_version(image_path)
+    path = preview_path(image_path, version)
+    if os.path.exists(path):
+        return path
+
+    with metrics.timed('preview'):
+        _render_preview(image_path, path)
+    logger.info(f"Vista previa generada: {os.path.basename(image_path)}")
+    return path
+
+def _render_preview(image_path, path):
+    """Genera la vista previa en path y elimina las versiones anteriores."""
+    from PIL import Image
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+
+    if is_pdf_file(image_path):
+        # De un PDF se muestra la primera página
+        img = render_page(image_path, 1, PDF_PREVIEW_DPI)
+        img.thumbnail(PREVIEW_SIZE, Image.LANCZOS)
+    else:
+        with Image.open(image_path) as img:
+            orientation = read_orientation(img)
+            # draft() permite que el decodificador JPEG reduzca la imagen al leerla
+            img.draft('RGB', PREVIEW_SIZE)
+            img.thumbnail(PREVIEW_SIZE, Image.LANCZOS)
+            # Aplicar la orientación EXIF (la vista previa se guarda sin EXIF)
+            img = apply_orientation(img, orientation)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    # Escritura atómica para no servir nunca una vista previa a medias
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            img.save(f, format='JPEG', quality=PREVIEW_QUALITY, optimize=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    # Solo las versiones anteriores ya generadas: los .tmp pueden ser de otra
+    # petición que está generando la misma vista previa en este momento
+    version = int(os.path.splitext(os.path.basename(path))[0])
+    for name in os.listdir(folder):
+        stem, extension = os.path.splitext(name)
+        if extension == '.jpg' and stem.isdigit() and int(stem) < version:
+            try:
+                os.remove(os.path.join(folder, name))
+            except OSError:
+                pass
+
+def remove_previews(filename):
+    """Elimina todas las vistas previas de un archivo."""
+    shutil.rmtree(os.path.join(PREVIEW_DIR, os.path.basename(filename)), ignore_errors=True)
@@ -0,0 +1,146 @@
+import io
+import os
+import csv
+import json
+import time
+import logging
+import importlib.util
+
+from functions.database import DB_PATH, connect
+from functions.doc_ids import new_document_id
+from functions.field_extractor import fields_to_columns
+from functions.student_index import CSV_ENCODING, CSV_PATH
+
+logger = logging.getLogger(__name__)
+
+# Columnas de db_input.csv (se usan si el archivo no existe)
+DEFAULT_COLUMNS = (
+    'rut', 'dig_ver', 'nombres_alumno', 'apellido_pat_alumno', 'apellido_mat_alumno', 'sexo', 'estado_civil',
+    'fecha_nac', 'direccion_padres', 'tipo_deuda', 'correo_institucional', 'correo_alumno', 'tel_1', 'tel_2',
+    'folio', 'fecha', 'monto', 'rut_aval', 'nombres_aval', 'ape_pat_aval', 'ap_mat_aval', 'dir_aval',
+    'ciudad_aval', 'tel_aval', 'mail_aval', 'nombre_documento',
+)
+
+# Columna con los archivos del documento (los nombres generados al entrar a input)
+DOCUMENT_NAME_COLUMN = 'nombre_documento'
+# Separador entre los archivos de un documento (el pagaré primero)
+DOCUMENT_NAME_SEPARATOR = ';'
+
+# Filas por bloque del CSV: cada bloque se entrega apenas está listo
+CSV_CHUNK_ROWS = 200
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+def export_columns(csv_path=CSV_PATH):
+    """Encabezado de db_input.csv (DEFAULT_COLUMNS si el archivo no existe)."""
+    try:
+        with open(csv_path, newline='', encoding=CSV_ENCODING) as f:
+            header = next(csv.reader(f), None)
+    except OSError:
+        header = None
+    return tuple(header) if header else DEFAULT_COLUMNS
+
+def xlsx_available():
+    """Indica si está instalado openpyxl (opcional, solo para exportar a XLSX)."""
+    return importlib.util.find_spec('openpyxl') is not None
+
+def document_name(files):
+    """Valor de nombre_documento: los archivos del documento sin repetir, en el orden de sus páginas."""
+    return DOCUMENT_NAME_SEPARATOR.join(dict.fromkeys(os.path.basename(f) for f in files if f))
+
+def last_export_cursor(db_path=DB_PATH):
+    """change_seq de documents hasta el que llegó la última exportación, o None si no hubo ninguna."""
+    conn = connect(db_path)
+    try:
+        return conn.execute("SELECT max(until_seq) FROM exports").fetchone()[0]
+    finally:
+        conn.close()
+
+def iter_records(since=None, db_path=DB_PATH):
+    """
+    Genera (change_seq, fila) de los documentos asociados a un alumno, en orden
+    de modificación (solo los de un change_seq mayor que since, si se indica).
+    La fila tiene las columnas de db_input.csv: el registro del alumno,
+    completado con los campos del OCR que no traiga, y nombre_documento.
+    Se lee un documento a la vez: la memoria no crece con la cantidad.
+    """
+    query = "SELECT id, student_record, change_seq FROM documents WHERE student_record IS NOT NULL"
+    params = ()
+    if since is not None:
+        query += " AND change_seq > ?"
+        params = (since,)
+    query += " ORDER BY change_seq, id"
+
+    conn = connect(db_path)
+    try:
+        for document in conn.execute(query, params):
+            fields = {field['name']: {'value': field['value']} for field in conn.execute(
+                "SELECT name, value FROM fields WHERE document_id = ? AND value IS NOT NULL", (document['id'],))}
+            row = fields_to_columns(fields)
+            row.update((column, value) for column, value in json.loads(document['student_record']).items() if value)
+            row[DOCUMENT_NAME_COLUMN] = document_name(page['file'] for page in conn.execute(
+                "SELECT file FROM pages WHERE document_id = ? ORDER BY number", (document['id'],)))
+            yield document['change_seq'], row
+    finally:
+        conn.close()
+
+def export_rows(export_format='csv', since_last=False, db_path=DB_PATH):
+    """
+    Genera las filas a exportar: todas, o con since_last solo las nuevas o
+    modificadas desde la última exportación. La exportación se registra al
+    consumir todas las filas; si se interrumpe (por ejemplo, se corta la
+    descarga), la siguiente exportación incremental vuelve a incluirlas.
+    """
+    since = last_export_cursor(db_path) if since_last else None
+    until, rows = since, 0
+    for change_seq, row in iter_records(since, db_path):
+        until = change_seq
+        rows += 1
+        yield row
+    _record_export(export_format, since, until, rows, db_path)
+
+def _record_export(export_format, since, until, rows, db_path):
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO exports (id, format, since_seq, until_seq, rows, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (new_document_id(), export_format, since, until, rows, time.time()))
+    finally:
+        conn.close()
+    logger.info(f"Exportación {export_format} registrada: {rows} filas"
+                f"{' (incremental)' if since is not None else ''}")
+
+def csv_chunks(rows, columns):
+    """
+    Genera el CSV en bloques de texto, con el encabezado y la codificación de
+    db_input.csv (UTF-8 con BOM), para enviarlo o escribirlo a medida que se produce.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore', lineterminator='\n')
+    buffer.write('\ufeff')
+    writer.writeheader()
+    for count, row in enumerate(rows):
+        # El encabezado sale antes de la primera fila y luego cada CSV_CHUNK_ROWS filas
+        if count % CSV_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        writer.writerow(row)
+    yield buffer.getvalue()
+
+def write_xlsx(rows, columns, path):
+    """
+    Escribe las filas en un XLSX con el modo de solo escritura de openpyxl, que
+    guarda cada fila comprimida a medida que llega. Requiere openpyxl.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError('Para exportar a XLSX instala openpyxl: pip install openpyxl')
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('db_input')
+    sheet.append(list(columns))
+    for row in rows:
+        sheet.append([row.get(column, '') for column in columns])
+    workbook.save(path)
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import logging
+
+# fcntl solo existe en Linux/macOS; en Windows se usa msvcrt
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+from functions.database import BASE_DIR, DB_PATH, connect
+
+logger = logging.getLogger(__name__)
+
+# Archivo de bloqueo: el proceso que lo tiene es el único que monitorea la carpeta
+MONITOR_LOCK_PATH = os.path.join(BASE_DIR, 'cache', 'monitor.lock')
+
+# El estado de la carpeta que publica el monitor para los demás procesos está en
+# la base local: una foto del índice (folder_snapshots) y, desde ella, solo los
+# cambios (folder_changes), que los demás procesos aplican a su propio índice
+
+class LeaderLock:
+    """
+    Bloqueo exclusivo sobre un archivo para elegir un único proceso líder.
+    El sistema operativo lo libera si el proceso termina, así que otro proceso
+    puede tomar el relevo.
+    """
+
+    def __init__(self, path=MONITOR_LOCK_PATH):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def try_acquire(self):
+        """Intenta tomar el bloqueo sin esperar. Retorna True si este proceso es el líder."""
+        if self._file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        logger.info(f"Proceso {os.getpid()} elegido para monitorear la carpeta")
+        return True
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def publish_snapshot(state, db_path=DB_PATH):
+    """
+    Publica una foto completa del estado de la carpeta: {'version',
+    'last_modified', 'index' (nombre -> mtime), 'jobs_recovered_for'}. Los
+    cambios anteriores a la foto previa ya no hacen falta y se eliminan.
+    """
+    conn = connect(db_path)
+    try:
+        with conn:
+            previous = conn.execute("SELECT max(version) FROM folder_snapshots").fetchone()[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO folder_snapshots "
+                "(version, last_modified, entries, jobs_recovered_for, pid, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (state['version'], state['last_modified'], json.dumps(state['index'], ensure_ascii=False),
+                 state.get('jobs_recovered_for'), os.getpid(), time.time()))
+            conn.execute("DELETE FROM folder_snapshots WHERE version < ?", (state['version'],))
+            if previous is not None:
+                conn.execute("DELETE FROM folder_changes WHERE version <= ?", (previous,))
+    finally:
+        conn.close()
+
+def publish_change(change, mtimes, db_path=DB_PATH):
+    """
+    Agrega un cambio de la carpeta al registro: el cambio tal como lo ven los
+    clientes ({'version', 'last_modified', 'added', 'modified', 'removed'}) y
+    la fecha de modificación de los archivos agregados o modificados.
+    """
+    conn = connect(db_path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO folder_changes (version, last_modified, added, modified, removed, mtimes) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (change['version'], change['last_modified'], json.dumps(change['added'], ensure_ascii=False),
+                 json.dumps(change['modified'], ensure_ascii=False), json.dumps(change['removed'], ensure_ascii=False),
+                 json.dumps(mtimes, ensure_ascii=False)))
+    finally:
+        conn.close()
+
+def _change_from_row(row):
+    change = {'version': row['version'], 'last_modified': row['last_modified']}
+    for kind in ('added', 'modified', 'removed'):
+        change[kind] = json.loads(row[kind])
+    return change, json.loads(row['mtimes'])
+
+def read_changes(since=None, db_path=DB_PATH):
+    """
+    Lee lo publicado después de la versión `since`. Retorna (foto, cambios):
+    la foto es None si los cambios registrados alcanzan para continuar desde
+    `since` (lo normal, sin releer el índice completo); si no (proceso nuevo o
+    muy atrasado), es la última foto publicada y los cambios son los posteriores.
+    Cada cambio es un par (cambio, mtimes) como los de publish_change.
+    """
+    conn = connect(db_path)
+    try:
+        if since is not None:
+            oldest, newest = conn.execute("SELECT min(version), max(version) FROM folder_changes").fetchone()
+            snapshot_version = conn.execute("SELECT max(version) FROM folder_snapshots").fetchone()[0]
+            # Alcanza si no falta ninguna versión entre `since` y el primer cambio guardado
+            first_needed = oldest if oldest is not None else (snapshot_version or 0) + 1
+            if first_needed <= since + 1 <= max(newest or 0, snapshot_version or 0) + 1:
+                rows = conn.execute("SELECT * FROM folder_changes WHERE version > ? ORDER BY version", (since,))
+                return None, [_change_from_row(row) for row in rows]
+
+        row = conn.execute("SELECT * FROM folder_snapshots ORDER BY version DESC LIMIT 1").fetchone()
+        if row is None:
+            return None, []
+        snapshot = {
+            'version': row['version'],
+            'last_modified': row['last_modified'],
+            'index': json.loads(row['entries']),
+            'jobs_recovered_for': row['jobs_recovered_for']
+        }
+        rows = conn.execute("SELECT * FROM folder_changes WHERE version > ? ORDER BY version", (row['version'],))
+        return snapshot, [_change_from_row(row) for row in rows]
+    finally:
+        conn.close()
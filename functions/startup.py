@@ -0,0 +1,211 @@
+import os
+import sys
+import time
+import socket
+import logging
+import importlib
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Módulos que la primera página no necesita (imágenes, PDF y OCR). Los módulos
+# de functions/ los importan recién al usarlos; con el servidor ya escuchando,
+# se precargan en segundo plano para que el primer clic no pague su carga.
+WARM_UP_MODULES = ('PIL.Image', 'PIL.ImageOps', 'functions.test_ocr')
+
+# Espera máxima a que el servidor acepte conexiones antes de precargar igualmente
+LISTEN_TIMEOUT = 30
+LISTEN_POLL_INTERVAL = 0.05
+
+# Importaciones más lentas que se listan en el reporte de inicio
+REPORT_TOP_IMPORTS = 10
+
+# Dirección a la que conectarse para saber si el servidor ya escucha
+PROBE_HOSTS = {'': '127.0.0.1', '0.0.0.0': '127.0.0.1', '::': '::1'}
+
+def _process_age():
+    """Segundos desde que se inició el proceso (vía /proc, solo Linux), o None."""
+    try:
+        with open('/proc/self/stat') as f:
+            # El campo 22 (starttime, en ticks desde el arranque) va después del nombre entre paréntesis
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+# Referencia de tiempo: el inicio del proceso si se conoce, si no la carga de este módulo
+_loaded_at = time.perf_counter()
+_process_offset = _process_age() or 0.0
+
+_phases = {}
+_phases_lock = threading.Lock()
+
+# Duración de cada paso del precalentamiento: lista de (paso, segundos)
+_warm_up_steps = []
+
+def elapsed():
+    """Segundos desde el inicio del proceso."""
+    return _process_offset + time.perf_counter() - _loaded_at
+
+def mark(phase):
+    """Registra el momento en que terminó una fase del inicio (solo la primera vez)."""
+    if phase in _phases:
+        return
+    with _phases_lock:
+        if phase in _phases:
+            return
+        _phases[phase] = elapsed()
+    logger.info(f"Inicio: {phase} a los {_phases[phase]:.3f} s")
+
+def phases():
+    """Fases registradas: lista de (fase, segundos desde el inicio del proceso)."""
+    with _phases_lock:
+        return sorted(_phases.items(), key=lambda item: item[1])
+
+class _TimedLoader:
+    """Envuelve el cargador de un módulo para medir su ejecución."""
+
+    def __init__(self, loader, timer):
+        self._loader = loader
+        self._timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        # El módulo queda con su cargador original (importlib.resources, jinja2, etc.)
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+        self._timer.run(module.__name__, self._loader.exec_module, module)
+
+class ImportTimer:
+    """
+    Mide cuánto tarda cada importación, como python -X importtime: un buscador
+    al inicio de sys.meta_path envuelve el cargador de cada módulo nuevo.
+    Registra el tiempo acumulado (con sus importaciones) y el propio de cada módulo.
+    """
+
+    def __init__(self):
+        self.times = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def run(self, name, function, *args):
+        # Pila por hilo con el tiempo de las importaciones anidadas de cada nivel
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            total = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += total
+            with self._lock:
+                self.times[name] = (total, total - nested)
+
+    def slowest(self, count=REPORT_TOP_IMPORTS):
+        """Las importaciones de mayor tiempo acumulado: lista de (módulo, acumulado, propio)."""
+        with self._lock:
+            items = [(name, total, own) for name, (total, own) in self.times.items()]
+        items.sort(key=lambda item: item[1], reverse=True)
+        return items[:count]
+
+import_timer = ImportTimer()
+
+def track_imports():
+    """Empieza a medir las importaciones (hasta stop_tracking_imports)."""
+    import_timer.install()
+
+def stop_tracking_imports():
+    """Deja de medir las importaciones: quita el buscador de sys.meta_path."""
+    import_timer.uninstall()
+
+def _timed_step(name, function, *args):
+    start = time.perf_counter()
+    try:
+        return function(*args)
+    finally:
+        _warm_up_steps.append((name, time.perf_counter() - start))
+
+def report():
+    """Reporte de inicio: fases y las importaciones más lentas."""
+    lines = ['Reporte de inicio (segundos desde el inicio del proceso):']
+    lines.extend(f"  {phase:<14} {seconds:8.3f}" for phase, seconds in phases())
+    slowest = import_timer.slowest()
+    if slowest:
+        lines.append('Importaciones más lentas (acumulado / propio):')
+        lines.extend(f"  {total:8.3f} {own:8.3f}  {name}" for name, total, own in slowest)
+    if _warm_up_steps:
+        lines.append('Precalentamiento:')
+        lines.extend(f"  {seconds:8.3f}  {name}" for name, seconds in _warm_up_steps)
+    return '\n'.join(lines)
+
+def wait_until_listening(port, host='', timeout=LISTEN_TIMEOUT):
+    """Espera a que el servidor acepte conexiones en el puerto. Retorna si lo logró."""
+    probe_host = PROBE_HOSTS.get(host, host)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((probe_host, port), timeout=LISTEN_POLL_INTERVAL * 4):
+                return True
+        except OSError:
+            time.sleep(LISTEN_POLL_INTERVAL)
+    return False
+
+def _warm_up(port, host, tasks):
+    if port is not None and not wait_until_listening(port, host):
+        logger.warning(f"El servidor no respondió en el puerto {port}; se precarga igualmente")
+    mark('listening')
+
+    for name in WARM_UP_MODULES:
+        try:
+            _timed_step(f"import {name}", importlib.import_module, name)
+        except ImportError as e:
+            logger.warning(f"No se pudo precargar {name}: {e}")
+    for name, task in tasks:
+        try:
+            _timed_step(name, task)
+        except Exception as e:
+            logger.error(f"Error en el precalentamiento ({name}): {e}")
+    mark('warm_up')
+
+    logger.info(report())
+
+def start_warm_up(port=None, host='', tasks=()):
+    """
+    Precarga en un hilo los módulos pesados y ejecuta las tareas indicadas
+    (pares nombre, función), recién cuando el servidor ya escucha en el puerto
+    (sin port, de inmediato). Al terminar registra el reporte de inicio en el log.
+    """
+    thread = threading.Thread(target=_warm_up, args=(port, host, tuple(tasks)), daemon=True)
+    thread.start()
+    return thread
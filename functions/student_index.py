@@ -0,0 +1,230 @@
+import os
+import csv
+import io
+import logging
+import threading
+import unicodedata
+from array import array
+from collections import Counter
+
+from functions.database import BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Archivo maestro de alumnos y avales
+CSV_PATH = os.path.join(BASE_DIR, 'db_input.csv')
+CSV_ENCODING = 'utf-8-sig'
+
+# Columnas que forman el nombre completo del alumno
+NAME_COLUMNS = ('nombres_alumno', 'apellido_pat_alumno', 'apellido_mat_alumno')
+
+# Similitud mínima (0-1) para aceptar una coincidencia aproximada de nombre
+MIN_NAME_SCORE = 0.45
+
+def normalize_rut(rut):
+    """
+    Normaliza un RUT a su número sin puntos ni dígito verificador.
+    '20.500.542-0' -> 20500542. Retorna None si no es válido.
+    """
+    if rut is None:
+        return None
+    rut = str(rut).strip().upper().replace('.', '').replace(' ', '')
+    if '-' in rut:
+        rut = rut.split('-')[0]
+    return int(rut) if rut.isdigit() else None
+
+def normalize_folio(folio):
+    """Normaliza un folio a entero. Retorna None si no es válido."""
+    folio = str(folio or '').strip()
+    return int(folio) if folio.isdigit() else None
+
+def normalize_name(name):
+    """Pasa un nombre a mayúsculas sin tildes ni signos, con espacios simples."""
+    name = unicodedata.normalize('NFKD', str(name or '').upper())
+    name = ''.join(c if c.isalnum() else ' ' for c in name if not unicodedata.combining(c))
+    return ' '.join(name.split())
+
+def trigrams(name):
+    """Conjunto de trigramas de un nombre normalizado (con bordes por palabra)."""
+    result = set()
+    for word in name.split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+class StudentIndex:
+    """
+    Índice en memoria de db_input.csv.
+    Las filas se guardan como tuplas y se indexan por RUT (número sin dígito
+    verificador) y por folio con diccionarios de enteros; los nombres se indexan
+    por trigramas para búsquedas aproximadas. Si el archivo cambia, se vuelve a
+    cargar: solo las filas nuevas si únicamente se agregaron al final.
+    """
+
+    def __init__(self, csv_path=CSV_PATH):
+        self.csv_path = csv_path
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.header = ()
+        self.rows = []
+        self.by_rut = {}
+        self.by_folio = {}
+        self.name_trigrams = {}
+        self.name_sizes = array('H')
+        self._signature = None
+        self._offset = 0
+        self._tail = b''
+
+    def __len__(self):
+        return len(self.rows)
+
+    def refresh(self):
+        """Recarga el archivo si cambió desde la última lectura."""
+        try:
+            stat = os.stat(self.csv_path)
+        except OSError:
+            return
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature:
+            return
+
+        with self._lock:
+            if signature == self._signature:
+                return
+            with open(self.csv_path, 'rb') as f:
+                if self._can_append(f, stat.st_size):
+                    f.seek(self._offset)
+                    added = self._load(f.read(), header_known=True)
+                    logger.info(f"Índice de alumnos: {added} filas nuevas")
+                else:
+                    self._reset()
+                    added = self._load(f.read(), header_known=False)
+                    logger.info(f"Índice de alumnos cargado: {added} filas")
+            self._signature = signature
+
+    def _can_append(self, f, size):
+        """Indica si el archivo solo creció al final desde la última lectura."""
+        if not self.header or size < self._offset:
+            return False
+        f.seek(self._offset - len(self._tail))
+        if f.read(len(self._tail)) != self._tail:
+            return False
+        # Si la última fila no terminaba en salto de línea, lo nuevo debe empezar con uno
+        return self._tail.endswith(b'\n') or f.read(1) in (b'\r', b'\n', b'')
+
+    def _load(self, data, header_known):
+        text = data.decode(CSV_ENCODING if not header_known else 'utf-8')
+        self._offset += len(data)
+        if data:
+            self._tail = (self._tail + data)[-64:]
+
+        reader = csv.reader(io.StringIO(text))
+        if not header_known:
+            self.header = tuple(next(reader, ()))
+        columns = {name: i for i, name in enumerate(self.header)}
+
+        added = 0
+        for values in reader:
+            if not values:
+                continue
+            if len(values) < len(self.header):
+                # Una fila cortada (por ejemplo, la última mientras se escribe el archivo)
+                logger.warning(f"Fila incompleta de {os.path.basename(self.csv_path)} omitida: "
+                               f"{len(values)} de {len(self.header)} columnas ({','.join(values)[:80]})")
+                continue
+            self._add_row(tuple(values), columns)
+            added += 1
+        return added
+
+    def _add_row(self, row, columns):
+        row_id = len(self.rows)
+        self.rows.append(row)
+
+        rut = normalize_rut(row[columns['rut']]) if 'rut' in columns else None
+        if rut is not None:
+            self.by_rut.setdefault(rut, []).append(row_id)
+
+        folio = normalize_folio(row[columns['folio']]) if 'folio' in columns else None
+        if folio is not None:
+            self.by_folio.setdefault(folio, []).append(row_id)
+
+        name = normalize_name(' '.join(row[columns[c]] for c in NAME_COLUMNS if c in columns))
+        grams = trigrams(name)
+        self.name_sizes.append(min(len(grams), 0xFFFF))
+        for gram in grams:
+            postings = self.name_trigrams.get(gram)
+            if postings is None:
+                postings = self.name_trigrams[gram] = array('I')
+            postings.append(row_id)
+
+    def record(self, row_id):
+        """Retorna la fila como diccionario columna -> valor."""
+        return dict(zip(self.header, self.rows[row_id]))
+
+    def find_by_rut(self, rut):
+        """Retorna las filas con ese RUT (acepta puntos y dígito verificador)."""
+        self.refresh()
+        return [self.record(i) for i in self.by_rut.get(normalize_rut(rut), ())]
+
+    def find_by_folio(self, folio):
+        """Retorna las filas con ese folio."""
+        self.refresh()
+        return [self.record(i) for i in self.by_folio.get(normalize_folio(folio), ())]
+
+    def find_by_name(self, name, limit=5, min_score=MIN_NAME_SCORE):
+        """
+        Búsqueda aproximada de nombres (tolera errores de OCR).
+        Retorna una lista de (similitud, registro) ordenada de mayor a menor.
+        """
+        self.refresh()
+        query = trigrams(normalize_name(name))
+        if not query:
+            return []
+
+        hits = Counter()
+        for gram in query:
+            hits.update(self.name_trigrams.get(gram, ()))
+
+        scored = []
+        for row_id, common in hits.items():
+            # Similitud de Jaccard entre los conjuntos de trigramas
+            score = common / (len(query) + self.name_sizes[row_id] - common)
+            if score >= min_score:
+                scored.append((score, row_id))
+        scored.sort(reverse=True)
+        return [(round(score, 3), self.record(row_id)) for score, row_id in scored[:limit]]
+
+    def match(self, student_data):
+        """
+        Busca el registro que corresponde a los datos extraídos por el OCR.
+        Prueba por RUT, luego por folio y por último por nombre aproximado.
+        Retorna {'record', 'matched_by', 'score'} o None.
+        """
+        student_data = student_data or {}
+        for field, finder in (('rut', self.find_by_rut), ('folio', self.find_by_folio)):
+            if student_data.get(field):
+                records = finder(student_data[field])
+                if records:
+                    return {'record': records[0], 'matched_by': field, 'score': 1.0}
+
+        if student_data.get('nombre'):
+            # El pagaré trae "APELLIDOS, NOMBRES"; el orden no afecta a los trigramas
+            candidates = self.find_by_name(student_data['nombre'].replace(',', ' '), limit=1)
+            if candidates:
+                score, record = candidates[0]
+                return {'record': record, 'matched_by': 'nombre', 'score': score}
+        return None
+
+# Índice compartido por la aplicación
+_student_index = None
+_student_index_lock = threading.Lock()
+
+def get_student_index():
+    """Retorna el índice de alumnos compartido, creándolo si aún no existe."""
+    global _student_index
+    with _student_index_lock:
+        if _student_index is None:
+            _student_index = StudentIndex()
+        return _student_index
@@ -2,89 +2,307 @@ import os
 import sys
 import logging
 from PIL import Image
-import subprocess
-import re
 import json
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# Permitir la ejecución directa del script (python functions/test_ocr.py)
+if not __package__:
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from functions import metrics, ocr_cache
+from functions.image_index import ImageIndex, is_pdf_file
+from functions.ocr_engine import get_engine, tesseract_available
+from functions.pdf_intake import iter_pdf_pages, page_count, pdf_reader_class, text_layer, text_layer_words
+from functions.field_extractor import extract_fields, needs_review
+from functions.page_classifier import (CLASSIFIER_CONFIG, PAGE_FIRMA, PAGE_PAGARE, classify_file,
+                                       classify_image, classify_text)
+from functions.preprocess import load_config, load_for_ocr, prepare_page, signature_config
+
+# Parámetros de Tesseract (forman parte de la clave del caché de OCR)
+OCR_LANG = 'spa'
+OCR_CONFIG = ''
+
+# Páginas de un PDF rasterizadas y en OCR al mismo tiempo (memoria acotada)
+PDF_PAGES_IN_FLIGHT = 2
+
+# Archivos de un mismo documento en OCR al mismo tiempo (un proceso de Tesseract por página)
+OCR_FILE_WORKERS = 4
+
+# Tesseract usa varios hilos (OpenMP) por página; con varias páginas en paralelo
+# compiten entre ellos y el total es más lento. Un hilo por proceso de Tesseract.
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+# Clave del caché de OCR bajo la que se guarda el tipo de página de cada imagen
+PAGE_TYPE_CACHE_LANG = 'page_type'
+
+# Configuración del preprocesamiento de imágenes antes de Tesseract
+PREPROCESS_CONFIG = load_config()
+
+# Campos que siempre están presentes en student_data (vacíos si no se encuentran)
+STUDENT_FIELDS = ('nombre', 'rut', 'carrera', 'domicilio', 'folio')
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=None)
 def check_tesseract_installed():
-    """Verifica si Tesseract OCR está instalado en el sistema."""
-    try:
-        # Intentar ejecutar tesseract para verificar si está instalado
-        result = subprocess.run(['tesseract', '--version'], 
-                               stdout=subprocess.PIPE, 
-                               stderr=subprocess.PIPE, 
-                               text=True)
-        return True
-    except FileNotFoundError:
-        return False
+    """
+    Verifica si Tesseract OCR está instalado en el sistema: la biblioteca
+    (tesserocr) o el programa tesseract (ver functions/ocr_engine.py).
+    El resultado se guarda en caché: la verificación se hace una vez por proceso.
+    """
+    return tesseract_available()
 
-def extract_student_data(text):
+def warm_up():
+    """
+    Precarga lo necesario para el OCR (verificación de Tesseract, el motor de
+    OCR con el modelo del idioma y PyPDF2). Se llama una vez al iniciar cada
+    proceso del pool de OCR.
+    """
+    pdf_reader_class()
+    if check_tesseract_installed():
+        engine = get_engine()
+        engine.warm_up(OCR_LANG, tesseract_config())
+        logger.info(f"Proceso de OCR listo con el motor {engine.name} (pid {os.getpid()})")
+    else:
+        logger.warning(f"Tesseract OCR no está instalado (pid {os.getpid()})")
+
+def extract_student_data(text, word_spans=None):
     """
     Extrae datos del estudiante del texto OCR.
-    Retorna un diccionario con los datos extraídos.
-    """
-    data = {
-        'nombre': '',
-        'rut': '',
-        'carrera': '',
-        'domicilio': '',
-        'folio': ''
-    }
-    
-    # Patrones para buscar los datos
-    nombre_pattern = r"NOMBRE DEUDOR\(A\)\s*:\s*([^\n]+)"
-    rut_pattern = r"CEDULA NACIONAL DE IDENTIDAD\s*:\s*([0-9.-]+)"
-    carrera_pattern = r"CARRERA\s*:\s*([^\n]+)"
-    domicilio_pattern = r"DOMICILIO\s*:\s*([^\n]+)"
+    Retorna un diccionario con los datos extraídos (ver functions/field_extractor.py).
+    """
+    return student_data_from_fields(extract_fields(text, word_spans))
+
+def student_data_from_fields(fields):
+    """Convierte los campos extraídos en el diccionario simple campo -> valor."""
+    data = {name: '' for name in STUDENT_FIELDS}
+    data.update((name, field['value']) for name, field in fields.items())
+    return data
+
+def hash_image_files(image_files):
+    """Calcula una clave única para un conjunto de imágenes a partir de su contenido."""
+    digest = hashlib.sha256()
+    for image_path in image_files:
+        digest.update(ocr_cache.file_hash(image_path).encode('ascii'))
+    return digest.hexdigest()
+
+def tesseract_config(preprocess_config=None):
+    """Parámetros de Tesseract, incluida la resolución de la imagen preprocesada."""
+    preprocess_config = preprocess_config or PREPROCESS_CONFIG
+    if preprocess_config.get('enabled', True):
+        return f"{OCR_CONFIG} --dpi {preprocess_config['target_dpi']}".strip()
+    return OCR_CONFIG
+
+def ocr_mode(doc_type):
+    """
+    Cómo se procesa una página según su tipo: 'full' para el pagaré; para la
+    página de firmas, lo que indique la configuración ('full', 'fast' o 'skip').
+    """
+    if doc_type == PAGE_FIRMA:
+        return PREPROCESS_CONFIG.get('signature_page', 'full')
+    return 'full'
+
+def page_preprocess_config(mode):
+    """Configuración de preprocesamiento para el modo de OCR de la página."""
+    return signature_config(PREPROCESS_CONFIG) if mode == 'fast' else PREPROCESS_CONFIG
+
+def page_type(image_path, image_hash):
+    """
+    Tipo de página de una imagen (ver functions/page_classifier.py), antes del
+    OCR. Se guarda en el caché de OCR junto a los resultados de la imagen.
+    """
+    cached = ocr_cache.get(image_hash, PAGE_TYPE_CACHE_LANG, CLASSIFIER_CONFIG)
+    if cached is not None:
+        return cached
+    doc_type, lines = classify_file(image_path)
+    logger.info(f"{os.path.basename(image_path)} clasificada como {doc_type} ({lines} líneas de texto)")
+    ocr_cache.put(image_hash, PAGE_TYPE_CACHE_LANG, CLASSIFIER_CONFIG, doc_type)
+    return doc_type
+
+def words_to_text(data, offset=0):
+    """
+    Reconstruye el texto a partir de los datos por palabra de Tesseract (image_to_data).
+    Retorna (texto, spans), donde spans es una lista de (inicio, fin, confianza)
+    de cada palabra dentro del texto, desplazada en offset.
+    """
+    parts = []
+    spans = []
+    position = offset
+    previous_line = None
+    for i, word in enumerate(data['text']):
+        word = (word or '').strip()
+        if not word:
+            continue
+        line = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+        if previous_line is not None:
+            separator = ' ' if line == previous_line else '\n'
+            parts.append(separator)
+            position += 1
+        previous_line = line
+        parts.append(word)
+        spans.append((position, position + len(word), float(data['conf'][i])))
+        position += len(word)
+    return ''.join(parts), spans
+
+def ocr_image(image_path):
+    """
+    Realiza OCR sobre una imagen, reutilizando el resultado del caché si la
+    imagen (por contenido) ya se procesó con los mismos parámetros.
+    La imagen pasa antes por el preprocesamiento (ver functions/preprocess.py).
     
-    # Buscar nombre
-    nombre_match = re.search(nombre_pattern, text)
-    if nombre_match:
-        data['nombre'] = nombre_match.group(1).strip()
+    Antes del OCR se clasifica la página: la de firmas puede tener una pasada
+    rápida o ninguna (ver ocr_mode).
     
-    # Buscar RUT
-    rut_match = re.search(rut_pattern, text)
-    if rut_match:
-        data['rut'] = rut_match.group(1).strip()
+    Retorna {'text', 'words', 'doc_type', 'mode'}, donde words es la lista de
+    (inicio, fin, confianza) de cada palabra dentro del texto.
+    """
+    image_hash = ocr_cache.file_hash(image_path)
+    doc_type = page_type(image_path, image_hash)
+    mode = ocr_mode(doc_type)
+    metrics.inc('digitaliza_pages_classified_total', doc_type=doc_type)
+    if mode == 'skip':
+        return {'text': '', 'words': [], 'doc_type': doc_type, 'mode': mode}
     
-    # Buscar carrera
-    carrera_match = re.search(carrera_pattern, text)
-    if carrera_match:
-        # Limpiar el texto de la carrera (puede contener texto adicional)
-        carrera_text = carrera_match.group(1).strip()
-        # Si hay "pa" u otros textos extraños al final, eliminarlos
-        if " pa" in carrera_text:
-            carrera_text = carrera_text.split(" pa")[0].strip()
-        data['carrera'] = carrera_text
+    preprocess_config = page_preprocess_config(mode)
+    config = tesseract_config(preprocess_config)
+    cache_config = {'tesseract': config, 'preprocess': preprocess_config}
+    result = ocr_cache.get(image_hash, OCR_LANG, cache_config)
+    if result is not None:
+        metrics.inc('digitaliza_ocr_cache_hits_total', kind='imagen')
+        logger.info(f"Resultado de OCR obtenido del caché para {os.path.basename(image_path)}")
+        return dict(result, doc_type=doc_type, mode=mode)
     
-    # Buscar domicilio
-    domicilio_match = re.search(domicilio_pattern, text)
-    if domicilio_match:
-        data['domicilio'] = domicilio_match.group(1).strip()
+    metrics.inc('digitaliza_ocr_cache_misses_total', kind='imagen')
+    result = ocr_regions(load_for_ocr(image_path, preprocess_config), config)
+    ocr_cache.put(image_hash, OCR_LANG, cache_config, result)
+    return dict(result, doc_type=doc_type, mode=mode)
+
+def ocr_regions(regions, config):
+    """
+    Ejecuta Tesseract sobre las regiones preprocesadas (una página) y une el
+    texto de todas. El motor (API persistente, entrada estándar o pytesseract)
+    se elige en functions/ocr_engine.py.
+    """
+    engine = get_engine()
+    texts = []
+    words = []
+    offset = 0
+    with metrics.timed('ocr_page'):
+        for _, region in regions:
+            if texts:
+                offset += 1  # salto de línea entre regiones
+            data = engine.image_to_data(region, OCR_LANG, config)
+            text, spans = words_to_text(data, offset)
+            texts.append(text)
+            words.extend(spans)
+            offset += len(text)
+    metrics.inc('digitaliza_pages_ocr_total')
+    return {'text': '\n'.join(texts), 'words': words}
+
+def ocr_pdf(pdf_path):
+    """
+    Realiza OCR de cada página de un PDF. Las páginas con capa de texto la usan
+    directamente (sin Tesseract); las demás se rasterizan una a una mientras las
+    anteriores se procesan en paralelo, con a lo sumo PDF_PAGES_IN_FLIGHT páginas
+    en memoria. Cada página se clasifica antes del OCR, como en ocr_image.
+    El resultado completo se guarda en el caché de OCR.
     
-    # Buscar el folio según los criterios especificados
-    # Primero buscar el patrón "; 1234567890" (10 dígitos después de punto y coma)
-    folio_match = re.search(r";\s*(\d{10})", text)
+    Retorna una lista con {'page', 'source', 'text', 'words', 'doc_type', 'mode'}
+    por página.
+    """
+    config = tesseract_config()
+    dpi = PREPROCESS_CONFIG['target_dpi']
+    cache_config = {'tesseract': config, 'preprocess': PREPROCESS_CONFIG, 'pdf_dpi': dpi,
+                    'classifier': CLASSIFIER_CONFIG}
+    pdf_hash = ocr_cache.file_hash(pdf_path)
+    pages = ocr_cache.get(pdf_hash, OCR_LANG, cache_config)
+    if pages is not None:
+        metrics.inc('digitaliza_ocr_cache_hits_total', kind='pdf')
+        logger.info(f"Resultado de OCR obtenido del caché para {os.path.basename(pdf_path)}")
+        return pages
     
-    # Si no se encuentra, buscar cualquier secuencia de 10 dígitos
-    if not folio_match:
-        folio_match = re.search(r"(\d{10})", text)
+    metrics.inc('digitaliza_ocr_cache_misses_total', kind='pdf')
+    name = os.path.basename(pdf_path)
+    texts = text_layer(pdf_path)
+    total = page_count(pdf_path)
+    results = {}
+    for number, text in enumerate(texts[:total], start=1):
+        if text is not None:
+            results[number] = {'page': number, 'source': 'texto', 'text': text, 'words': text_layer_words(text),
+                               'doc_type': classify_text(text)[0], 'mode': 'full'}
+    to_rasterize = [number for number in range(1, total + 1) if number not in results]
+    if results:
+        logger.info(f"{name}: {len(results)} de {total} páginas con capa de texto (sin OCR)")
     
-    # Guardar el folio si se encontró
-    if folio_match:
-        data['folio'] = folio_match.group(1).strip()
+    if to_rasterize:
+        in_flight = deque()
+        with ThreadPoolExecutor(max_workers=PDF_PAGES_IN_FLIGHT) as executor:
+            for number, image in iter_pdf_pages(pdf_path, dpi, PREPROCESS_CONFIG['grayscale'], to_rasterize):
+                doc_type = classify_image(image)[0]
+                mode = ocr_mode(doc_type)
+                metrics.inc('digitaliza_pages_classified_total', doc_type=doc_type)
+                page = {'page': number, 'source': 'ocr', 'doc_type': doc_type, 'mode': mode}
+                if mode == 'skip':
+                    results[number] = dict(page, text='', words=[])
+                    continue
+                
+                preprocess_config = page_preprocess_config(mode)
+                if preprocess_config['target_dpi'] < dpi:
+                    scale = preprocess_config['target_dpi'] / dpi
+                    image = image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))),
+                                         Image.LANCZOS, reducing_gap=2.0)
+                regions = prepare_page(image, preprocess_config, f"{name} (página {number})")
+                future = executor.submit(metrics.profile_thread(ocr_regions), regions,
+                                         tesseract_config(preprocess_config))
+                in_flight.append((page, future))
+                # Acotar la memoria: esperar la página más antigua antes de rasterizar más
+                while len(in_flight) >= PDF_PAGES_IN_FLIGHT:
+                    done_page, future = in_flight.popleft()
+                    results[done_page['page']] = dict(future.result(), **done_page)
+            for done_page, future in in_flight:
+                results[done_page['page']] = dict(future.result(), **done_page)
     
-    return data
+    pages = [results[number] for number in sorted(results)]
+    ocr_cache.put(pdf_hash, OCR_LANG, cache_config, pages)
+    return pages
+
+def ocr_file(image_path):
+    """OCR de un archivo de entrada (imagen o PDF). Retorna la lista de sus páginas."""
+    logger.info(f"Procesando imagen: {image_path}")
+    if is_pdf_file(image_path):
+        return ocr_pdf(image_path)
+    return [ocr_image(image_path)]
+
+def _error_result(ocr_text, error, image_key=None):
+    """Construye el resultado de un OCR fallido."""
+    return {
+        'success': False,
+        'error': error,
+        'ocr_text': ocr_text,
+        'student_data': {},
+        'fields': {},
+        'needs_review': True,
+        'documents': [],
+        'image_key': image_key
+    }
 
-def perform_ocr():
+def perform_ocr(image_files=None):
     """
-    Realiza OCR en las imágenes de la carpeta input y guarda el resultado en output.txt
-    Además, extrae datos del estudiante y los guarda en un archivo JSON.
+    Realiza OCR en las imágenes de la carpeta input y extrae los datos del estudiante.
+    Si se indica image_files, se procesan esas imágenes en lugar de las dos más recientes.
+    Los archivos se procesan en paralelo y cada página se clasifica (pagaré o
+    firma) por su contenido, sin importar el orden en que lleguen.
+    
+    Retorna un diccionario con el texto OCR, los datos extraídos y la clave (hash)
+    de las imágenes procesadas. No escribe archivos: cada llamada es independiente
+    y se pueden ejecutar varias en paralelo.
     """
+    image_key = None
     try:
         # Verificar si Tesseract está instalado
         if not check_tesseract_installed():
@@ -92,121 +310,144 @@ def perform_ocr():
             logger.error("Por favor, instala Tesseract OCR con el siguiente comando:")
             logger.error("sudo apt-get install tesseract-ocr tesseract-ocr-spa")
             
-            # Crear un archivo de salida con instrucciones
-            output_file = 'output.txt'
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write("=== ERROR: TESSERACT OCR NO INSTALADO ===\n\n")
-                f.write("Para instalar Tesseract OCR en Ubuntu/Debian, ejecuta:\n")
-                f.write("sudo apt-get install tesseract-ocr tesseract-ocr-spa\n\n")
-                f.write("Después de instalar, vuelve a intentar el OCR.\n")
-            
-            return False
-        
-        # Importar pytesseract solo si Tesseract está instalado
-        import pytesseract
-        
-        # Determinar la ruta base del proyecto
-        if os.path.exists('app.py'):
-            # Estamos en la raíz del proyecto
-            base_dir = os.path.abspath('.')
-        else:
-            # Estamos en otro directorio, probablemente en functions/
-            base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-        
-        # Rutas absolutas
-        input_dir = os.path.join(base_dir, 'input')
-        output_file = os.path.join(base_dir, 'output.txt')
-        student_data_file = os.path.join(base_dir, 'student_data.json')
-        
-        logger.info(f"Directorio base: {base_dir}")
-        logger.info(f"Directorio de entrada: {input_dir}")
-        logger.info(f"Archivo de salida: {output_file}")
-        
-        # Verificar que el directorio de entrada existe
-        if not os.path.exists(input_dir):
-            logger.error(f"Error: El directorio de entrada {input_dir} no existe.")
-            return False
-        
-        # Obtener las imágenes más recientes
-        image_files = []
-        for file in os.listdir(input_dir):
-            if file.lower().endswith(('.jpg', '.jpeg')):
-                image_files.append(os.path.join(input_dir, file))
+            return _error_result(
+                "=== ERROR: TESSERACT OCR NO INSTALADO ===\n\n"
+                "Para instalar Tesseract OCR en Ubuntu/Debian, ejecuta:\n"
+                "sudo apt-get install tesseract-ocr tesseract-ocr-spa\n\n"
+                "Después de instalar, vuelve a intentar el OCR.\n",
+                "Tesseract OCR no está instalado"
+            )
         
-        # Ordenar por fecha de modificación (más reciente primero)
-        image_files.sort(key=os.path.getmtime, reverse=True)
-        
-        # Tomar las dos primeras imágenes (si existen)
-        image_files = image_files[:2]
+        if image_files is None:
+            input_dir = os.path.join(get_base_dir(), 'input')
+            logger.info(f"Directorio de entrada: {input_dir}")
+            
+            # Verificar que el directorio de entrada existe
+            if not os.path.exists(input_dir):
+                logger.error(f"Error: El directorio de entrada {input_dir} no existe.")
+                return _error_result('', f"El directorio de entrada {input_dir} no existe")
+            
+            # Tomar las dos imágenes más recientes (si existen)
+            index = ImageIndex.from_folder(input_dir)
+            image_files = [os.path.join(input_dir, name) for name in index.latest(2)]
         
         if not image_files:
             logger.error("No se encontraron imágenes para procesar.")
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write("=== ERROR: NO HAY IMÁGENES PARA PROCESAR ===\n\n")
-                f.write("No se encontraron imágenes JPG en la carpeta de entrada.\n")
-                f.write("Por favor, asegúrate de que hay imágenes en la carpeta 'input'.\n")
-            return False
+            return _error_result(
+                "=== ERROR: NO HAY IMÁGENES PARA PROCESAR ===\n\n"
+                "No se encontraron imágenes JPG ni PDF en la carpeta de entrada.\n"
+                "Por favor, asegúrate de que hay imágenes en la carpeta 'input'.\n",
+                "No se encontraron imágenes para procesar"
+            )
+        
+        image_key = hash_image_files(image_files)
         
         # Variable para almacenar todos los textos OCR
         all_ocr_text = ""
-        extracted_data = {}
+        all_word_spans = []
+        documents = []
+        output = ["=== RESULTADOS DE OCR ===\n\n"]
         
-        # Realizar OCR en cada imagen y guardar el resultado
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("=== RESULTADOS DE OCR ===\n\n")
-            
-            for i, image_path in enumerate(image_files):
+        # Realizar OCR de todos los archivos en paralelo (un PDF aporta una página
+        # por cada una de las suyas); los errores se informan por archivo
+        pages = []
+        with ThreadPoolExecutor(max_workers=min(len(image_files), OCR_FILE_WORKERS)) as executor:
+            futures = [(image_path, executor.submit(metrics.profile_thread(ocr_file), image_path))
+                       for image_path in image_files]
+            for image_path, future in futures:
+                name = os.path.basename(image_path)
                 try:
-                    logger.info(f"Procesando imagen: {image_path}")
-                    
-                    # Determinar el tipo de documento basado en el orden
-                    doc_type = "PAGARÉ" if i == 0 else "FIRMA"
-                    
-                    # Abrir la imagen
-                    with Image.open(image_path) as img:
-                        # Realizar OCR
-                        text = pytesseract.image_to_string(img, lang='spa')
-                        
-                        # Acumular el texto para análisis posterior
-                        all_ocr_text += text
-                        
-                        # Escribir resultados en el archivo
-                        f.write(f"=== DOCUMENTO {i+1}: {doc_type} ===\n")
-                        f.write(f"Archivo: {os.path.basename(image_path)}\n")
-                        f.write("Texto extraído:\n")
-                        f.write(text)
-                        f.write("\n\n" + "="*50 + "\n\n")
-                        
-                        logger.info(f"OCR completado para {os.path.basename(image_path)}")
-                
+                    file_pages = future.result()
                 except Exception as e:
                     logger.error(f"Error al procesar la imagen {image_path}: {str(e)}")
-                    f.write(f"Error al procesar la imagen {os.path.basename(image_path)}: {str(e)}\n\n")
+                    output.append(f"Error al procesar la imagen {name}: {str(e)}\n\n")
+                    continue
+                pages.extend((name, page) for page in file_pages)
+                logger.info(f"OCR completado para {name}")
         
-        # Extraer datos del estudiante del texto OCR
-        extracted_data = extract_student_data(all_ocr_text)
+        # El tipo de cada página lo da el clasificador, no el orden: el pagaré va
+        # primero en el texto para que la extracción no dependa del orden de los archivos
+        pages.sort(key=lambda item: item[1]['doc_type'] != PAGE_PAGARE)
         
-        # Guardar los datos extraídos en un archivo JSON
-        with open(student_data_file, 'w', encoding='utf-8') as f:
-            json.dump(extracted_data, f, ensure_ascii=False, indent=4)
+        for i, (name, page) in enumerate(pages):
+            text = page['text']
+            doc_type = page['doc_type']
+            
+            # Acumular el texto (y la posición de cada palabra) para análisis posterior
+            offset = len(all_ocr_text)
+            all_word_spans.extend((start + offset, end + offset, conf)
+                                  for start, end, conf in page['words'])
+            all_ocr_text += text + "\n"
+            document = {
+                'file': name,
+                'doc_type': doc_type,
+                'ocr_mode': page['mode'],
+                'text': text
+            }
+            if 'page' in page:
+                document['page'] = page['page']
+                document['source'] = page['source']
+            documents.append(document)
+            
+            output.append(f"=== DOCUMENTO {i+1}: {doc_type} ===\n")
+            if 'page' in page:
+                output.append(f"Archivo: {name} (página {page['page']})\n")
+            else:
+                output.append(f"Archivo: {name}\n")
+            if page['mode'] == 'skip':
+                output.append("Página de firmas: sin OCR\n")
+            else:
+                output.append("Texto extraído:\n")
+                output.append(text)
+            output.append("\n\n" + "="*50 + "\n\n")
+        
+        # Extraer datos del estudiante del texto OCR
+        with metrics.timed('extraction'):
+            fields = extract_fields(all_ocr_text, all_word_spans)
+        extracted_data = student_data_from_fields(fields)
+        review = needs_review(fields)
         
-        logger.info(f"Proceso de OCR completado. Resultados guardados en {output_file}")
+        logger.info(f"Proceso de OCR completado ({image_key[:12]})")
         logger.info(f"Datos del estudiante extraídos: {extracted_data}")
-        logger.info(f"Datos del estudiante guardados en {student_data_file}")
+        if review:
+            logger.info("Los datos extraídos requieren revisión manual")
         
-        return True
+        return {
+            'success': True,
+            'ocr_text': ''.join(output),
+            'student_data': extracted_data,
+            'fields': fields,
+            'needs_review': review,
+            'documents': documents,
+            'image_key': image_key
+        }
     
     except Exception as e:
         logger.error(f"Error general en el proceso de OCR: {str(e)}")
-        
-        # Crear un archivo de salida con el error
-        output_file = 'output.txt'
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("=== ERROR EN EL PROCESO DE OCR ===\n\n")
-            f.write(f"Error: {str(e)}\n")
-        
-        return False
+        return _error_result(f"=== ERROR EN EL PROCESO DE OCR ===\n\nError: {str(e)}\n", str(e), image_key)
+
+def get_base_dir():
+    """Determina la ruta base del proyecto."""
+    if os.path.exists('app.py'):
+        # Estamos en la raíz del proyecto
+        return os.path.abspath('.')
+    # Estamos en otro directorio, probablemente en functions/
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+def write_results(result, output_file, student_data_file):
+    """Guarda el resultado de perform_ocr en output.txt y student_data.json."""
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(result['ocr_text'])
+    
+    if result['success']:
+        with open(student_data_file, 'w', encoding='utf-8') as f:
+            json.dump(result['student_data'], f, ensure_ascii=False, indent=4)
 
 if __name__ == "__main__":
-    success = perform_ocr()
-    sys.exit(0 if success else 1)
+    # Uso independiente: guardar los resultados en los archivos de siempre
+    result = perform_ocr()
+    base_dir = get_base_dir()
+    output_file = os.path.join(base_dir, 'output.txt')
+    write_results(result, output_file, os.path.join(base_dir, 'student_data.json'))
+    logger.info(f"Resultados guardados en {output_file}")
+    sys.exit(0 if result['success'] else 1)
@@ -0,0 +1,248 @@
+import os
+import re
+import json
+import fcntl
+import time
+import uuid
+import hashlib
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from functions import ocr_cache
+from functions.database import BASE_DIR
+from functions.doc_ids import move_to_new_document
+from functions.file_digests import find_by_digest, record_digest
+from functions.image_index import is_input_file
+
+logger = logging.getLogger(__name__)
+
+# Carpeta de las subidas en curso: cache/uploads/<id>.part y <id>.json
+UPLOAD_TMP_DIR = os.path.join(BASE_DIR, 'cache', 'uploads')
+
+# Tamaño de cada fragmento que envía el navegador y de cada lectura del cuerpo
+CHUNK_SIZE = 8 * 1024 * 1024
+READ_SIZE = 64 * 1024
+
+# Tamaño máximo de un archivo subido por fragmentos
+MAX_UPLOAD_SIZE = 1024 * 1024 * 1024
+
+# Las subidas sin actividad por más de este tiempo (segundos) se descartan
+UPLOAD_EXPIRY = 24 * 3600
+
+# Formato de los IDs de subida (uuid4 en hexadecimal)
+UPLOAD_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+class UploadError(Exception):
+    """Error de una subida por fragmentos. Incluye el código HTTP a responder."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+# Hash de las subidas en curso en este proceso: id -> (bytes hasheados, sha256). Se
+# calcula a medida que llegan los fragmentos. Con serve.py los fragmentos de una
+# misma subida pueden llegar a procesos distintos: si el archivo parcial no tiene
+# el tamaño hasheado, el hash se recalcula desde el archivo.
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+def _part_path(upload_id):
+    return os.path.join(UPLOAD_TMP_DIR, f"{upload_id}.part")
+
+def _meta_path(upload_id):
+    return os.path.join(UPLOAD_TMP_DIR, f"{upload_id}.json")
+
+def _read_meta(upload_id):
+    if not UPLOAD_ID_PATTERN.fullmatch(upload_id or ''):
+        raise UploadError('Subida no encontrada', 404)
+    try:
+        with open(_meta_path(upload_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise UploadError('Subida no encontrada', 404)
+
+@contextmanager
+def _locked_part(upload_id):
+    """
+    Abre el archivo parcial con un bloqueo exclusivo (flock), que vale entre hilos
+    y entre los procesos de serve.py. El tamaño del archivo es lo ya recibido.
+    """
+    part_path = _part_path(upload_id)
+    try:
+        f = open(part_path, 'r+b')
+    except FileNotFoundError:
+        raise UploadError('Subida no encontrada', 404)
+    with f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        # Mientras se esperaba el bloqueo, otro proceso pudo completar o cancelar la subida
+        try:
+            current = os.path.samestat(os.fstat(f.fileno()), os.stat(part_path))
+        except OSError:
+            current = False
+        if not current:
+            raise UploadError('Subida no encontrada', 404)
+        yield f
+
+def _hasher(upload_id, f, size):
+    """SHA-256 de los primeros `size` bytes del archivo parcial (ya bloqueado)."""
+    with _hashers_lock:
+        cached = _hashers.get(upload_id)
+    if cached is not None and cached[0] == size:
+        return cached[1].copy()
+    hasher = hashlib.sha256()
+    f.seek(0)
+    for chunk in iter(lambda: f.read(READ_SIZE), b''):
+        hasher.update(chunk)
+    return hasher
+
+def _forget_hasher(upload_id):
+    with _hashers_lock:
+        _hashers.pop(upload_id, None)
+
+def cleanup_expired(max_age=UPLOAD_EXPIRY):
+    """Elimina las subidas abandonadas."""
+    if not os.path.isdir(UPLOAD_TMP_DIR):
+        return
+    limit = time.time() - max_age
+    for name in os.listdir(UPLOAD_TMP_DIR):
+        path = os.path.join(UPLOAD_TMP_DIR, name)
+        try:
+            if os.path.getmtime(path) < limit:
+                os.remove(path)
+                _forget_hasher(os.path.splitext(name)[0])
+        except OSError:
+            pass
+
+def create_upload(filename, size, max_size=MAX_UPLOAD_SIZE):
+    """Registra una subida nueva. Retorna su estado (ver upload_status)."""
+    if not filename or not is_input_file(filename):
+        raise UploadError('Solo se aceptan archivos JPG o PDF')
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError('Tamaño de archivo inválido')
+    if size > max_size:
+        raise UploadError(f"El archivo supera el máximo de {max_size // (1024 * 1024)} MB", 413)
+
+    cleanup_expired()
+    os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    upload_id = uuid.uuid4().hex
+    with open(_meta_path(upload_id), 'w', encoding='utf-8') as f:
+        json.dump({'filename': filename, 'size': size, 'created_at': time.time()}, f)
+    open(_part_path(upload_id), 'wb').close()
+
+    logger.info(f"Subida iniciada: {filename} ({size} bytes, {upload_id})")
+    return upload_status(upload_id)
+
+def upload_status(upload_id):
+    """Retorna {'upload_id', 'filename', 'size', 'offset', 'progress', 'chunk_size'}."""
+    meta = _read_meta(upload_id)
+    try:
+        offset = os.path.getsize(_part_path(upload_id))
+    except OSError:
+        raise UploadError('Subida no encontrada', 404)
+    return _status(upload_id, meta, offset)
+
+def _status(upload_id, meta, offset):
+    return {
+        'upload_id': upload_id,
+        'filename': meta['filename'],
+        'size': meta['size'],
+        'offset': offset,
+        'progress': round(offset / meta['size'] * 100, 1),
+        'chunk_size': CHUNK_SIZE
+    }
+
+def write_chunk(upload_id, offset, stream):
+    """
+    Agrega al archivo parcial el fragmento que llega en `stream` (leído por partes,
+    sin cargarlo completo en memoria). `offset` debe coincidir con el tamaño del
+    archivo parcial; si no, se responde 409 con el offset correcto para que el
+    cliente reanude. Retorna el estado de la subida.
+    """
+    meta = _read_meta(upload_id)
+    with _locked_part(upload_id) as f:
+        received = f.seek(0, os.SEEK_END)
+        if offset != received:
+            raise UploadError(f"Offset esperado: {received}", 409)
+
+        hasher = _hasher(upload_id, f, received)
+        f.seek(received)
+        written = 0
+        try:
+            for chunk in iter(lambda: stream.read(READ_SIZE), b''):
+                if received + written + len(chunk) > meta['size']:
+                    raise UploadError('El fragmento supera el tamaño declarado')
+                f.write(chunk)
+                hasher.update(chunk)
+                written += len(chunk)
+            f.flush()
+        except BaseException:
+            # Un error o una desconexión a mitad del fragmento: se descarta lo que
+            # alcanzó a escribirse, y el archivo vuelve a coincidir con el offset
+            f.truncate(received)
+            raise
+        with _hashers_lock:
+            _hashers[upload_id] = (received + written, hasher)
+    return _status(upload_id, meta, received + written)
+
+def finish_upload(upload_id, folder, extension_for):
+    """
+    Completa la subida: si el contenido ya existe en la carpeta se descarta como
+    duplicado; si no, se mueve de forma atómica a la carpeta con un ID de documento
+    nuevo y la extensión que entrega extension_for(nombre_original).
+    Retorna {'filename', 'duplicate', 'sha256'}.
+    """
+    meta = _read_meta(upload_id)
+    part_path = _part_path(upload_id)
+    with _locked_part(upload_id) as f:
+        received = os.fstat(f.fileno()).st_size
+        if received != meta['size']:
+            raise UploadError(f"Subida incompleta: {received} de {meta['size']} bytes", 409)
+        # El hash corresponde al archivo en disco: el calculado durante la subida si
+        # cubre el archivo completo, o uno nuevo leído del archivo
+        digest = _hasher(upload_id, f, received).hexdigest()
+
+        duplicate = find_by_digest(folder, digest)
+        if duplicate:
+            logger.info(f"Subida duplicada descartada: {meta['filename']} = {duplicate}")
+            filename = duplicate
+            os.remove(part_path)
+        else:
+            filename = move_to_new_document(part_path, folder, extension_for(meta['filename']))
+            # El hash ya se calculó durante la subida: el OCR no necesita releer el archivo
+            ocr_cache.remember_hash(os.path.join(folder, filename), digest)
+            record_digest(folder, filename, digest)
+            logger.info(f"Subida completada: {meta['filename']} -> {filename}")
+
+        os.remove(_meta_path(upload_id))
+    _forget_hasher(upload_id)
+    return {'filename': filename, 'duplicate': bool(duplicate), 'sha256': digest}
+
+def save_upload(file, folder, extension):
+    """
+    Guarda un archivo subido en una sola petición (FileStorage de werkzeug) en la
+    carpeta con un ID de documento nuevo. Como las subidas por fragmentos, se
+    escribe aparte y se mueve completo: la carpeta nunca ve un archivo a medias.
+    Retorna el nombre nuevo.
+    """
+    os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_TMP_DIR, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            file.save(target)
+        return move_to_new_document(tmp_path, folder, extension)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def cancel_upload(upload_id):
+    """Descarta una subida en curso."""
+    if not UPLOAD_ID_PATTERN.fullmatch(upload_id or ''):
+        raise UploadError('Subida no encontrada', 404)
+    _forget_hasher(upload_id)
+    for path in (_part_path(upload_id), _meta_path(upload_id)):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
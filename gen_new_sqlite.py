@@ -0,0 +1,11 @@
+import os
+import sys
+
+from functions.database import DB_PATH, init_db
+
+# Permite indicar otra ruta: python gen_new_sqlite.py [ruta.db]
+db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+
+print(f"Base de datos: {os.path.abspath(db_path)}")
+init_db(db_path)
+print("Esquema aplicado correctamente.")
@@ -0,0 +1,124 @@
+-- Esquema de la base de datos local de digitalización (SQLite)
+
+-- Cola de trabajos en segundo plano (OCR, escaneo)
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    status      TEXT NOT NULL DEFAULT 'queued',
+    payload     TEXT,
+    result      TEXT,
+    error       TEXT,
+    image_key   TEXT,
+    created_at  REAL NOT NULL,
+    started_at  REAL,
+    finished_at REAL
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_image_key ON jobs (image_key);
+
+-- Resultados de la digitalización masiva (batch_ocr.py --output archivo.db)
+CREATE TABLE IF NOT EXISTS batch_results (
+    image_key    TEXT PRIMARY KEY,
+    files        TEXT NOT NULL,
+    success      INTEGER NOT NULL,
+    needs_review INTEGER,
+    result       TEXT,
+    error        TEXT,
+    finished_at  REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_batch_results_needs_review ON batch_results (needs_review);
+
+-- Documentos digitalizados: sistema de registro de cada pagaré procesado
+CREATE TABLE IF NOT EXISTS documents (
+    id             TEXT PRIMARY KEY,
+    image_key      TEXT NOT NULL UNIQUE,
+    job_id         TEXT,
+    rut            INTEGER,
+    rut_dv         TEXT,
+    folio          INTEGER,
+    fecha          TEXT,
+    nombre         TEXT,
+    needs_review   INTEGER NOT NULL DEFAULT 1,
+    matched_by     TEXT,
+    student_record TEXT,
+    created_at     REAL NOT NULL,
+    updated_at     REAL NOT NULL,
+    -- Número de cambio: crece en cada escritura, en el orden en que se confirman
+    change_seq     INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_documents_rut ON documents (rut);
+CREATE INDEX IF NOT EXISTS idx_documents_folio ON documents (folio);
+CREATE INDEX IF NOT EXISTS idx_documents_fecha ON documents (fecha);
+CREATE INDEX IF NOT EXISTS idx_documents_created_at ON documents (created_at);
+CREATE INDEX IF NOT EXISTS idx_documents_change_seq ON documents (change_seq);
+
+-- Páginas de cada documento con su texto OCR (búsqueda de texto: schema_fts.sql)
+CREATE TABLE IF NOT EXISTS pages (
+    id          INTEGER PRIMARY KEY,
+    document_id TEXT NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+    number      INTEGER NOT NULL,
+    file        TEXT,
+    file_page   INTEGER,
+    doc_type    TEXT,
+    ocr_mode    TEXT,
+    text        TEXT NOT NULL DEFAULT '',
+    UNIQUE (document_id, number)
+);
+
+-- Campos extraídos de cada documento
+CREATE TABLE IF NOT EXISTS fields (
+    document_id TEXT NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+    name        TEXT NOT NULL,
+    value       TEXT,
+    confidence  REAL,
+    valid       INTEGER,
+    PRIMARY KEY (document_id, name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_fields_name_value ON fields (name, value);
+
+-- Exportaciones a db_input.csv: cada una recuerda hasta qué change_seq de
+-- documents llegó, para que la siguiente exporte solo lo nuevo o modificado
+CREATE TABLE IF NOT EXISTS exports (
+    id         TEXT PRIMARY KEY,
+    format     TEXT NOT NULL,
+    since_seq  INTEGER,
+    until_seq  INTEGER,
+    rows       INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+
+-- SHA-256 de cada archivo de la carpeta input, para reconocer una subida
+-- duplicada sin releer la carpeta (fecha y tamaño indican si sigue vigente)
+CREATE TABLE IF NOT EXISTS file_digests (
+    filename TEXT PRIMARY KEY,
+    sha256   TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size     INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_file_digests_sha256 ON file_digests (sha256);
+
+-- Estado de la carpeta input que publica el proceso que la monitorea (serve.py):
+-- una foto del índice cada tanto y, después de ella, solo los cambios
+CREATE TABLE IF NOT EXISTS folder_snapshots (
+    version            INTEGER PRIMARY KEY,
+    last_modified      REAL NOT NULL,
+    entries            TEXT NOT NULL,
+    jobs_recovered_for TEXT,
+    pid                INTEGER,
+    created_at         REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS folder_changes (
+    version       INTEGER PRIMARY KEY,
+    last_modified REAL NOT NULL,
+    added         TEXT NOT NULL,
+    modified      TEXT NOT NULL,
+    removed       TEXT NOT NULL,
+    mtimes        TEXT NOT NULL
+);
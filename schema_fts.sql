@@ -0,0 +1,23 @@
+-- Búsqueda de texto completo sobre el OCR de las páginas (SQLite con FTS5).
+-- Es opcional: si la versión de SQLite no trae FTS5, la búsqueda usa LIKE.
+
+CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5 (
+    text,
+    content = 'pages',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+
+-- Mantener el índice sincronizado con la tabla pages
+CREATE TRIGGER IF NOT EXISTS pages_fts_insert AFTER INSERT ON pages BEGIN
+    INSERT INTO pages_fts (rowid, text) VALUES (new.id, new.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS pages_fts_delete AFTER DELETE ON pages BEGIN
+    INSERT INTO pages_fts (pages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS pages_fts_update AFTER UPDATE OF text ON pages BEGIN
+    INSERT INTO pages_fts (pages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO pages_fts (rowid, text) VALUES (new.id, new.text);
+END;
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+import logging
+import argparse
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def serve_waitress(host, port, threads, ocr_workers):
+    """Un proceso con varios hilos (funciona también en Windows)."""
+    from waitress import serve
+    import app as application
+
+    application.start_services(ocr_workers, port, host)
+    logger.info(f"Servidor waitress en http://{host}:{port} con {threads} hilos")
+    try:
+        serve(application.app, host=host, port=port, threads=threads)
+    finally:
+        application.folder_monitor_active = False
+        application.stop_ocr_pool()
+
+def serve_gunicorn(host, port, workers, threads, ocr_workers):
+    """Varios procesos con gunicorn (Linux/macOS). El monitor se elige entre ellos."""
+    from gunicorn.app.base import BaseApplication
+
+    class ProductionApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{host}:{port}")
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            # Sin límite de tiempo: /events y /check_updates mantienen conexiones abiertas
+            self.cfg.set('timeout', 0)
+
+        def load(self):
+            # Se ejecuta en cada proceso después del fork: cada uno tiene sus propios hilos
+            import app as application
+            application.start_services(ocr_workers, port, host)
+            return application.app
+
+    logger.info(f"Servidor gunicorn en http://{host}:{port} con {workers} procesos de {threads} hilos")
+    ProductionApplication().run()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Servidor de producción del visor de documentos (sin modo debug).')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Procesos del servidor (más de 1 requiere gunicorn)')
+    parser.add_argument('-t', '--threads', type=int, default=16,
+                        help='Hilos por proceso (cada cliente de /events ocupa uno)')
+    parser.add_argument('--ocr-workers', type=int, default=None,
+                        help='Procesos de OCR por proceso del servidor (por defecto, núcleos / procesos)')
+    parser.add_argument('--profile-slow', type=float, default=None, metavar='SEGUNDOS',
+                        help='Guardar el perfil (cProfile) de los trabajos que tarden al menos SEGUNDOS')
+    args = parser.parse_args(argv)
+
+    # Los procesos de OCR se reparten entre los procesos del servidor
+    ocr_workers = args.ocr_workers or max(1, (os.cpu_count() or 1) // args.workers)
+
+    # Marca común a todos los procesos: los trabajos pendientes se recuperan una vez
+    os.environ['DIGITALIZA_STARTED_AT'] = str(time.time())
+    if args.profile_slow is not None:
+        # Se lee al importar la aplicación; los procesos del pool la heredan
+        os.environ['DIGITALIZA_PROFILE_SLOW_SECONDS'] = str(args.profile_slow)
+
+    if args.workers > 1:
+        try:
+            serve_gunicorn(args.host, args.port, args.workers, args.threads, ocr_workers)
+            return 0
+        except ImportError:
+            logger.warning("gunicorn no está disponible, se usará un solo proceso con waitress")
+
+    try:
+        serve_waitress(args.host, args.port, args.threads, ocr_workers)
+    except ImportError:
+        logger.error("Instala un servidor de producción: pip install waitress (o gunicorn en Linux)")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
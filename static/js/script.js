@@ -60,29 +60,60 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
-// Variable para almacenar la última modificación conocida
-let lastKnownModification = 0;
+// Última versión conocida de la carpeta (la envía el servidor)
+let lastKnownVersion = null;
+
+// image_key del último OCR (identifica el documento en la base de documentos)
+let lastOcrImageKey = null;
 
 // Función para iniciar el monitoreo de la carpeta
 function startFolderMonitoring() {
-    // Verificar cambios cada 3 segundos
-    setInterval(checkForUpdates, 3000);
+    if (window.EventSource) {
+        // El servidor avisa de los cambios apenas ocurren (Server-Sent Events)
+        const source = new EventSource('/events');
+        source.addEventListener('hello', event => {
+            const data = JSON.parse(event.data);
+            // Al reconectar, recargar si hubo cambios mientras estuvimos desconectados
+            if (lastKnownVersion !== null && data.version > lastKnownVersion) {
+                refreshImages();
+            }
+            lastKnownVersion = data.version;
+        });
+        source.addEventListener('folder', event => handleFolderChange(JSON.parse(event.data)));
+        source.addEventListener('reset', event => {
+            lastKnownVersion = JSON.parse(event.data).version;
+            refreshImages();
+        });
+    } else {
+        // Navegadores sin EventSource: long-poll
+        checkForUpdates();
+    }
+}
+
+// Función para procesar un cambio de la carpeta enviado por el servidor
+function handleFolderChange(change) {
+    lastKnownVersion = change.version;
+    console.log('Cambios detectados en la carpeta:', change);
+    refreshImages();
 }
 
-// Función para verificar si hay actualizaciones
+// Función para esperar cambios con long-poll (alternativa a EventSource)
 function checkForUpdates() {
-    fetch('/check_updates')
+    const since = lastKnownVersion === null ? '' : lastKnownVersion;
+    fetch(`/check_updates?since=${since}&wait=25`)
         .then(response => response.json())
         .then(data => {
-            // Si hay una nueva modificación, actualizar las imágenes
-            if (data.last_modified > lastKnownModification) {
-                lastKnownModification = data.last_modified;
-                console.log('Cambios detectados en la carpeta, actualizando imágenes...');
+            if (data.reset) {
                 refreshImages();
+            } else if (data.changes.length > 0) {
+                data.changes.forEach(handleFolderChange);
             }
+            lastKnownVersion = data.version;
+            checkForUpdates();
         })
         .catch(error => {
             console.error('Error al verificar actualizaciones:', error);
+            setTimeout(checkForUpdates, 3000);
         });
 }
 
@@ -183,66 +214,119 @@ function deleteImage(filename) {
         });
 }
 
-// Función para subir archivos
+// Función para subir archivos (por fragmentos, con progreso real y reanudación)
 function uploadFiles() {
     const fileInput = document.getElementById('fileInput');
-    const files = fileInput.files;
+    const files = Array.from(fileInput.files);
     
     if (files.length === 0) {
         showUploadStatus('Por favor, seleccione al menos un archivo', 'danger');
         return;
     }
     
-    const formData = new FormData();
-    for (let i = 0; i < files.length; i++) {
-        formData.append('file', files[i]);
-    }
-    
     // Mostrar barra de progreso
     const progressBar = document.querySelector('#uploadProgress .progress-bar');
     document.getElementById('uploadProgress').classList.remove('d-none');
     progressBar.style.width = '0%';
     
-    fetch('/upload', {
-        method: 'POST',
-        body: formData
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            showUploadStatus(`${data.files.length} archivo(s) subido(s) correctamente`, 'success');
-            document.getElementById('uploadForm').reset();
-            setTimeout(() => {
-                refreshImages();
-                // Cerrar modal después de 1 segundo
-                setTimeout(() => {
-                    const modal = bootstrap.Modal.getInstance(document.getElementById('uploadModal'));
-                    modal.hide();
-                    // Ocultar mensajes y barra de progreso
-                    document.getElementById('uploadStatus').classList.add('d-none');
-                    document.getElementById('uploadProgress').classList.add('d-none');
-                }, 1000);
-            }, 500);
-        } else {
-            showUploadStatus('Error: ' + data.error, 'danger');
+    const totalBytes = files.reduce((total, file) => total + file.size, 0);
+    let doneBytes = 0;
+    const uploaded = [];
+    let duplicates = 0;
+    let similar = 0;
+    
+    const updateProgress = (file, index, fileBytes) => {
+        const progress = totalBytes ? Math.round((doneBytes + fileBytes) / totalBytes * 100) : 100;
+        progressBar.style.width = `${progress}%`;
+        progressBar.setAttribute('aria-valuenow', progress);
+        const fileProgress = file.size ? Math.round(fileBytes / file.size * 100) : 100;
+        showUploadStatus(`Subiendo ${file.name} (${index + 1}/${files.length}): ${fileProgress}%`, 'info');
+    };
+    
+    // Subir los archivos uno tras otro
+    files.reduce((previous, file, index) => previous.then(() =>
+        uploadFileInChunks(file, fileBytes => updateProgress(file, index, fileBytes))
+            .then(result => {
+                doneBytes += file.size;
+                if (result.duplicate) {
+                    duplicates++;
+                } else {
+                    uploaded.push(result.filename);
+                    if (result.similar && result.similar.length) {
+                        similar++;
+                    }
+                }
+            })
+    ), Promise.resolve())
+    .then(() => {
+        let message = `${uploaded.length} archivo(s) subido(s) correctamente`;
+        if (duplicates) {
+            message += `, ${duplicates} duplicado(s) omitido(s)`;
         }
+        if (similar) {
+            message += `, ${similar} parecido(s) a un escaneo anterior`;
+        }
+        showUploadStatus(message, similar ? 'warning' : 'success');
+        document.getElementById('uploadForm').reset();
+        setTimeout(() => {
+            refreshImages();
+            // Cerrar modal después de 1 segundo
+            setTimeout(() => {
+                const modal = bootstrap.Modal.getInstance(document.getElementById('uploadModal'));
+                modal.hide();
+                // Ocultar mensajes y barra de progreso
+                document.getElementById('uploadStatus').classList.add('d-none');
+                document.getElementById('uploadProgress').classList.add('d-none');
+            }, 1000);
+        }, 500);
     })
     .catch(error => {
         console.error('Error al subir archivos:', error);
-        showUploadStatus('Error al subir archivos', 'danger');
+        showUploadStatus('Error al subir archivos: ' + error.message, 'danger');
     });
-    
-    // Simular progreso (en una aplicación real, usaría XMLHttpRequest con eventos de progreso)
-    let progress = 0;
-    const interval = setInterval(() => {
-        progress += 10;
-        progressBar.style.width = `${progress}%`;
-        progressBar.setAttribute('aria-valuenow', progress);
-        
-        if (progress >= 100) {
-            clearInterval(interval);
+}
+
+// Sube un archivo por fragmentos. Si un fragmento falla, consulta el offset
+// recibido por el servidor y reanuda desde ahí (hasta 3 reintentos seguidos).
+function uploadFileInChunks(file, onProgress) {
+    const jsonOrError = response => response.json().then(data => {
+        if (!data.success && response.status !== 409) {
+            throw new Error(data.error);
         }
-    }, 200);
+        return data;
+    });
+    
+    return fetch('/uploads', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({filename: file.name, size: file.size})
+    })
+    .then(jsonOrError)
+    .then(upload => {
+        let retries = 0;
+        const sendFrom = offset => {
+            onProgress(offset);
+            const chunk = file.slice(offset, offset + upload.chunk_size);
+            return fetch(`/uploads/${upload.upload_id}?offset=${offset}`, {method: 'PUT', body: chunk})
+                .then(jsonOrError)
+                .then(data => {
+                    if (!data.success) {
+                        throw new Error(data.error);
+                    }
+                    retries = 0;
+                    return data.complete ? data : sendFrom(data.offset);
+                })
+                .catch(error => {
+                    if (++retries > 3) {
+                        throw error;
+                    }
+                    return fetch(`/uploads/${upload.upload_id}`)
+                        .then(jsonOrError)
+                        .then(status => sendFrom(status.offset));
+                });
+        };
+        return sendFrom(0);
+    });
 }
 
 // Función para mostrar el estado de la subida
@@ -493,6 +577,36 @@ function initializeZoom() {
     });
 }
 
+// Función para esperar a que un trabajo en segundo plano termine
+function waitForJob(jobId, interval = 1000) {
+    return new Promise((resolve, reject) => {
+        const poll = () => {
+            fetch(`/jobs/${jobId}`)
+                .then(response => response.json())
+                .then(job => {
+                    if (job.status === 'done') {
+                        resolve(job.result);
+                    } else if (job.status === 'error') {
+                        resolve({ success: false, error: job.error });
+                    } else if (job.status) {
+                        setTimeout(poll, interval);
+                    } else {
+                        resolve({ success: false, error: job.error || 'Trabajo no encontrado' });
+                    }
+                })
+                .catch(reject);
+        };
+        poll();
+    });
+}
+
+// Función para encolar un trabajo y esperar su resultado
+function runJob(url) {
+    return fetch(url)
+        .then(response => response.json())
+        .then(data => data.success ? waitForJob(data.job_id) : data);
+}
+
 // Función para ejecutar el escaneo (llamar a gen_test_input.py)
 function scanDocuments() {
     // Mostrar indicador de carga
@@ -501,9 +615,8 @@ function scanDocuments() {
     scanBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Escaneando...';
     scanBtn.disabled = true;
     
-    // Llamar al endpoint que ejecutará el script
-    fetch('/scan')
-        .then(response => response.json())
+    // Encolar el escaneo y esperar a que termine
+    runJob('/scan')
         .then(data => {
             if (data.success) {
                 // Mostrar mensaje de éxito
@@ -528,25 +641,17 @@ function scanDocuments() {
 // Función para procesar el documento con los datos ingresados
 function processDocument() {
     // Recopilar datos del formulario
-    const formData = {
-        student: {
-            rut: document.getElementById('studentRut').value,
-            name: document.getElementById('studentName').value,
-            email: document.getElementById('studentEmail').value
-        },
-        aval: {
-            rut: document.getElementById('avalRut').value,
-            name: document.getElementById('avalName').value,
-            address: document.getElementById('avalAddress').value,
-            phone: document.getElementById('avalPhone').value,
-            relationship: document.getElementById('avalRelationship').value
-        }
+    const rutNumber = document.getElementById('studentRutNumber').value.trim();
+    const rutDV = document.getElementById('studentRutDV').value.trim();
+    const documentData = {
+        rut: rutDV ? `${rutNumber}-${rutDV}` : rutNumber,
+        folio: document.getElementById('studentFolio').value.trim(),
+        image_key: lastOcrImageKey
     };
     
     // Validar datos básicos
-    if (!formData.student.rut || !formData.student.name || 
-        !formData.aval.rut || !formData.aval.name) {
-        alert('Por favor complete los campos obligatorios (RUT y Nombre) tanto del estudiante como del aval.');
+    if (!documentData.rut && !documentData.folio) {
+        alert('Por favor ingrese el RUT o el folio del alumno.');
         return;
     }
     
@@ -556,31 +661,18 @@ function processDocument() {
     processBtn.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i> Procesando...';
     processBtn.disabled = true;
     
-    // Simular procesamiento (aquí se enviarían los datos al servidor)
-    setTimeout(() => {
-        console.log('Datos del documento a procesar:', formData);
-        
-        // Mostrar resultado (en una aplicación real, esto vendría del servidor)
-        alert('Documento procesado correctamente');
-        
-        // Restaurar el botón
-        processBtn.innerHTML = originalText;
-        processBtn.disabled = false;
-    }, 1500);
-    
-    // En una aplicación real, enviaríamos los datos al servidor:
-    /*
+    // Buscar el alumno en la base de datos
     fetch('/process_document', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
         },
-        body: JSON.stringify(formData)
+        body: JSON.stringify(documentData)
     })
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            alert('Documento procesado correctamente');
+            fillStudentRecord(data.record);
         } else {
             alert('Error al procesar el documento: ' + data.error);
         }
@@ -594,7 +686,25 @@ function processDocument() {
         processBtn.innerHTML = originalText;
         processBtn.disabled = false;
     });
-    */
+}
+
+// Función para rellenar los campos de solo lectura con el registro del alumno
+function fillStudentRecord(record) {
+    const join = (...parts) => parts.filter(Boolean).join(' ');
+    document.getElementById('studentName').value = join(record.nombres_alumno, record.apellido_pat_alumno, record.apellido_mat_alumno);
+    document.getElementById('avalName').value = join(record.nombres_aval, record.ape_pat_aval, record.ap_mat_aval);
+    document.getElementById('avalRut').value = record.rut_aval || '';
+    document.getElementById('amount').value = record.monto || '';
+    document.getElementById('avalEmail').value = record.mail_aval || '';
+    
+    // Completar RUT y folio si vinieron vacíos
+    if (!document.getElementById('studentRutNumber').value) {
+        document.getElementById('studentRutNumber').value = record.rut || '';
+        document.getElementById('studentRutDV').value = record.dig_ver || '';
+    }
+    if (!document.getElementById('studentFolio').value) {
+        document.getElementById('studentFolio').value = record.folio || '';
+    }
 }
 
 // Función para separar el RUT chileno en número y dígito verificador
@@ -613,6 +723,20 @@ function splitRut(rutCompleto) {
     return { numero, dv };
 }
 
+// Aviso de posible reescaneo: {imagen: [archivos parecidos]} -> HTML
+function similarWarning(similar) {
+    const list = Object.entries(similar)
+        .map(([name, others]) => `<li>${name} se parece a ${others.join(', ')}</li>`)
+        .join('');
+    if (!list) {
+        return '';
+    }
+    return `<div class="alert alert-warning mb-3">
+        <strong>Posible escaneo duplicado:</strong>
+        <ul class="mb-0 mt-2">${list}</ul>
+    </div>`;
+}
+
 // Modificar la función runOCR para contraer el texto completo
 function runOCR() {
     // Mostrar indicador de carga
@@ -621,11 +745,19 @@ function runOCR() {
     ocrBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> OCR...';
     ocrBtn.disabled = true;
     
-    // Llamar al endpoint que ejecutará el script
+    // Si el pagaré parece un reescaneo, el servidor lo avisa pero hace el OCR igualmente
+    let similar = {};
+    
+    // Encolar el OCR y esperar a que termine
     fetch('/ocr')
         .then(response => response.json())
+        .then(queued => {
+            similar = queued.similar || {};
+            return queued.success ? waitForJob(queued.job_id) : queued;
+        })
         .then(data => {
             if (data.success) {
+                lastOcrImageKey = data.image_key || null;
                 // Rellenar SOLO los campos RUT y Folio con los datos extraídos
                 if (data.student_data) {
                     // Separar y rellenar RUT del estudiante
@@ -651,6 +783,7 @@ function runOCR() {
                                 <button type="button" class="btn-close" data-bs-dismiss="modal" aria-label="Close"></button>
                             </div>
                             <div class="modal-body">
+                                ${similarWarning(similar)}
                                 <div class="alert alert-success mb-3">
                                     <strong>Datos extraídos:</strong>
                                     <ul class="mb-0 mt-2">